@@ -1,15 +1,33 @@
 import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 
+from middleware.profiler_middleware import ProfilerMiddleware
+from middleware.request_context_middleware import RequestContextMiddleware
+from middleware.timing_middleware import TimingMiddleware
+from middleware.traffic_recorder_middleware import TrafficRecorderMiddleware
+from db.mongodb_connector import mongodb_connector
 from routes.chat_service_route import router as chat_router
+from service.chat_service import chat_service
+from util.metrics import metrics
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Database setup before the first request, background work and connections closed on shutdown
+    await chat_service.start()
+    yield
+    await chat_service.stop()
+    await mongodb_connector.close()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Psychology Chatbot API",
     description="API for Arabic psychological support chatbot",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -24,6 +42,32 @@ app.add_middleware(
 # Include routers
 app.include_router(chat_router)
 
+# Opt-in anonymized recording of the chat API traffic, replayed by benchmark/replay.py
+if os.getenv("TRAFFIC_RECORD_PATH"):
+    app.add_middleware(
+        TrafficRecorderMiddleware,
+        path=os.getenv("TRAFFIC_RECORD_PATH"),
+        thread_length=chat_service.get_message_count
+    )
+
+# Opt-in profiling of single requests, by admin token or sample rate
+if os.getenv("PROFILE_TOKEN") or float(os.getenv("PROFILE_SAMPLE_RATE", "0")) > 0:
+    app.add_middleware(
+        ProfilerMiddleware,
+        directory=os.getenv("PROFILE_DIR", "profiles"),
+        token=os.getenv("PROFILE_TOKEN"),
+        sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+        mode=os.getenv("PROFILE_MODE", "sampling").lower(),
+        interval=float(os.getenv("PROFILE_INTERVAL", "0.005")),
+        max_files=int(os.getenv("PROFILE_MAX_FILES", "100"))
+    )
+
+# Per-stage latency, added after the others so it also times them
+app.add_middleware(TimingMiddleware)
+
+# Request id of the log records, outermost so every log line of a request carries it
+app.add_middleware(RequestContextMiddleware)
+
 # Error handling
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -35,7 +79,22 @@ async def global_exception_handler(request: Request, exc: Exception):
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "Psychology Chatbot API"}
+    database: dict = await mongodb_connector.health()
+    return JSONResponse(
+        status_code=200 if database["ok"] else 503,
+        content={
+            "status": "healthy" if database["ok"] else "unhealthy",
+            "service": "Psychology Chatbot API",
+            "database": database,
+            "thread_cache": chat_service.get_cache_stats(),
+            "providers": chat_service.get_provider_stats(),
+            "generations": chat_service.get_generation_stats(),
+        })
+
+# Prometheus metrics of this worker process
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # Root endpoint with API documentation link
 @app.get("/")
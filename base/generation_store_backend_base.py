@@ -0,0 +1,43 @@
+from abc import ABC, abstractmethod
+
+
+class GenerationStoreBackendBase(ABC):
+    @abstractmethod
+    async def create(self, generation_id: str, fingerprint: str) -> bool:
+        # Creates the generation unless it already exists, which returns False.
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_fingerprint(self, generation_id: str) -> str | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def append(self, generation_id: str, event: dict) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def finish(self, generation_id: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def read(self, generation_id: str, start: int) -> tuple[list[dict], bool] | None:
+        # The events from start on and whether the generation finished, None when it does not exist.
+        raise NotImplementedError
+
+    @abstractmethod
+    async def mark_followed(self, generation_id: str) -> None:
+        # Called while a worker other than the generating one follows it.
+        raise NotImplementedError
+
+    @abstractmethod
+    async def last_followed(self, generation_id: str) -> float | None:
+        # Unix time of the last mark_followed, None when there was none.
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete(self, generation_id: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def stats(self) -> dict:
+        raise NotImplementedError
@@ -0,0 +1,77 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import AsyncIterator
+
+from provider.model.conversation_model import ConversationModel
+from provider.model.usage_model import UsageModel
+
+
+class LLMProviderBase(ABC):
+    def __init__(
+            self,
+            name: str,
+            max_concurrency: int,
+            read_timeout: float
+    ):
+        self.name: str = name
+        self.in_flight: int = 0
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(max_concurrency)
+        self._read_timeout: float = read_timeout
+
+    @abstractmethod
+    async def _generate(
+            self,
+            conversation: ConversationModel,
+            usage: UsageModel
+    ) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _stream(
+            self,
+            conversation: ConversationModel,
+            usage: UsageModel
+    ) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def generate(
+            self,
+            conversation: ConversationModel,
+            usage: UsageModel | None = None
+    ) -> str:
+        usage = usage or UsageModel()
+        usage.provider = self.name
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                async with asyncio.timeout(self._read_timeout):
+                    return await self._generate(conversation, usage)
+            finally:
+                self.in_flight -= 1
+
+    async def stream(
+            self,
+            conversation: ConversationModel,
+            usage: UsageModel | None = None
+    ) -> AsyncIterator[str]:
+        # NOTE: The read timeout applies to every chunk, so a stalled
+        #       stream fails fast while a long answer that keeps
+        #       producing tokens is never cut off.
+        usage = usage or UsageModel()
+        usage.provider = self.name
+        async with self._semaphore:
+            self.in_flight += 1
+            iterator: AsyncIterator[str] = self._stream(conversation, usage)
+            try:
+                while True:
+                    try:
+                        async with asyncio.timeout(self._read_timeout):
+                            delta: str = await anext(iterator)
+                    except StopAsyncIteration:
+                        break
+                    yield delta
+            finally:
+                # Closing the iterator runs the cleanup of _stream, which closes the upstream
+                # HTTP response, also when the client disconnects and the task is cancelled.
+                self.in_flight -= 1
+                await iterator.aclose()
@@ -0,0 +1,21 @@
+from abc import ABC, abstractmethod
+
+from db.model.chat_thread_model import ChatThreadModel
+
+
+class ThreadCacheBackendBase(ABC):
+    @abstractmethod
+    async def get(self, chat_id: str) -> ChatThreadModel | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set(self, chat_thread: ChatThreadModel) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete(self, chat_id: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def stats(self) -> dict:
+        raise NotImplementedError
@@ -0,0 +1,80 @@
+"""
+Fake LLM providers that only sleep and fail on demand, so the provider
+layer can be exercised without network access or API keys.
+"""
+import asyncio
+import math
+import random
+from typing import AsyncIterator
+
+from base.llm_provider_base import LLMProviderBase
+from provider.model.conversation_model import ConversationModel
+from provider.model.usage_model import UsageModel
+from util.token_counter import count_tokens
+
+
+class FakeProvider(LLMProviderBase):
+    def __init__(
+            self,
+            name: str = "fake",
+            latency: float = 0.5,
+            jitter: float = 0.0,
+            distribution: str = "uniform",
+            tokens: int = 20,
+            tokens_per_second: float = 50.0,
+            failure_rate: float = 0.0,
+            max_concurrency: int = 64,
+            read_timeout: float = 60.0
+    ):
+        super().__init__(name=name, max_concurrency=max_concurrency, read_timeout=read_timeout)
+        self._latency: float = latency
+        self._jitter: float = jitter
+        # "uniform": latency +- jitter, "lognormal": median latency with jitter as sigma,
+        # which gives the long tail real LLM APIs show.
+        self._distribution: str = distribution
+        self._tokens: int = tokens
+        self._tokens_per_second: float = tokens_per_second
+        self.failure_rate: float = failure_rate
+        self.calls: int = 0
+
+    def _first_token_delay(self) -> float:
+        if self._distribution == "lognormal":
+            return random.lognormvariate(math.log(self._latency), self._jitter) if self._latency > 0 else 0.0
+        return max(0.0, self._latency + random.uniform(-self._jitter, self._jitter))
+
+    async def _wait_first_token(self) -> None:
+        self.calls += 1
+        await asyncio.sleep(self._first_token_delay())
+        if random.random() < self.failure_rate:
+            raise RuntimeError(f"{self.name} injected failure")
+
+    @staticmethod
+    def _record_usage(
+            conversation: ConversationModel,
+            usage: UsageModel,
+            output_tokens: int
+    ) -> None:
+        usage.input_tokens = count_tokens(conversation.system) + count_tokens(conversation.context) + sum(
+            count_tokens(message.content) for message in conversation.messages)
+        usage.output_tokens = output_tokens
+
+    async def _generate(
+            self,
+            conversation: ConversationModel,
+            usage: UsageModel
+    ) -> str:
+        await self._wait_first_token()
+        await asyncio.sleep(self._tokens / self._tokens_per_second)
+        self._record_usage(conversation, usage, self._tokens)
+        return " ".join(f"token{i}" for i in range(self._tokens))
+
+    async def _stream(
+            self,
+            conversation: ConversationModel,
+            usage: UsageModel
+    ) -> AsyncIterator[str]:
+        await self._wait_first_token()
+        for i in range(self._tokens):
+            yield f"token{i} "
+            await asyncio.sleep(1 / self._tokens_per_second)
+        self._record_usage(conversation, usage, self._tokens)
@@ -0,0 +1,50 @@
+"""
+Wires the chat service singleton used by the FastAPI app to fake
+backends, so benchmarks exercise the real routes, service, cache and
+router code without MongoDB or LLM API keys.
+"""
+import os
+
+# The real clients are only built when the app starts unwired, they only need a value.
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("API_KEY", "default-dev-key")
+
+from base.mongodb_repository_base import MongoDBRepositoryBase
+from benchmark.fake_providers import FakeProvider
+from cache.memory_thread_cache_backend import MemoryThreadCacheBackend
+from cache.thread_cache import ThreadCache
+from service.chat_service import ChatService, chat_service
+from service.provider_router import ProviderRouter
+from service.summary_worker import SummaryWorker
+
+API_KEY: str = os.environ["API_KEY"]
+
+
+def fake_providers(
+        latency: float = 0.02,
+        jitter: float = 0.3,
+        tokens: int = 20,
+        tokens_per_second: float = 1000.0
+) -> list[FakeProvider]:
+    # Lognormal first token latency, Gemini as primary and OpenAI as fallback like production.
+    return [
+        FakeProvider(name="gemini", latency=latency, jitter=jitter, distribution="lognormal",
+                     tokens=tokens, tokens_per_second=tokens_per_second),
+        FakeProvider(name="openai", latency=latency * 1.5, jitter=jitter, distribution="lognormal",
+                     tokens=tokens, tokens_per_second=tokens_per_second)
+    ]
+
+
+def wire_chat_service(
+        repository: MongoDBRepositoryBase,
+        providers: list[FakeProvider],
+        service: ChatService = chat_service
+) -> ChatService:
+    provider_router: ProviderRouter = ProviderRouter(providers, weights={"gemini": 1.0, "openai": 0.0}, hedging=False)
+    thread_cache: ThreadCache = ThreadCache(MemoryThreadCacheBackend(64 * 1024 * 1024, 300))
+    service._context_repository = repository
+    service._provider_router = provider_router
+    service._thread_cache = thread_cache
+    service._summary_worker = SummaryWorker(repository, provider_router, thread_cache)
+    return service
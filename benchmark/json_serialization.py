@@ -0,0 +1,126 @@
+"""
+Compares the serialization of a chat history response before and after
+the direct path. "dict" is the former pipeline: every message dumped to
+a dict, validated again by ResponseModel, dumped once more and encoded
+by JSONResponse with the json module. "model" builds the response with
+model_construct and ModelResponse serializes it in pydantic-core. Both
+produce the same bytes, which is checked first.
+
+Every path reports the median time over the runs and the peak memory
+allocated while building one response, measured with tracemalloc in a
+separate pass. A full GET of the thread through the app, repository
+copy and middlewares included, is measured last.
+
+Run with: python -m benchmark.json_serialization [--messages 10000] [--runs 20]
+"""
+import argparse
+import asyncio
+import datetime
+import statistics
+import time
+import tracemalloc
+from typing import Callable
+
+import httpx
+from starlette.responses import JSONResponse
+
+from benchmark.harness import API_KEY, fake_providers, wire_chat_service
+from benchmark.memory_context_repository import MemoryContextRepository
+from db.model.chat_thread_model import ChatThreadModel
+from db.model.history_page_model import HistoryPageModel
+from db.model.message_model import MessageModel
+from response_models.chat_history_data import ChatHistoryData
+from response_models.response_model import ResponseModel
+from util.model_response import ModelResponse
+
+from app import app
+
+
+def _history_page(messages: int) -> HistoryPageModel:
+    now: str = datetime.datetime.now().isoformat()
+    return HistoryPageModel(
+        chat_id="serialization",
+        updated_at=now,
+        total=messages,
+        first_seq=0,
+        history=[MessageModel(created_at=now, role="user" if i % 2 == 0 else "ai",
+                              content=f"رسالة تجريبية رقم {i} " * 8) for i in range(messages)]
+    )
+
+
+def _dict_path(history_page: HistoryPageModel) -> bytes:
+    data: dict = {"history": [message.model_dump() for message in history_page.history],
+                  "first_seq": history_page.first_seq,
+                  "total": history_page.total}
+    return JSONResponse(content=ResponseModel(success=True, message="ok", data=data).model_dump()).body
+
+
+def _model_path(history_page: HistoryPageModel) -> bytes:
+    data: ChatHistoryData = ChatHistoryData.model_construct(
+        history=history_page.history, first_seq=history_page.first_seq, total=history_page.total)
+    return ModelResponse(content=ResponseModel.model_construct(success=True, message="ok", data=data)).body
+
+
+def _measure(
+        path: Callable[[HistoryPageModel], bytes],
+        history_page: HistoryPageModel,
+        runs: int
+) -> tuple[float, float]:
+    durations: list[float] = []
+    for _ in range(runs):
+        started: float = time.perf_counter()
+        path(history_page)
+        durations.append(time.perf_counter() - started)
+    tracemalloc.start()
+    path(history_page)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(durations), peak / (1024 * 1024)
+
+
+async def _measure_route(
+        history_page: HistoryPageModel,
+        runs: int
+) -> tuple[float, int]:
+    repository: MemoryContextRepository = MemoryContextRepository()
+    wire_chat_service(repository, fake_providers())
+    repository._documents[history_page.chat_id] = ChatThreadModel(
+        user_uid="serialization-user", chat_name="benchmark", chat_id=history_page.chat_id,
+        created_at=history_page.updated_at, updated_at=history_page.updated_at, history=history_page.history
+    ).model_dump()
+    durations: list[float] = []
+    size: int = 0
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+        for _ in range(runs):
+            started: float = time.perf_counter()
+            response: httpx.Response = await client.get(
+                f"/api/chat/get_chat_history/{history_page.chat_id}", headers={"X-API-Key": API_KEY})
+            durations.append(time.perf_counter() - started)
+            response.raise_for_status()
+            size = len(response.content)
+    return statistics.median(durations), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the chat history serialization paths.")
+    parser.add_argument("--messages", type=int, default=10000, help="Messages of the serialized history.")
+    parser.add_argument("--runs", type=int, default=20, help="Runs per path, the median is reported.")
+    args = parser.parse_args()
+
+    history_page: HistoryPageModel = _history_page(args.messages)
+    if _dict_path(history_page) != _model_path(history_page):
+        raise SystemExit("The serialization paths produce different bytes.")
+
+    print(f"{args.messages} messages, median of {args.runs} runs")
+    results: dict[str, tuple[float, float]] = {name: _measure(path, history_page, args.runs)
+                                               for name, path in (("dict", _dict_path), ("model", _model_path))}
+    for name, (duration, peak) in results.items():
+        print(f"  {name:<6} {duration * 1000:8.2f}ms  peak alloc {peak:7.1f}MB")
+    print(f"  speedup {results['dict'][0] / results['model'][0]:.1f}x")
+
+    duration, size = asyncio.run(_measure_route(history_page, args.runs))
+    print(f"GET get_chat_history through the app: {duration * 1000:.2f}ms for {size / 1024:.0f}KB")
+
+
+if __name__ == "__main__":
+    main()
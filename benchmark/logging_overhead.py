@@ -0,0 +1,103 @@
+"""
+Measures what logging costs a send_message turn. The same sequential
+turns run with logging disabled, at the default INFO level and with
+every application logger at DEBUG, rounds of the three modes are
+interleaved so machine noise hits all of them alike. Providers answer
+almost instantly, so the logging share is not hidden behind LLM
+latency. The log output goes to /dev/null, CPU time includes the log
+listener thread.
+
+Run with: python -m benchmark.logging_overhead [--turns 200] [--rounds 5]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+from util.logger import configure_logging, get_logger
+
+configure_logging(open(os.devnull, "w"))
+
+import httpx
+
+from benchmark.harness import fake_providers, wire_chat_service
+from benchmark.memory_context_repository import MemoryContextRepository
+from benchmark.stats import percentile
+from benchmark.suite import _seed_thread, _send
+
+from app import app
+
+APPLICATION_PACKAGES: tuple[str, ...] = ("cache", "middleware", "provider", "repository", "routes", "service", "util")
+
+
+def _set_mode(mode: str) -> None:
+    logging.disable(logging.CRITICAL if mode == "disabled" else logging.NOTSET)
+    for package in APPLICATION_PACKAGES:
+        logging.getLogger(package).setLevel(logging.DEBUG if mode == "debug" else logging.INFO)
+
+
+async def _round(
+        client: httpx.AsyncClient,
+        chat_id: str,
+        turns: int
+) -> tuple[list[float], float]:
+    latencies: list[float] = []
+    cpu_started: float = time.process_time()
+    for i in range(turns):
+        started: float = time.perf_counter()
+        if not await _send(client, chat_id, f"message {i}"):
+            raise AssertionError("send_message failed")
+        latencies.append(time.perf_counter() - started)
+    return latencies, (time.process_time() - cpu_started) / turns
+
+
+def _emit_cost(calls: int) -> float:
+    # Caller side cost of one enabled log call, formatting happens in the listener.
+    # NOTE: Keep calls below LOG_QUEUE_SIZE, dropped records would look cheaper.
+    logger: logging.Logger = get_logger("service.benchmark")
+    started: float = time.perf_counter()
+    for i in range(calls):
+        logger.info("Built context, messages: %d, tokens: %d, truncated: %s", i, i * 10, False)
+    return (time.perf_counter() - started) / calls
+
+
+async def run(turns: int, rounds: int) -> None:
+    repository: MemoryContextRepository = MemoryContextRepository(latency=0.0)
+    service = wire_chat_service(repository, fake_providers(latency=0.001, tokens=20, tokens_per_second=100000.0))
+    modes: tuple[str, ...] = ("disabled", "info", "debug")
+    latencies: dict[str, list[float]] = {mode: [] for mode in modes}
+    cpu: dict[str, list[float]] = {mode: [] for mode in modes}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+        # Warm up, then one fresh thread per mode and round so thread length does not favour a mode.
+        _set_mode("info")
+        await _round(client, _seed_thread(repository, "logging-user", 0), 20)
+        for _ in range(rounds):
+            for mode in modes:
+                _set_mode(mode)
+                round_latencies, round_cpu = await _round(client, _seed_thread(repository, "logging-user", 0), turns)
+                latencies[mode].extend(round_latencies)
+                cpu[mode].append(round_cpu)
+    await service._summary_worker.stop()
+
+    _set_mode("info")
+    baseline_cpu: float = statistics.median(cpu["disabled"])
+    for mode in modes:
+        median_cpu: float = statistics.median(cpu[mode])
+        print(f"{mode:<9} | p50: {percentile(latencies[mode], 50) * 1000:7.3f}ms | "
+              f"p99: {percentile(latencies[mode], 99) * 1000:7.3f}ms | cpu/turn: {median_cpu * 1000:7.3f}ms "
+              f"({(median_cpu - baseline_cpu) / baseline_cpu:+.1%})")
+    print(f"enabled log call on the request path: {_emit_cost(5000) * 1e6:.2f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the logging overhead of send_message.")
+    parser.add_argument("--turns", type=int, default=200, help="Turns per mode and round.")
+    parser.add_argument("--rounds", type=int, default=5, help="Interleaved rounds of every mode.")
+    args = parser.parse_args()
+    asyncio.run(run(args.turns, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
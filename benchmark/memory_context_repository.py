@@ -0,0 +1,228 @@
+"""
+In-memory stand-in for ContextRepository, so the service and routes can
+be benchmarked without a MongoDB server. Documents are stored as dicts
+and copied on every read and write like a database round trip would,
+and every call can wait a fixed latency to simulate the network.
+"""
+import asyncio
+import base64
+import copy
+import json
+
+from base.mongodb_repository_base import MongoDBRepositoryBase
+from db.model.chat_thread_model import ChatThreadModel
+from db.model.chat_thread_meta_model import ChatThreadMetaModel
+from db.model.history_page_model import HistoryPageModel
+from db.model.message_model import MessageModel
+from exception.chat_thread_conflict_error import ChatThreadConflictError
+
+
+class MemoryContextRepository(MongoDBRepositoryBase):
+    def __init__(
+            self,
+            latency: float = 0.0
+    ):
+        self._latency: float = latency
+        self._documents: dict[str, dict] = {}
+
+    async def _round_trip(self) -> None:
+        # Always yields to the event loop, like a real driver call.
+        await asyncio.sleep(self._latency)
+
+    async def _ensure_db_setup(self):
+        pass
+
+    async def insert_one(
+            self,
+            document: ChatThreadModel
+    ) -> bool:
+        await self._round_trip()
+        self._documents[document.chat_id] = document.model_dump()
+        return True
+
+    async def insert_many(
+            self,
+            documents: list[ChatThreadModel]
+    ) -> bool:
+        await self._round_trip()
+        for document in documents:
+            self._documents[document.chat_id] = document.model_dump()
+        return True
+
+    async def get_one_by_id(
+            self,
+            id: str
+    ) -> ChatThreadModel | None:
+        await self._round_trip()
+        document: dict | None = self._documents.get(id)
+        return ChatThreadModel(**copy.deepcopy(document)) if document else None
+
+    async def get_all(self) -> list[ChatThreadModel] | None:
+        await self._round_trip()
+        return [ChatThreadModel(**copy.deepcopy(document)) for document in self._documents.values()]
+
+    async def get_all_by_uid(
+            self,
+            uid: str
+    ) -> list[ChatThreadModel] | None:
+        await self._round_trip()
+        return [ChatThreadModel(**copy.deepcopy(document))
+                for document in self._documents.values() if document["user_uid"] == uid]
+
+    async def update_one(
+            self,
+            chat_history: ChatThreadModel
+    ) -> bool:
+        await self._round_trip()
+        document: dict | None = self._documents.get(chat_history.chat_id)
+        if document is None or document["version"] != chat_history.version:
+            raise ChatThreadConflictError(chat_history.chat_id)
+        self._documents[chat_history.chat_id] = {**chat_history.model_dump(), "version": chat_history.version + 1}
+        chat_history.version += 1
+        return True
+
+    async def update_many(
+            self,
+            chat_history: ChatThreadModel
+    ) -> bool:
+        return False
+
+    async def update_chat_name(
+            self,
+            chat_id: str,
+            chat_name: str,
+            updated_at: str
+    ) -> bool | None:
+        await self._round_trip()
+        document: dict | None = self._documents.get(chat_id)
+        if document is None:
+            return False
+        document.update({"chat_name": chat_name, "updated_at": updated_at})
+        return True
+
+    async def push_messages(
+            self,
+            chat_id: str,
+            messages: list[MessageModel],
+            updated_at: str,
+            expected_version: int | None = None
+    ) -> bool:
+        await self._round_trip()
+        document: dict | None = self._documents.get(chat_id)
+        if document is None or (expected_version is not None and document["version"] != expected_version):
+            if expected_version is not None:
+                raise ChatThreadConflictError(chat_id)
+            return False
+        document["history"].extend(message.model_dump() for message in messages)
+        document["updated_at"] = updated_at
+        document["version"] += 1
+        return True
+
+    async def push_messages_many(
+            self,
+            turns: dict[str, list[MessageModel]],
+            updated_at: str
+    ) -> bool:
+        results: list[bool] = [await self.push_messages(chat_id, messages, updated_at)
+                               for chat_id, messages in turns.items()]
+        return all(results)
+
+    async def update_summary(
+            self,
+            chat_id: str,
+            summary: str,
+            summary_upto: int,
+            previous_summary_upto: int
+    ) -> bool:
+        await self._round_trip()
+        document: dict | None = self._documents.get(chat_id)
+        if document is None or document["summary_upto"] != previous_summary_upto:
+            return False
+        document.update({"summary": summary, "summary_upto": summary_upto})
+        return True
+
+    async def delete_one(
+            self,
+            chat_history: ChatThreadModel
+    ) -> bool:
+        return await self.delete_one_by_id(chat_history.chat_id)
+
+    async def delete_one_by_id(
+            self,
+            id: str
+    ) -> bool:
+        await self._round_trip()
+        return self._documents.pop(id, None) is not None
+
+    @staticmethod
+    def _meta(document: dict) -> ChatThreadMetaModel:
+        return ChatThreadMetaModel(**{key: value for key, value in document.items() if key != "history"})
+
+    async def get_meta_by_id(
+            self,
+            id: str
+    ) -> ChatThreadMetaModel | None:
+        await self._round_trip()
+        document: dict | None = self._documents.get(id)
+        return self._meta(document) if document else None
+
+    async def get_version_by_id(
+            self,
+            id: str
+    ) -> int | None:
+        await self._round_trip()
+        document: dict | None = self._documents.get(id)
+        return document["version"] if document else None
+
+    async def get_thread_list_by_uid(
+            self,
+            uid: str,
+            limit: int | None = None,
+            cursor: str | None = None
+    ) -> tuple[list[ChatThreadMetaModel], str | None] | None:
+        await self._round_trip()
+        documents: list[dict] = sorted(
+            (document for document in self._documents.values() if document["user_uid"] == uid),
+            key=lambda document: (document["updated_at"], document["chat_id"]), reverse=True)
+        if cursor:
+            position: list = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            documents = [document for document in documents
+                         if [document["updated_at"], document["chat_id"]] < position]
+        threads: list[ChatThreadMetaModel] = [self._meta(document) for document in documents]
+        next_cursor: str | None = None
+        if limit and len(threads) > limit:
+            threads = threads[:limit]
+            next_cursor = base64.urlsafe_b64encode(
+                json.dumps([threads[-1].updated_at, threads[-1].chat_id]).encode("utf-8")).decode("ascii")
+        return threads, next_cursor
+
+    async def get_history_page_by_id(
+            self,
+            id: str,
+            limit: int | None = None,
+            before: int | None = None,
+            after: int | None = None,
+            since: str | None = None
+    ) -> HistoryPageModel | None:
+        await self._round_trip()
+        document: dict | None = self._documents.get(id)
+        if document is None:
+            return None
+        history: list[dict] = document["history"]
+        total: int = len(history)
+        indexes: list[int]
+        if since is not None:
+            indexes = [i for i, message in enumerate(history) if message["created_at"] > since][:limit or None]
+        elif after is not None:
+            start: int = min(after + 1, total)
+            indexes = list(range(start, min(start + limit, total) if limit else total))
+        else:
+            end: int = min(before, total) if before is not None else total
+            indexes = list(range(max(end - limit, 0) if limit else 0, end))
+        return HistoryPageModel(
+            chat_id=id,
+            updated_at=document["updated_at"],
+            total=total,
+            first_seq=indexes[0] if indexes else total,
+            history=[MessageModel(**history[i]) for i in indexes]
+        )
@@ -0,0 +1,57 @@
+"""
+Compares the number of BSON bytes sent to MongoDB per chat turn
+when the whole thread is rewritten with `$set` against the
+append-only `$push` update used by ContextRepository.
+
+Run with: python -m benchmark.message_persistence
+"""
+import datetime
+import uuid
+
+import bson
+
+from db.model.chat_thread_model import ChatThreadModel
+from db.model.message_model import MessageModel
+from repository.context_repository import ContextRepository
+
+HISTORY_SIZES: list[int] = [0, 10, 100, 400, 1000, 5000]
+
+
+def _make_message(
+        role: str,
+        index: int
+) -> MessageModel:
+    return MessageModel(
+        created_at=datetime.datetime.now().isoformat(),
+        role=role,
+        content=f"رسالة تجريبية رقم {index} " * 8
+    )
+
+
+def _make_thread(history_size: int) -> ChatThreadModel:
+    now: str = datetime.datetime.now().isoformat()
+    return ChatThreadModel(
+        user_uid="benchmark-user",
+        chat_name="benchmark",
+        chat_id=str(uuid.uuid4()),
+        created_at=now,
+        updated_at=now,
+        history=[_make_message("user" if i % 2 == 0 else "ai", i) for i in range(history_size)]
+    )
+
+
+def main():
+    print(f"{'history':>8} | {'$set bytes':>12} | {'$push bytes':>12}")
+    print("-" * 38)
+    for history_size in HISTORY_SIZES:
+        chat_thread: ChatThreadModel = _make_thread(history_size)
+        turn: list[MessageModel] = [_make_message("user", history_size), _make_message("ai", history_size + 1)]
+        chat_thread.history.extend(turn)
+
+        set_bytes: int = len(bson.encode({"$set": chat_thread.model_dump()}))
+        push_bytes: int = len(bson.encode(ContextRepository._build_push_update(turn, chat_thread.updated_at)))
+        print(f"{history_size:>8} | {set_bytes:>12} | {push_bytes:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Shows that generations running through LLMProviderBase overlap on the
+event loop instead of serializing, and that the per-provider
+concurrency cap bounds how many run at once.
+
+Run with: python -m benchmark.provider_concurrency
+"""
+import asyncio
+import time
+
+from benchmark.fake_providers import FakeProvider
+from provider.model.conversation_model import ConversationModel
+
+IN_FLIGHT: int = 20
+LATENCY: float = 0.5
+
+
+async def _measure(max_concurrency: int) -> tuple[float, float]:
+    provider: FakeProvider = FakeProvider(latency=LATENCY, tokens=10, max_concurrency=max_concurrency)
+    max_loop_lag: float = 0.0
+    done: bool = False
+
+    async def ticker():
+        # Measures how late the event loop wakes up while generations run.
+        nonlocal max_loop_lag
+        while not done:
+            started: float = time.perf_counter()
+            await asyncio.sleep(0.01)
+            max_loop_lag = max(max_loop_lag, time.perf_counter() - started - 0.01)
+
+    async def consume() -> str:
+        return "".join([delta async for delta in provider.stream(ConversationModel())])
+
+    ticker_task: asyncio.Task = asyncio.create_task(ticker())
+    started: float = time.perf_counter()
+    await asyncio.gather(*[consume() for _ in range(IN_FLIGHT)])
+    elapsed: float = time.perf_counter() - started
+    done = True
+    await ticker_task
+    return elapsed, max_loop_lag
+
+
+async def main():
+    single: float = LATENCY + 10 / 50.0
+    print(f"{IN_FLIGHT} generations, ~{single:.2f}s each")
+    for max_concurrency in [IN_FLIGHT, IN_FLIGHT // 4]:
+        elapsed, max_loop_lag = await _measure(max_concurrency)
+        print(f"cap={max_concurrency:>3} | wall={elapsed:6.2f}s | "
+              f"expected~{single * -(-IN_FLIGHT // max_concurrency):6.2f}s | max loop lag={max_loop_lag * 1000:6.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+"""
+Drives ProviderRouter with fake providers to show the circuit breaker
+taking a failing provider out of rotation, and hedging cutting the tail
+latency of a provider with occasional slow first tokens.
+
+Run with: python -m benchmark.provider_router
+"""
+import asyncio
+import random
+import time
+
+from benchmark.fake_providers import FakeProvider
+from provider.model.conversation_model import ConversationModel
+from service.provider_router import ProviderRouter
+
+REQUESTS: int = 200
+# Hedging needs a latency history first, these requests are left out of the percentiles.
+WARMUP: int = 50
+
+
+class SlowTailProvider(FakeProvider):
+    # Three requests in a hundred wait ten times longer for their first token.
+    def _first_token_delay(self) -> float:
+        return self._latency * (10 if random.random() < 0.03 else 1)
+
+
+async def _consume(router: ProviderRouter) -> float:
+    started: float = time.perf_counter()
+    async for _ in router.stream(ConversationModel()):
+        break
+    return time.perf_counter() - started
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    ordered: list[float] = sorted(values)
+    return ordered[min(len(ordered) - 1, int(percentile / 100 * len(ordered)))]
+
+
+async def circuit_breaker():
+    primary: FakeProvider = FakeProvider(name="primary", latency=0.05, tokens=1, failure_rate=1.0)
+    secondary: FakeProvider = FakeProvider(name="secondary", latency=0.01, tokens=1)
+    router: ProviderRouter = ProviderRouter([primary, secondary], hedging=False)
+    for _ in range(REQUESTS):
+        await _consume(router)
+    print(f"circuit breaker | primary calls: {primary.calls:>4} | secondary calls: {secondary.calls:>4} | "
+          f"primary state: {router.stats()['primary']['state']}")
+
+
+async def hedging(enabled: bool):
+    primary: SlowTailProvider = SlowTailProvider(name="primary", latency=0.02, tokens=1)
+    secondary: FakeProvider = FakeProvider(name="secondary", latency=0.03, tokens=1)
+    router: ProviderRouter = ProviderRouter([primary, secondary], hedging=enabled)
+    latencies: list[float] = [await _consume(router) for _ in range(WARMUP + REQUESTS)][WARMUP:]
+    print(f"hedging={str(enabled):<5}   | p50: {_percentile(latencies, 50) * 1000:6.1f}ms | "
+          f"p99: {_percentile(latencies, 99) * 1000:6.1f}ms | secondary calls: {secondary.calls:>4}")
+
+
+async def main():
+    await circuit_breaker()
+    await hedging(False)
+    await hedging(True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
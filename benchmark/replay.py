@@ -0,0 +1,228 @@
+"""
+Replays a traffic recording made with TRAFFIC_RECORD_PATH, keeping the
+recorded arrival times divided by --speed, the route mix, message sizes,
+chat reuse and thread lengths. The target is normally a local instance
+started with benchmark/stub_server.py. --in-process replays against the
+app in this process with an in-memory repository instead.
+
+Threads that were created before the recording started are seeded with
+their recorded length directly in the database, through the repository
+of CHAT_STORAGE_LAYOUT at MONGO_URI (--seed-mongo), or in the in-memory
+repository. Without either they start empty.
+
+Run with: python -m benchmark.replay recording.ndjson [--target http://127.0.0.1:8000] [--speed 10] [--seed-mongo]
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import time
+import uuid
+
+import httpx
+
+from base.mongodb_repository_base import MongoDBRepositoryBase
+from benchmark.stats import percentile
+from db.model.chat_thread_model import ChatThreadModel
+from db.model.message_model import MessageModel
+
+API_KEY: str = os.getenv("API_KEY", "default-dev-key")
+FILLER: str = "هذه رسالة تجريبية لإعادة تشغيل حركة المرور "
+
+
+def _text(chars: int) -> str:
+    return (FILLER * (chars // len(FILLER) + 1))[:max(chars, 1)]
+
+
+class Replayer:
+    def __init__(
+            self,
+            client: httpx.AsyncClient,
+            speed: float,
+            seed_repository: MongoDBRepositoryBase | None
+    ):
+        self._client: httpx.AsyncClient = client
+        self._speed: float = speed
+        self._seed_repository: MongoDBRepositoryBase | None = seed_repository
+        self._headers: dict = {"X-API-Key": API_KEY}
+        # Recorded (anonymized) chat id -> creation of the chat it is replayed as.
+        self._chats: dict[str, asyncio.Task] = {}
+        self.results: dict[str, list[tuple[float, bool]]] = {}
+        self.lag: list[float] = []
+
+    async def _create_chat(
+            self,
+            user: str
+    ) -> str | None:
+        response: httpx.Response = await self._client.post(
+            "/api/chat/create_chat_thread", json={"user_uid": user, "chat_name": "replay"}, headers=self._headers)
+        return response.json().get("data", {}).get("chat_id") if response.status_code == 200 else None
+
+    async def _seed_chat(
+            self,
+            user: str,
+            history_length: int
+    ) -> str | None:
+        if self._seed_repository is None:
+            return await self._create_chat(user)
+        now: str = datetime.datetime.now().isoformat()
+        chat_thread: ChatThreadModel = ChatThreadModel(
+            user_uid=user,
+            chat_name="replay",
+            chat_id=str(uuid.uuid4()),
+            created_at=now,
+            updated_at=now,
+            history=[MessageModel(created_at=now, role="user" if i % 2 == 0 else "ai", content=_text(200))
+                     for i in range(history_length)]
+        )
+        await self._seed_repository.insert_one(chat_thread)
+        return chat_thread.chat_id
+
+    def _chat(self, record: dict) -> asyncio.Task:
+        anonymous_chat: str = record["chat"]
+        if anonymous_chat not in self._chats:
+            # The recorded length includes the messages the request itself added.
+            history_length: int = record.get("history_length") or 0
+            if record["route"] == "/api/chat/send_message" and record["status"] == 200:
+                history_length = max(0, history_length - 2)
+            self._chats[anonymous_chat] = asyncio.create_task(
+                self._seed_chat(record.get("user") or "replay", history_length))
+        return self._chats[anonymous_chat]
+
+    @staticmethod
+    def _ok(response: httpx.Response) -> bool:
+        # A streamed answer reports provider failures inside the stream.
+        return response.status_code < 500 and '"error"' not in response.text
+
+    async def _send(self, record: dict) -> bool | None:
+        route: str = record["route"]
+        params: dict = {key: value for key, value in record.get("query", {}).items() if not isinstance(value, bool)}
+        if route == "/api/chat/create_chat_thread":
+            task: asyncio.Task = asyncio.create_task(self._create_chat(record.get("user") or "replay"))
+            if record.get("chat"):
+                self._chats.setdefault(record["chat"], task)
+            return await task is not None
+        if route == "/api/chat/get_all_chats/{user_uid}":
+            return self._ok(await self._client.get(f"/api/chat/get_all_chats/{record.get('user') or 'replay'}",
+                                                   params=params, headers=self._headers))
+        if not record.get("chat"):
+            return None
+
+        chat_id: str | None = await self._chat(record)
+        if chat_id is None:
+            return False
+        response: httpx.Response
+        if route == "/api/chat/send_message":
+            response = await self._client.post("/api/chat/send_message", headers=self._headers,
+                                               json={"chat_id": chat_id, "message": _text(record.get("message_chars", 20))})
+        elif route == "/api/chat/get_chat_history/{chat_id}":
+            response = await self._client.get(f"/api/chat/get_chat_history/{chat_id}", params=params, headers=self._headers)
+        elif route == "/api/chat/update_chat_name/{chat_id}/{new_chat_name}":
+            response = await self._client.patch(f"/api/chat/update_chat_name/{chat_id}/replay", headers=self._headers)
+        elif route == "/api/chat/delete_chat_thread/{chat_id}":
+            response = await self._client.delete(f"/api/chat/delete_chat_thread/{chat_id}", headers=self._headers)
+        else:
+            return None
+        return self._ok(response)
+
+    async def _replay_one(self, record: dict) -> None:
+        started: float = time.perf_counter()
+        ok: bool | None
+        try:
+            ok = await self._send(record)
+        except Exception:
+            ok = False
+        if ok is None:
+            # Routes the replay does not know are skipped.
+            return
+        self.results.setdefault(record["route"], []).append((time.perf_counter() - started, ok))
+
+    async def run(self, records: list[dict]) -> float:
+        tasks: list[asyncio.Task] = []
+        first: float = records[0]["ts"]
+        started: float = time.perf_counter()
+        for record in records:
+            due: float = (record["ts"] - first) / self._speed
+            delay: float = due - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # How late requests go out, a saturated client makes the results meaningless.
+            self.lag.append(max(0.0, -delay))
+            tasks.append(asyncio.create_task(self._replay_one(record)))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - started
+
+
+def _load(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as file:
+        records: list[dict] = [json.loads(line) for line in file if line.strip()]
+    return sorted(records, key=lambda record: record["ts"])
+
+
+def _report(replayer: Replayer, elapsed: float, speed: float, recorded: float) -> None:
+    total: int = sum(len(results) for results in replayer.results.values())
+    print(f"replayed {total} requests in {elapsed:.1f}s at {speed:g}x "
+          f"(recorded {recorded:.1f}s), {total / elapsed:.1f} req/s, "
+          f"schedule lag p99: {percentile(replayer.lag, 99) * 1000:.1f}ms")
+    for route, results in sorted(replayer.results.items()):
+        latencies: list[float] = [latency for latency, _ in results]
+        errors: int = sum(1 for _, ok in results if not ok)
+        print(f"{route:<55} | {len(results):>6} | p50: {percentile(latencies, 50) * 1000:8.1f}ms | "
+              f"p95: {percentile(latencies, 95) * 1000:8.1f}ms | p99: {percentile(latencies, 99) * 1000:8.1f}ms | "
+              f"errors: {errors}")
+
+
+async def replay(
+        path: str,
+        target: str | None,
+        speed: float,
+        seed_mongo: bool
+) -> None:
+    records: list[dict] = _load(path)
+    if not records:
+        print(f"{path} has no records.")
+        return
+    recorded: float = records[-1]["ts"] - records[0]["ts"]
+
+    seed_repository: MongoDBRepositoryBase | None = None
+    transport: httpx.AsyncBaseTransport
+    if target is None:
+        from benchmark.harness import fake_providers, wire_chat_service
+        from benchmark.memory_context_repository import MemoryContextRepository
+        from app import app
+        seed_repository = MemoryContextRepository()
+        wire_chat_service(seed_repository, fake_providers())
+        transport = httpx.ASGITransport(app=app)
+        target = "http://replay"
+    else:
+        transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=None))
+        if seed_mongo:
+            from repository.context_repository import ContextRepository
+            from repository.split_context_repository import SplitContextRepository
+            seed_repository = SplitContextRepository() \
+                if os.getenv("CHAT_STORAGE_LAYOUT", "embedded").lower() == "split" else ContextRepository()
+
+    async with httpx.AsyncClient(transport=transport, base_url=target, timeout=None) as client:
+        replayer: Replayer = Replayer(client, speed, seed_repository)
+        elapsed: float = await replayer.run(records)
+    _report(replayer, elapsed, speed, recorded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded chat API traffic trace.")
+    parser.add_argument("recording", help="NDJSON file written by TrafficRecorderMiddleware.")
+    parser.add_argument("--target", default="http://127.0.0.1:8000", help="Base URL of the instance to drive.")
+    parser.add_argument("--in-process", action="store_true", help="Replay against the app in this process.")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed, 10 replays ten times faster.")
+    parser.add_argument("--seed-mongo", action="store_true",
+                        help="Seed threads that existed before the recording in the MongoDB at MONGO_URI.")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    asyncio.run(replay(args.recording, None if args.in_process else args.target, args.speed, args.seed_mongo))
+
+
+if __name__ == "__main__":
+    main()
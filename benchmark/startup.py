@@ -0,0 +1,134 @@
+"""
+Measures the cold start of a worker in fresh interpreters: the time to
+import the app, summarized from `python -X importtime` by top level
+package, and the time from spawning `uvicorn app:app` until it answers
+its first request, lifespan startup included. MongoDB is pointed at a
+closed port that fails fast, so its setup does not dominate the result.
+
+Results can be saved as a JSON baseline and later runs compared against
+it like benchmark/suite.py. Numbers are only comparable between runs on
+the same machine.
+
+Run with: python -m benchmark.startup [--runs 5] [--save] [--baseline benchmark/startup_baseline.json]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmark.harness import API_KEY
+
+DEFAULT_BASELINE: str = os.path.join(os.path.dirname(__file__), "startup_baseline.json")
+ENVIRONMENT: dict = {
+    **os.environ,
+    "API_KEY": API_KEY,
+    "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY", "benchmark"),
+    "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "benchmark"),
+    "MONGO_URI": "mongodb://127.0.0.1:9/?serverSelectionTimeoutMS=100",
+    "LOG_LEVEL": "WARNING",
+    "PYTHONDONTWRITEBYTECODE": "1"
+}
+
+
+def _import_times() -> tuple[float, dict[str, float]]:
+    # Cumulative seconds of `import app` and of the packages it imports directly, from -X importtime.
+    completed: subprocess.CompletedProcess = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        env=ENVIRONMENT, capture_output=True, text=True, check=True)
+    packages: dict[str, float] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth: int = (len(name) - len(name.lstrip()) - 1) // 2
+        # Lines come children first, a top level line closes the imports listed since the previous one.
+        if depth == 0:
+            if name.strip() == "app":
+                return int(cumulative) / 1e6, packages
+            packages = {}
+        elif depth == 1:
+            package: str = name.strip().split(".")[0]
+            packages[package] = packages.get(package, 0.0) + int(cumulative) / 1e6
+    raise RuntimeError("import app is missing from the -X importtime output")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _first_response() -> float:
+    port: int = _free_port()
+    started: float = time.perf_counter()
+    process: subprocess.Popen = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        env=ENVIRONMENT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError("uvicorn exited before answering")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=1.0).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                time.sleep(0.01)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold start of a worker.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement.")
+    parser.add_argument("--top", type=int, default=10, help="Packages listed by import time.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file.")
+    parser.add_argument("--save", action="store_true", help="Save the results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression.")
+    args = parser.parse_args()
+
+    imports: list[tuple[float, dict[str, float]]] = [_import_times() for _ in range(args.runs)]
+    first_responses: list[float] = [_first_response() for _ in range(args.runs)]
+    results: dict = {
+        "import_app_ms": round(statistics.median(total for total, _ in imports) * 1000, 1),
+        "first_response_ms": round(statistics.median(first_responses) * 1000, 1)
+    }
+
+    print(f"import app:     {results['import_app_ms']:8.1f}ms (median of {args.runs})")
+    print(f"first response: {results['first_response_ms']:8.1f}ms (median of {args.runs})")
+    print("top level imports by cumulative time:")
+    packages: dict[str, float] = {package: statistics.median(run.get(package, 0.0) for _, run in imports)
+                                  for package in imports[0][1]}
+    for package, seconds in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {package:<30} {seconds * 1000:8.1f}ms")
+
+    if args.save:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save to create one.")
+        return
+    with open(args.baseline) as file:
+        baseline: dict = json.load(file)
+    regressions: list[str] = [
+        f"{metric}: {baseline[metric]} -> {value} ({(value - baseline[metric]) / baseline[metric]:+.0%})"
+        for metric, value in results.items()
+        if baseline.get(metric) and (value - baseline[metric]) / baseline[metric] > args.tolerance]
+    if regressions:
+        print("Regressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+"""
+Small statistics helpers shared by the benchmarks.
+"""
+import resource
+import sys
+
+
+def percentile(values: list[float], percentile: float) -> float:
+    ordered: list[float] = sorted(values)
+    return ordered[min(len(ordered) - 1, int(percentile / 100 * len(ordered)))] if ordered else 0.0
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
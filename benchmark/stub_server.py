@@ -0,0 +1,54 @@
+"""
+Serves the real API with fake LLM providers, against the MongoDB at
+MONGO_URI (a local one by default) or an in-memory repository, as the
+target of benchmark/replay.py when planning worker counts and pool
+sizes. Settings travel through the environment, so every uvicorn
+worker picks them up.
+
+Run with: python -m benchmark.stub_server [--port 8000] [--workers 1] [--memory] [--llm-latency 0.8]
+"""
+import argparse
+import os
+
+import uvicorn
+
+
+def create_app():
+    # Imported here so the fake environment is in place before the app is built.
+    from benchmark.harness import fake_providers, wire_chat_service
+    from benchmark.memory_context_repository import MemoryContextRepository
+    from repository.context_repository import ContextRepository
+    from app import app
+
+    repository = MemoryContextRepository() if os.getenv("STUB_REPOSITORY") == "memory" else ContextRepository()
+    wire_chat_service(repository, fake_providers(
+        latency=float(os.getenv("STUB_LLM_LATENCY", "0.8")),
+        tokens=int(os.getenv("STUB_LLM_TOKENS", "150")),
+        tokens_per_second=float(os.getenv("STUB_LLM_TOKENS_PER_SECOND", "80"))
+    ))
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API with fake LLM providers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--memory", action="store_true", help="Use an in-memory repository instead of MongoDB.")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Median first token latency in seconds.")
+    parser.add_argument("--llm-tokens", type=int, default=150, help="Tokens per answer.")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=80.0, help="Streaming rate of an answer.")
+    args = parser.parse_args()
+    if args.memory and args.workers > 1:
+        parser.error("--memory keeps a separate store in every worker, use it with a single worker")
+
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    os.environ["STUB_REPOSITORY"] = "memory" if args.memory else "mongo"
+    os.environ["STUB_LLM_LATENCY"] = str(args.llm_latency)
+    os.environ["STUB_LLM_TOKENS"] = str(args.llm_tokens)
+    os.environ["STUB_LLM_TOKENS_PER_SECOND"] = str(args.llm_tokens_per_second)
+    uvicorn.run("benchmark.stub_server:create_app", factory=True, host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Runs scripted scenarios through the real FastAPI app over an in-process
+ASGI client, with MemoryContextRepository in place of MongoDB and fake
+Gemini/OpenAI providers in place of the APIs. Every scenario reports
+p50/p95/p99 latency, throughput and the peak RSS of the process so far.
+
+Results can be saved as a JSON baseline and later runs compared against
+it, the run fails when a metric got worse by more than the tolerance.
+Numbers are only comparable between runs on the same machine.
+
+Run with: python -m benchmark.suite [--save] [--baseline benchmark/baseline.json] [--tolerance 0.25]
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from typing import Awaitable, Callable
+
+import httpx
+
+from benchmark.harness import API_KEY, fake_providers, wire_chat_service
+from benchmark.memory_context_repository import MemoryContextRepository
+from benchmark.stats import peak_rss_mb, percentile
+from db.model.chat_thread_model import ChatThreadModel
+from db.model.message_model import MessageModel
+
+from app import app
+
+DEFAULT_BASELINE: str = os.path.join(os.path.dirname(__file__), "baseline.json")
+HEADERS: dict = {"X-API-Key": API_KEY}
+
+# Lower is better for every metric except throughput.
+COMPARED_METRICS: dict[str, bool] = {
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "throughput_rps": True,
+    "peak_rss_mb": False
+}
+
+
+async def _run(
+        requests: list[Callable[[], Awaitable[bool]]],
+        concurrency: int
+) -> dict:
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors: int = 0
+
+    async def timed(request: Callable[[], Awaitable[bool]]) -> None:
+        nonlocal errors
+        async with semaphore:
+            started: float = time.perf_counter()
+            ok: bool = await request()
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started: float = time.perf_counter()
+    await asyncio.gather(*[timed(request) for request in requests])
+    elapsed: float = time.perf_counter() - started
+    return {
+        "requests": len(requests),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "throughput_rps": round(len(requests) / elapsed, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    }
+
+
+def _seed_thread(
+        repository: MemoryContextRepository,
+        user_uid: str,
+        messages: int
+) -> str:
+    now: str = datetime.datetime.now().isoformat()
+    chat_thread: ChatThreadModel = ChatThreadModel(
+        user_uid=user_uid,
+        chat_name="benchmark",
+        chat_id=str(uuid.uuid4()),
+        created_at=now,
+        updated_at=now,
+        history=[MessageModel(created_at=now, role="user" if i % 2 == 0 else "ai",
+                              content=f"رسالة تجريبية رقم {i} " * 8) for i in range(messages)]
+    )
+    # Seeded directly, the scenarios measure reads and writes, not the setup.
+    repository._documents[chat_thread.chat_id] = chat_thread.model_dump()
+    return chat_thread.chat_id
+
+
+async def _send(
+        client: httpx.AsyncClient,
+        chat_id: str,
+        message: str
+) -> bool:
+    response: httpx.Response = await client.post(
+        "/api/chat/send_message", json={"chat_id": chat_id, "message": message}, headers=HEADERS)
+    return response.status_code == 200 and '"error"' not in response.text
+
+
+async def create_thread(
+        client: httpx.AsyncClient,
+        repository: MemoryContextRepository,
+        scale: float
+) -> dict:
+    async def request() -> bool:
+        response: httpx.Response = await client.post(
+            "/api/chat/create_chat_thread", json={"user_uid": "create-user", "chat_name": "benchmark"}, headers=HEADERS)
+        return response.status_code == 200
+
+    return await _run([request] * int(500 * scale), concurrency=20)
+
+
+async def long_thread_send(
+        client: httpx.AsyncClient,
+        repository: MemoryContextRepository,
+        scale: float
+) -> dict:
+    chat_id: str = _seed_thread(repository, "long-user", 1000)
+    return await _run([lambda: _send(client, chat_id, "كيف حالك اليوم؟")] * int(50 * scale), concurrency=1)
+
+
+async def long_thread_history(
+        client: httpx.AsyncClient,
+        repository: MemoryContextRepository,
+        scale: float
+) -> dict:
+    chat_id: str = _seed_thread(repository, "history-user", 1000)
+
+    async def request() -> bool:
+        response: httpx.Response = await client.get(f"/api/chat/get_chat_history/{chat_id}", headers=HEADERS)
+        return response.status_code == 200
+
+    return await _run([request] * int(200 * scale), concurrency=10)
+
+
+async def listing(
+        client: httpx.AsyncClient,
+        repository: MemoryContextRepository,
+        scale: float
+) -> dict:
+    for _ in range(500):
+        _seed_thread(repository, "listing-user", 10)
+
+    async def request() -> bool:
+        response: httpx.Response = await client.get(
+            "/api/chat/get_all_chats/listing-user", params={"limit": 20}, headers=HEADERS)
+        return response.status_code == 200
+
+    return await _run([request] * int(500 * scale), concurrency=10)
+
+
+async def concurrent_sends(
+        client: httpx.AsyncClient,
+        repository: MemoryContextRepository,
+        scale: float
+) -> dict:
+    threads: int = max(1, int(20 * scale))
+    sends_per_thread: int = 10
+    chat_ids: list[str] = [_seed_thread(repository, "concurrent-user", 0) for _ in range(threads)]
+    requests: list[Callable[[], Awaitable[bool]]] = [
+        (lambda chat_id=chat_id, i=i: _send(client, chat_id, f"message {i}"))
+        for chat_id in chat_ids for i in range(sends_per_thread)]
+    result: dict = await _run(requests, concurrency=len(requests))
+
+    # Every accepted turn has to be stored as one user and one ai message, in order.
+    lost: int = 0
+    for chat_id in chat_ids:
+        history: list[dict] = repository._documents[chat_id]["history"]
+        lost += max(0, 2 * sends_per_thread - len(history))
+        if [message["role"] for message in history] != ["user", "ai"] * (len(history) // 2):
+            raise AssertionError(f"Interleaved turns in chat {chat_id}")
+    if lost:
+        raise AssertionError(f"{lost} messages were lost")
+    return result
+
+
+SCENARIOS: dict[str, Callable[[httpx.AsyncClient, MemoryContextRepository, float], Awaitable[dict]]] = {
+    "create_thread": create_thread,
+    "long_thread_send": long_thread_send,
+    "long_thread_history": long_thread_history,
+    "listing": listing,
+    "concurrent_sends": concurrent_sends
+}
+
+
+def _compare(
+        results: dict,
+        baseline: dict,
+        tolerance: float
+) -> list[str]:
+    regressions: list[str] = []
+    for scenario, metrics in results.items():
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            previous: float | None = baseline.get(scenario, {}).get(metric)
+            if not previous:
+                continue
+            change: float = (metrics[metric] - previous) / previous
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{scenario}.{metric}: {previous} -> {metrics[metric]} ({change:+.0%})")
+    return regressions
+
+
+async def run_suite(
+        scenarios: list[str],
+        scale: float,
+        db_latency: float
+) -> dict:
+    results: dict = {}
+    repository: MemoryContextRepository = MemoryContextRepository(latency=db_latency)
+    service = wire_chat_service(repository, fake_providers())
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+        for name in scenarios:
+            results[name] = await SCENARIOS[name](client, repository, scale)
+            print(f"{name:<20} | p50: {results[name]['p50_ms']:8.2f}ms | p95: {results[name]['p95_ms']:8.2f}ms | "
+                  f"p99: {results[name]['p99_ms']:8.2f}ms | {results[name]['throughput_rps']:8.1f} req/s | "
+                  f"errors: {results[name]['errors']:>3} | peak rss: {results[name]['peak_rss_mb']:7.1f}MB")
+    await service._summary_worker.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chat API with fake backends.")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="Run only these scenarios.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for the number of requests.")
+    parser.add_argument("--db-latency", type=float, default=0.001, help="Simulated database round trip in seconds.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file.")
+    parser.add_argument("--save", action="store_true", help="Save the results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression.")
+    parser.add_argument("--log", action="store_true", help="Keep the application's info logs.")
+    args = parser.parse_args()
+
+    if not args.log:
+        logging.disable(logging.INFO)
+    results: dict = asyncio.run(run_suite(args.scenario or list(SCENARIOS), args.scale, args.db_latency))
+
+    if args.save:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save to create one.")
+        return
+    with open(args.baseline) as file:
+        regressions: list[str] = _compare(results, json.load(file), args.tolerance)
+    if regressions:
+        print("Regressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Measures how the throughput of the API scales with the number of
+uvicorn workers. For every worker count a server like server.py runs
+the real app with fake LLM providers and an in-memory repository, and
+is loaded for a fixed time by a closed loop of concurrent clients.
+
+Every worker keeps its own in-memory store, so each one is seeded with
+the same long threads and the requests only target those: "history"
+reads the last 200 messages of one thread, CPU bound serialization
+that scales with the workers, "send" runs full turns, every client on
+its own thread as turns of one thread are serialized.
+
+The load generator is a single process. When its own CPU use gets
+close to one core it is the bottleneck and the numbers of the higher
+worker counts understate the server, the report flags it.
+
+Run with: python -m benchmark.worker_scaling [--workers 1,2,4] [--duration 10] [--scenario history]
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmark.harness import API_KEY
+from benchmark.stats import percentile
+
+CHAT_ID: str = "worker-scaling-{}"
+HEADERS: dict = {"X-API-Key": API_KEY}
+
+
+def create_app():
+    # uvicorn factory of every worker: the stub app with the benchmark threads seeded into its store.
+    from benchmark.stub_server import create_app as create_stub_app
+    from db.model.chat_thread_model import ChatThreadModel
+    from db.model.message_model import MessageModel
+    from service.chat_service import chat_service
+
+    app = create_stub_app()
+    now: str = datetime.datetime.now().isoformat()
+    history: list[MessageModel] = [MessageModel(created_at=now, role="user" if i % 2 == 0 else "ai",
+                                                content=f"رسالة تجريبية رقم {i} " * 8)
+                                   for i in range(int(os.getenv("SCALING_MESSAGES", "1000")))]
+    for thread in range(int(os.getenv("SCALING_THREADS", "1"))):
+        chat_thread: ChatThreadModel = ChatThreadModel(
+            user_uid="scaling-user",
+            chat_name="benchmark",
+            chat_id=CHAT_ID.format(thread),
+            created_at=now,
+            updated_at=now,
+            history=history
+        )
+        chat_service._context_repository._documents[chat_thread.chat_id] = chat_thread.model_dump()
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(
+        workers: int,
+        port: int,
+        messages: int,
+        threads: int
+) -> subprocess.Popen:
+    environment: dict = {
+        **os.environ,
+        "API_KEY": API_KEY,
+        "STUB_REPOSITORY": "memory",
+        # Short answers, the benchmark is about the server's own CPU work.
+        "STUB_LLM_LATENCY": "0.01",
+        "STUB_LLM_TOKENS": "20",
+        "STUB_LLM_TOKENS_PER_SECOND": "2000",
+        "SCALING_MESSAGES": str(messages),
+        "SCALING_THREADS": str(threads),
+        "LOG_LEVEL": "WARNING"
+    }
+    process: subprocess.Popen = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmark.worker_scaling:create_app", "--factory",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline: float = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn exited before answering")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1.0).status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("uvicorn did not answer within 60 seconds")
+
+
+def _chat_id(
+        scenario: str,
+        client: int
+) -> str:
+    return CHAT_ID.format(client if scenario == "send" else 0)
+
+
+async def _request(
+        client: httpx.AsyncClient,
+        scenario: str,
+        chat_id: str
+) -> bool:
+    if scenario == "history":
+        response: httpx.Response = await client.get(
+            f"/api/chat/get_chat_history/{chat_id}", params={"limit": 200}, headers=HEADERS)
+        return response.status_code == 200
+    response = await client.post(
+        "/api/chat/send_message", json={"chat_id": chat_id, "message": "كيف حالك اليوم؟"}, headers=HEADERS)
+    return response.status_code == 200 and '"error"' not in response.text
+
+
+async def _load(
+        port: int,
+        scenario: str,
+        concurrency: int,
+        duration: float,
+        warmup: float
+) -> dict:
+    latencies: list[float] = []
+    errors: int = 0
+    limits: httpx.Limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30.0) as client:
+        async def worker(chat_id: str, until: float, record: bool) -> None:
+            nonlocal errors
+            while time.perf_counter() < until:
+                started: float = time.perf_counter()
+                try:
+                    ok: bool = await _request(client, scenario, chat_id)
+                except httpx.HTTPError:
+                    ok = False
+                if record:
+                    latencies.append(time.perf_counter() - started)
+                    errors += not ok
+
+        # Warms every worker up (imports, caches) and spreads the connections over them.
+        warmup_until: float = time.perf_counter() + warmup
+        await asyncio.gather(*[worker(_chat_id(scenario, i), warmup_until, False) for i in range(concurrency)])
+
+        cpu_started: float = time.process_time()
+        started: float = time.perf_counter()
+        await asyncio.gather(*[worker(_chat_id(scenario, i), started + duration, True) for i in range(concurrency)])
+        elapsed: float = time.perf_counter() - started
+        client_cpu: float = (time.process_time() - cpu_started) / elapsed
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "client_cpu": round(client_cpu, 2)
+    }
+
+
+def _default_workers() -> str:
+    cpus: int = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    counts: list[int] = [1]
+    while counts[-1] * 2 <= cpus:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpus:
+        counts.append(cpus)
+    return ",".join(str(count) for count in counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure throughput from 1 to N uvicorn workers.")
+    parser.add_argument("--workers", default=_default_workers(), help="Comma separated worker counts.")
+    parser.add_argument("--scenario", choices=["history", "send"], default="history")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent client connections.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per worker count.")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before each run.")
+    parser.add_argument("--messages", type=int, default=1000, help="Messages of every seeded thread.")
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'rps':>9} {'speedup':>8} {'p50':>9} {'p99':>9} {'errors':>7} {'client cpu':>11}")
+    single: float | None = None
+    for workers in [int(count) for count in args.workers.split(",")]:
+        port: int = _free_port()
+        process: subprocess.Popen = _start_server(
+            workers, port, args.messages, args.concurrency if args.scenario == "send" else 1)
+        try:
+            result: dict = asyncio.run(_load(port, args.scenario, args.concurrency, args.duration, args.warmup))
+        finally:
+            process.terminate()
+            process.wait()
+        single = single or result["throughput_rps"]
+        print(f"{workers:>7} {result['throughput_rps']:>9.1f} {result['throughput_rps'] / single:>7.2f}x "
+              f"{result['p50_ms']:>7.1f}ms {result['p99_ms']:>7.1f}ms {result['errors']:>7} "
+              f"{result['client_cpu']:>10.0%}{'  (client bound)' if result['client_cpu'] > 0.9 else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator
+
+from dotenv import load_dotenv
+
+from base.generation_store_backend_base import GenerationStoreBackendBase
+from cache.memory_generation_store_backend import MemoryGenerationStoreBackend
+from util.logger import get_logger
+
+load_dotenv()
+
+# How often a generation running in another worker is read from the backend.
+POLL_INTERVAL: float = 0.1
+# How often a follower in another worker tells the generating one it is still there.
+FOLLOW_MARK_INTERVAL: float = 1.0
+
+
+class _RunningGeneration:
+    # Events of a generation running in this worker, followers are woken by every new one.
+    def __init__(
+            self,
+            fingerprint: str
+    ):
+        self.fingerprint: str = fingerprint
+        self.events: list[dict] = []
+        self.finished: bool = False
+        # False once the backend missed an event, it then holds no usable copy.
+        self.stored: bool = True
+        self.changed: asyncio.Event = asyncio.Event()
+        # Followers in this worker and when the last of them left, the request starting
+        # the generation counts as following it from its creation on.
+        self.followers: int = 0
+        self.last_followed: float = time.monotonic()
+
+    def notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class GenerationStore:
+    """
+    Keeps the events of answer generations for GENERATION_TTL seconds,
+    so a retried request can replay a finished one or follow one that is
+    still running instead of generating again.
+
+    The worker running a generation also keeps its events in memory
+    while it runs, its own followers read them from there without delay
+    and keep working when the backend fails. A generation the backend
+    missed an event of is removed from it once finished, it then just
+    can not be replayed.
+    """
+    def __init__(
+            self,
+            backend: GenerationStoreBackendBase | None = None
+    ):
+        self._logger = get_logger(__name__)
+        self._backend: GenerationStoreBackendBase = backend or self._create_backend()
+        self._running: dict[str, _RunningGeneration] = {}
+
+    @staticmethod
+    def _create_backend() -> GenerationStoreBackendBase:
+        ttl: float = float(os.getenv("GENERATION_TTL", "600"))
+        url: str | None = os.getenv("GENERATION_STORE_URL") or os.getenv("THREAD_CACHE_URL")
+        if url:
+            # Imported here so redis is only needed when it is configured.
+            from cache.redis_generation_store_backend import RedisGenerationStoreBackend
+            return RedisGenerationStoreBackend(url, ttl)
+        return MemoryGenerationStoreBackend(ttl, int(os.getenv("GENERATION_STORE_MAX_ENTRIES", "10000")))
+
+    async def create(
+            self,
+            generation_id: str,
+            fingerprint: str
+    ) -> bool:
+        stored: bool = True
+        try:
+            created: bool = await self._backend.create(generation_id, fingerprint)
+        except Exception as e:
+            # NOTE: The request is still served, only without protection against a retry.
+            self._logger.error(f"Failed to create generation {generation_id}: {e}")
+            created, stored = generation_id not in self._running, False
+        if created:
+            self._running[generation_id] = _RunningGeneration(fingerprint)
+            self._running[generation_id].stored = stored
+        return created
+
+    async def get_fingerprint(self, generation_id: str) -> str | None:
+        running: _RunningGeneration | None = self._running.get(generation_id)
+        if running is not None:
+            return running.fingerprint
+        try:
+            return await self._backend.get_fingerprint(generation_id)
+        except Exception as e:
+            self._logger.error(f"Failed to read generation {generation_id}: {e}")
+            return None
+
+    async def append(
+            self,
+            generation_id: str,
+            event: dict
+    ) -> None:
+        running: _RunningGeneration = self._running[generation_id]
+        running.events.append(event)
+        running.notify()
+        if not running.stored:
+            return
+        try:
+            await self._backend.append(generation_id, event)
+        except Exception as e:
+            # NOTE: Later events are not stored either, a replay must not skip one.
+            self._logger.error(f"Failed to store an event of generation {generation_id}: {e}")
+            running.stored = False
+
+    async def finish(self, generation_id: str) -> None:
+        running: _RunningGeneration = self._running.pop(generation_id)
+        try:
+            if running.stored:
+                await self._backend.finish(generation_id)
+            else:
+                await self._backend.delete(generation_id)
+        except Exception as e:
+            self._logger.error(f"Failed to finish generation {generation_id}: {e}")
+        running.finished = True
+        running.notify()
+
+    async def read(
+            self,
+            generation_id: str,
+            start: int = 0
+    ) -> tuple[list[dict], bool] | None:
+        running: _RunningGeneration | None = self._running.get(generation_id)
+        if running is not None:
+            return running.events[start:], running.finished
+        try:
+            return await self._backend.read(generation_id, start)
+        except Exception as e:
+            self._logger.error(f"Failed to read generation {generation_id}: {e}")
+            return None
+
+    async def delete(self, generation_id: str) -> None:
+        try:
+            await self._backend.delete(generation_id)
+        except Exception as e:
+            self._logger.error(f"Failed to delete generation {generation_id}: {e}")
+
+    async def idle_time(self, generation_id: str) -> float:
+        # Seconds since a client last followed a generation of this worker, 0 while one does.
+        running: _RunningGeneration | None = self._running.get(generation_id)
+        if running is None or running.followers:
+            return 0.0
+        idle: float = time.monotonic() - running.last_followed
+        try:
+            last_followed: float | None = await self._backend.last_followed(generation_id)
+        except Exception as e:
+            self._logger.error(f"Failed to read the followers of generation {generation_id}: {e}")
+            last_followed = None
+        if last_followed is not None:
+            idle = min(idle, max(time.time() - last_followed, 0.0))
+        return idle
+
+    async def _mark_followed(self, generation_id: str) -> None:
+        try:
+            await self._backend.mark_followed(generation_id)
+        except Exception as e:
+            self._logger.error(f"Failed to mark generation {generation_id} as followed: {e}")
+
+    async def follow(
+            self,
+            generation_id: str,
+            start: int,
+            stall_timeout: float
+    ) -> AsyncIterator[dict]:
+        # Yields the events from start on until the generation finished. Stops
+        # early when it disappears or no event arrived for stall_timeout seconds.
+        # NOTE: A generation of this worker is followed in memory to its end,
+        #       even if the backend missed some of its events.
+        running: _RunningGeneration | None = self._running.get(generation_id)
+        if running is not None:
+            running.followers += 1
+        try:
+            async for event in self._follow(generation_id, running, start, stall_timeout):
+                yield event
+        finally:
+            if running is not None:
+                running.followers -= 1
+                running.last_followed = time.monotonic()
+
+    async def _follow(
+            self,
+            generation_id: str,
+            running: _RunningGeneration | None,
+            start: int,
+            stall_timeout: float
+    ) -> AsyncIterator[dict]:
+        last_event: float = time.monotonic()
+        last_marked: float = 0.0
+        while True:
+            if running is not None:
+                changed: asyncio.Event = running.changed
+                events, finished = running.events[start:], running.finished
+            else:
+                result: tuple[list[dict], bool] | None = await self.read(generation_id, start)
+                if result is None:
+                    return
+                events, finished = result
+            for event in events:
+                yield event
+            start += len(events)
+            if finished:
+                return
+            if events:
+                last_event = time.monotonic()
+            elif time.monotonic() - last_event > stall_timeout:
+                self._logger.warning(f"Generation {generation_id} stalled, stopped following it")
+                return
+            if running is not None:
+                try:
+                    await asyncio.wait_for(changed.wait(), stall_timeout)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                if time.monotonic() - last_marked >= FOLLOW_MARK_INTERVAL:
+                    await self._mark_followed(generation_id)
+                    last_marked = time.monotonic()
+                await asyncio.sleep(POLL_INTERVAL)
+
+    def stats(self) -> dict:
+        try:
+            backend: dict = self._backend.stats()
+        except Exception as e:
+            backend = {"error": type(e).__name__}
+        return {"running": len(self._running), **backend}
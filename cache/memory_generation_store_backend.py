@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+
+from base.generation_store_backend_base import GenerationStoreBackendBase
+
+
+class MemoryGenerationStoreBackend(GenerationStoreBackendBase):
+    """
+    Per-process store, a retry only finds the generations of the worker
+    it reaches. Generations expire ttl seconds after their last event and
+    the oldest are dropped beyond max_entries.
+    """
+    def __init__(
+            self,
+            ttl: float,
+            max_entries: int
+    ):
+        self._ttl: float = ttl
+        self._max_entries: int = max_entries
+        # generation_id -> (fingerprint, events, finished, expires_at), oldest first.
+        self._entries: OrderedDict[str, tuple[str, list[dict], bool, float]] = OrderedDict()
+
+    def _purge(self) -> None:
+        now: float = time.monotonic()
+        while self._entries and (len(self._entries) > self._max_entries or next(iter(self._entries.values()))[3] < now):
+            self._entries.popitem(last=False)
+
+    def _get(self, generation_id: str) -> tuple[str, list[dict], bool, float] | None:
+        entry: tuple[str, list[dict], bool, float] | None = self._entries.get(generation_id)
+        if entry is not None and entry[3] < time.monotonic():
+            del self._entries[generation_id]
+            return None
+        return entry
+
+    def _touch(
+            self,
+            generation_id: str,
+            finished: bool
+    ) -> None:
+        entry: tuple[str, list[dict], bool, float] | None = self._get(generation_id)
+        if entry is not None:
+            self._entries[generation_id] = (entry[0], entry[1], finished or entry[2], time.monotonic() + self._ttl)
+            self._entries.move_to_end(generation_id)
+
+    async def create(self, generation_id: str, fingerprint: str) -> bool:
+        self._purge()
+        if self._get(generation_id) is not None:
+            return False
+        self._entries[generation_id] = (fingerprint, [], False, time.monotonic() + self._ttl)
+        return True
+
+    async def get_fingerprint(self, generation_id: str) -> str | None:
+        entry: tuple[str, list[dict], bool, float] | None = self._get(generation_id)
+        return entry[0] if entry is not None else None
+
+    async def append(self, generation_id: str, event: dict) -> None:
+        entry: tuple[str, list[dict], bool, float] | None = self._get(generation_id)
+        if entry is not None:
+            entry[1].append(event)
+            self._touch(generation_id, False)
+
+    async def finish(self, generation_id: str) -> None:
+        self._touch(generation_id, True)
+
+    async def read(self, generation_id: str, start: int) -> tuple[list[dict], bool] | None:
+        entry: tuple[str, list[dict], bool, float] | None = self._get(generation_id)
+        return (entry[1][start:], entry[2]) if entry is not None else None
+
+    async def mark_followed(self, generation_id: str) -> None:
+        # Only the generating worker can find its generations here, it counts its followers itself.
+        pass
+
+    async def last_followed(self, generation_id: str) -> float | None:
+        return None
+
+    async def delete(self, generation_id: str) -> None:
+        self._entries.pop(generation_id, None)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "entries": len(self._entries), "max_entries": self._max_entries}
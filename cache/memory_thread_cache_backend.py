@@ -0,0 +1,70 @@
+import sys
+import time
+from collections import OrderedDict
+
+from base.thread_cache_backend_base import ThreadCacheBackendBase
+from db.model.chat_thread_model import ChatThreadModel
+
+# Rough size of a MessageModel instance without its strings.
+MESSAGE_OVERHEAD_BYTES: int = 300
+
+
+class MemoryThreadCacheBackend(ThreadCacheBackendBase):
+    """
+    Per-process LRU cache with a TTL, bounded by the estimated
+    memory of the cached threads.
+    """
+    def __init__(
+            self,
+            max_bytes: int,
+            ttl: float
+    ):
+        self._max_bytes: int = max_bytes
+        self._ttl: float = ttl
+        self._entries: OrderedDict[str, tuple[ChatThreadModel, int, float]] = OrderedDict()
+        self._bytes: int = 0
+
+    @staticmethod
+    def _estimate_size(chat_thread: ChatThreadModel) -> int:
+        return sys.getsizeof(chat_thread.summary) + sum(
+            sys.getsizeof(message.content) + sys.getsizeof(message.created_at) + MESSAGE_OVERHEAD_BYTES
+            for message in chat_thread.history
+        )
+
+    @staticmethod
+    def _copy(chat_thread: ChatThreadModel) -> ChatThreadModel:
+        # NOTE: Callers append to the history in place, so the list is
+        #       copied. Messages themselves are never mutated and are shared.
+        return chat_thread.model_copy(update={"history": list(chat_thread.history)})
+
+    def _evict(self, chat_id: str) -> None:
+        _, size, _ = self._entries.pop(chat_id)
+        self._bytes -= size
+
+    async def get(self, chat_id: str) -> ChatThreadModel | None:
+        entry: tuple[ChatThreadModel, int, float] | None = self._entries.get(chat_id)
+        if entry is None:
+            return None
+        if entry[2] < time.monotonic():
+            self._evict(chat_id)
+            return None
+        self._entries.move_to_end(chat_id)
+        return self._copy(entry[0])
+
+    async def set(self, chat_thread: ChatThreadModel) -> None:
+        if chat_thread.chat_id in self._entries:
+            self._evict(chat_thread.chat_id)
+        size: int = self._estimate_size(chat_thread)
+        if size > self._max_bytes:
+            return
+        while self._bytes + size > self._max_bytes:
+            self._evict(next(iter(self._entries)))
+        self._entries[chat_thread.chat_id] = (self._copy(chat_thread), size, time.monotonic() + self._ttl)
+        self._bytes += size
+
+    async def delete(self, chat_id: str) -> None:
+        if chat_id in self._entries:
+            self._evict(chat_id)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self._max_bytes}
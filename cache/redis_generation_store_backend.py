@@ -0,0 +1,73 @@
+import json
+import time
+
+import redis.asyncio as redis
+
+from base.generation_store_backend_base import GenerationStoreBackendBase
+
+
+class RedisGenerationStoreBackend(GenerationStoreBackendBase):
+    """
+    Store shared by every worker through Redis, a retry reaching another
+    worker replays or follows the generation from here. Every key of a
+    generation expires ttl seconds after its last event.
+    """
+    def __init__(
+            self,
+            url: str,
+            ttl: float
+    ):
+        self._client: redis.Redis = redis.from_url(url)
+        self._ttl: int = max(1, int(ttl))
+
+    @staticmethod
+    def _key(
+            generation_id: str,
+            part: str
+    ) -> str:
+        return f"generation:{generation_id}:{part}"
+
+    async def create(self, generation_id: str, fingerprint: str) -> bool:
+        return bool(await self._client.set(self._key(generation_id, "fingerprint"), fingerprint, nx=True, ex=self._ttl))
+
+    async def get_fingerprint(self, generation_id: str) -> str | None:
+        result: bytes | None = await self._client.get(self._key(generation_id, "fingerprint"))
+        return result.decode() if result is not None else None
+
+    async def append(self, generation_id: str, event: dict) -> None:
+        async with self._client.pipeline(transaction=False) as pipeline:
+            pipeline.rpush(self._key(generation_id, "events"), json.dumps(event, ensure_ascii=False))
+            pipeline.expire(self._key(generation_id, "events"), self._ttl)
+            pipeline.expire(self._key(generation_id, "fingerprint"), self._ttl)
+            await pipeline.execute()
+
+    async def finish(self, generation_id: str) -> None:
+        async with self._client.pipeline(transaction=False) as pipeline:
+            pipeline.set(self._key(generation_id, "finished"), 1, ex=self._ttl)
+            pipeline.expire(self._key(generation_id, "events"), self._ttl)
+            pipeline.expire(self._key(generation_id, "fingerprint"), self._ttl)
+            await pipeline.execute()
+
+    async def read(self, generation_id: str, start: int) -> tuple[list[dict], bool] | None:
+        async with self._client.pipeline(transaction=False) as pipeline:
+            pipeline.exists(self._key(generation_id, "fingerprint"))
+            pipeline.lrange(self._key(generation_id, "events"), start, -1)
+            pipeline.exists(self._key(generation_id, "finished"))
+            exists, events, finished = await pipeline.execute()
+        if not exists:
+            return None
+        return [json.loads(event) for event in events], bool(finished)
+
+    async def mark_followed(self, generation_id: str) -> None:
+        await self._client.set(self._key(generation_id, "followed"), time.time(), ex=self._ttl)
+
+    async def last_followed(self, generation_id: str) -> float | None:
+        result: bytes | None = await self._client.get(self._key(generation_id, "followed"))
+        return float(result) if result is not None else None
+
+    async def delete(self, generation_id: str) -> None:
+        await self._client.delete(
+            *(self._key(generation_id, part) for part in ("fingerprint", "events", "finished", "followed")))
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
@@ -0,0 +1,35 @@
+import redis.asyncio as redis
+
+from base.thread_cache_backend_base import ThreadCacheBackendBase
+from db.model.chat_thread_model import ChatThreadModel
+
+
+class RedisThreadCacheBackend(ThreadCacheBackendBase):
+    """
+    Cache shared by every worker through Redis. Memory is bounded on
+    the Redis side (maxmemory with an LRU eviction policy).
+    """
+    def __init__(
+            self,
+            url: str,
+            ttl: float
+    ):
+        self._client: redis.Redis = redis.from_url(url)
+        self._ttl: int = max(1, int(ttl))
+
+    @staticmethod
+    def _key(chat_id: str) -> str:
+        return f"chat_thread:{chat_id}"
+
+    async def get(self, chat_id: str) -> ChatThreadModel | None:
+        result: bytes | None = await self._client.get(self._key(chat_id))
+        return ChatThreadModel.model_validate_json(result) if result else None
+
+    async def set(self, chat_thread: ChatThreadModel) -> None:
+        await self._client.set(self._key(chat_thread.chat_id), chat_thread.model_dump_json(), ex=self._ttl)
+
+    async def delete(self, chat_id: str) -> None:
+        await self._client.delete(self._key(chat_id))
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
@@ -0,0 +1,79 @@
+import os
+
+from dotenv import load_dotenv
+
+from base.thread_cache_backend_base import ThreadCacheBackendBase
+from cache.memory_thread_cache_backend import MemoryThreadCacheBackend
+from db.model.chat_thread_model import ChatThreadModel
+from util.logger import get_logger
+from util.metrics import metrics
+from util.timing import timed
+
+load_dotenv()
+
+CACHE_REQUESTS = metrics.counter("thread_cache_requests_total", "Thread cache lookups by result.", ("result",))
+
+
+class ThreadCache:
+    """
+    Write-through cache of recently active chat threads in front of
+    ContextRepository. Cache failures are logged and treated as misses,
+    the database stays the source of truth.
+    """
+    def __init__(
+            self,
+            backend: ThreadCacheBackendBase | None = None
+    ):
+        self._logger = get_logger(__name__)
+        self._backend: ThreadCacheBackendBase = backend or self._create_backend()
+        self._hits: int = 0
+        self._misses: int = 0
+
+    @staticmethod
+    def _create_backend() -> ThreadCacheBackendBase:
+        ttl: float = float(os.getenv("THREAD_CACHE_TTL", "300"))
+        url: str | None = os.getenv("THREAD_CACHE_URL")
+        if url:
+            # Imported here so redis is only needed when it is configured.
+            from cache.redis_thread_cache_backend import RedisThreadCacheBackend
+            return RedisThreadCacheBackend(url, ttl)
+        return MemoryThreadCacheBackend(int(os.getenv("THREAD_CACHE_MAX_BYTES", str(64 * 1024 * 1024))), ttl)
+
+    @timed("cache.get")
+    async def get(self, chat_id: str) -> ChatThreadModel | None:
+        result: ChatThreadModel | None = None
+        try:
+            result = await self._backend.get(chat_id)
+        except Exception as e:
+            self._logger.error(f"Failed to read chat thread {chat_id} from cache: {e}")
+        if result is None:
+            self._misses += 1
+            CACHE_REQUESTS.inc(result="miss")
+        else:
+            self._hits += 1
+            CACHE_REQUESTS.inc(result="hit")
+        return result
+
+    @timed("cache.set")
+    async def set(self, chat_thread: ChatThreadModel) -> None:
+        try:
+            await self._backend.set(chat_thread)
+        except Exception as e:
+            self._logger.error(f"Failed to write chat thread {chat_thread.chat_id} to cache: {e}")
+            await self.delete(chat_thread.chat_id)
+
+    @timed("cache.delete")
+    async def delete(self, chat_id: str) -> None:
+        try:
+            await self._backend.delete(chat_id)
+        except Exception as e:
+            self._logger.error(f"Failed to delete chat thread {chat_id} from cache: {e}")
+
+    def stats(self) -> dict:
+        lookups: int = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            **self._backend.stats()
+        }
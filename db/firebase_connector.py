@@ -4,31 +4,40 @@ from firebase_admin import credentials
 from firebase_admin.auth import *
 
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
 class FirebaseConnector:
     def __init__(self):
-        self._cred: credentials.Certificate = credentials.Certificate(
-            {
-                "type": os.getenv("TYPE"),
-                "project_id": os.getenv("PROJECT_ID"),
-                "private_key_id": os.getenv("PRIVATE_KEY_ID"),
-                "private_key": os.getenv("PRIVATE_KEY").replace(r'\n', '\n'),
-                "client_email": os.getenv("CLIENT_EMAIL"),
-                "client_id": os.getenv("CLIENT_ID"),
-                "auth_uri": os.getenv("AUTH_URI"),
-                "token_uri": os.getenv("TOKEN_URI"),
-                "auth_provider_x509_cert_url": os.getenv("AUTH_PROVIDER_X509_CERT_URL"),
-                "client_x509_cert_url": os.getenv("CLIENT_X509_CERT_URL"),
-                "universe_domain": os.getenv("UNIVERSE_DOMAIN"),
-            }
-        )
-        self._api_key: str = os.getenv("WEB_API_KEY")
-        self.app: firebase_admin = firebase_admin.initialize_app(self._cred)
+        self.app: firebase_admin.App | None = None
+        # initialize_app raises when called twice, token checks run in threads.
+        self._init_lock: threading.Lock = threading.Lock()
 
     def get_firebase_app(self):
+        # Initialized on first use, importing the module needs no credentials.
+        if self.app is not None:
+            return self.app
+        with self._init_lock:
+            if self.app is None:
+                self._cred: credentials.Certificate = credentials.Certificate(
+                    {
+                        "type": os.getenv("TYPE"),
+                        "project_id": os.getenv("PROJECT_ID"),
+                        "private_key_id": os.getenv("PRIVATE_KEY_ID"),
+                        "private_key": os.getenv("PRIVATE_KEY").replace(r'\n', '\n'),
+                        "client_email": os.getenv("CLIENT_EMAIL"),
+                        "client_id": os.getenv("CLIENT_ID"),
+                        "auth_uri": os.getenv("AUTH_URI"),
+                        "token_uri": os.getenv("TOKEN_URI"),
+                        "auth_provider_x509_cert_url": os.getenv("AUTH_PROVIDER_X509_CERT_URL"),
+                        "client_x509_cert_url": os.getenv("CLIENT_X509_CERT_URL"),
+                        "universe_domain": os.getenv("UNIVERSE_DOMAIN"),
+                    }
+                )
+                self._api_key: str = os.getenv("WEB_API_KEY")
+                self.app = firebase_admin.initialize_app(self._cred)
         return self.app
 
-firebase_connector = FirebaseConnector().get_firebase_app()
\ No newline at end of file
+firebase_connector = FirebaseConnector()
\ No newline at end of file
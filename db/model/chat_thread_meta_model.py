@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+
+class ChatThreadMetaModel(BaseModel):
+    user_uid: str
+    chat_name: str
+    chat_id: str
+    created_at: str
+    updated_at: str
+    # Denormalized by the split storage layout only.
+    message_count: int | None = None
+    last_message_preview: str | None = None
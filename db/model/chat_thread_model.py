@@ -8,4 +8,9 @@ class ChatThreadModel(BaseModel):
     chat_id: str
     created_at: str
     updated_at: str
-    history: list[MessageModel]
\ No newline at end of file
+    history: list[MessageModel]
+    # Incremented on every write to the history, used for compare-and-swap updates.
+    version: int = 0
+    # Rolling summary of history[:summary_upto], maintained by the summary worker.
+    summary: str = ""
+    summary_upto: int = 0
@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+from .message_model import MessageModel
+
+class HistoryPageModel(BaseModel):
+    chat_id: str
+    updated_at: str
+    total: int
+    first_seq: int
+    history: list[MessageModel]
@@ -1,6 +1,17 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
+
+from util.token_counter import count_tokens
 
 class MessageModel(BaseModel):
     created_at: str
     role: str
-    content: str
\ No newline at end of file
+    content: str
+
+    # Counted once on first use and kept on the instance, it is never persisted.
+    _token_count: int | None = PrivateAttr(default=None)
+
+    @property
+    def token_count(self) -> int:
+        if self._token_count is None:
+            self._token_count = count_tokens(self.content)
+        return self._token_count
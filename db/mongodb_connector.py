@@ -1,10 +1,133 @@
+import asyncio
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 from pymongo import AsyncMongoClient
+from pymongo.monitoring import (ConnectionCheckedInEvent, ConnectionCheckedOutEvent, ConnectionCheckOutFailedEvent,
+                                ConnectionCheckOutStartedEvent, ConnectionClosedEvent, ConnectionCreatedEvent,
+                                ConnectionPoolListener, ConnectionReadyEvent, PoolClearedEvent, PoolClosedEvent,
+                                PoolCreatedEvent, PoolReadyEvent)
+
+from util.logger import get_logger
 
 load_dotenv()
 
+
+class PoolMonitor(ConnectionPoolListener):
+    """
+    Counts the open, checked out and waiting connections of every
+    server pool of one client, for the saturation reported by /health.
+    """
+    def __init__(self):
+        self._lock: threading.Lock = threading.Lock()
+        self._pools: dict[str, dict[str, int]] = {}
+
+    def _add(self, address: tuple, field: str, amount: int) -> None:
+        with self._lock:
+            pool: dict[str, int] = self._pools.setdefault(
+                f"{address[0]}:{address[1]}", {"open": 0, "checked_out": 0, "waiting": 0})
+            pool[field] += amount
+
+    def pool_created(self, event: PoolCreatedEvent) -> None:
+        self._add(event.address, "open", 0)
+
+    def pool_ready(self, event: PoolReadyEvent) -> None:
+        pass
+
+    def pool_cleared(self, event: PoolClearedEvent) -> None:
+        pass
+
+    def pool_closed(self, event: PoolClosedEvent) -> None:
+        with self._lock:
+            self._pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event: ConnectionCreatedEvent) -> None:
+        self._add(event.address, "open", 1)
+
+    def connection_ready(self, event: ConnectionReadyEvent) -> None:
+        pass
+
+    def connection_closed(self, event: ConnectionClosedEvent) -> None:
+        self._add(event.address, "open", -1)
+
+    def connection_check_out_started(self, event: ConnectionCheckOutStartedEvent) -> None:
+        self._add(event.address, "waiting", 1)
+
+    def connection_check_out_failed(self, event: ConnectionCheckOutFailedEvent) -> None:
+        self._add(event.address, "waiting", -1)
+
+    def connection_checked_out(self, event: ConnectionCheckedOutEvent) -> None:
+        self._add(event.address, "waiting", -1)
+        self._add(event.address, "checked_out", 1)
+
+    def connection_checked_in(self, event: ConnectionCheckedInEvent) -> None:
+        self._add(event.address, "checked_out", -1)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            return {address: dict(pool) for address, pool in self._pools.items()}
+
+
 class MongoDBConnector:
+    """
+    Registry of the MongoDB clients of the process, one per URI. Every
+    repository shares the client of its URI and with it one connection
+    pool per server, sized by MONGO_MAX_POOL_SIZE and MONGO_MIN_POOL_SIZE.
+    """
     def __init__(self):
-        self.client: AsyncMongoClient = AsyncMongoClient(os.getenv("MONGO_URI"))
\ No newline at end of file
+        self._logger = get_logger(__name__)
+        self._clients: dict[str, AsyncMongoClient] = {}
+        self._monitors: dict[str, PoolMonitor] = {}
+        self._max_pool_size: int = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+        self._min_pool_size: int = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+        self._max_idle_time_ms: int | None = int(os.getenv("MONGO_MAX_IDLE_TIME_MS")) \
+            if os.getenv("MONGO_MAX_IDLE_TIME_MS") else None
+        # Fails requests that wait on a saturated pool instead of queueing them forever.
+        self._wait_queue_timeout_ms: int | None = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS")) \
+            if os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS") else None
+        self._health_timeout: float = float(os.getenv("MONGO_HEALTH_TIMEOUT", "2"))
+
+    def client(self, uri: str | None = None) -> AsyncMongoClient:
+        uri = uri or os.getenv("MONGO_URI") or "mongodb://localhost:27017"
+        if uri not in self._clients:
+            monitor: PoolMonitor = PoolMonitor()
+            self._clients[uri] = AsyncMongoClient(
+                uri,
+                maxPoolSize=self._max_pool_size,
+                minPoolSize=self._min_pool_size,
+                maxIdleTimeMS=self._max_idle_time_ms,
+                waitQueueTimeoutMS=self._wait_queue_timeout_ms,
+                event_listeners=[monitor]
+            )
+            self._monitors[uri] = monitor
+        return self._clients[uri]
+
+    async def health(self) -> dict:
+        if not self._clients:
+            return {"ok": True, "clients": []}
+        clients: list[dict] = []
+        for uri, client in list(self._clients.items()):
+            entry: dict = {"ok": True, "max_pool_size": self._max_pool_size}
+            started: float = time.perf_counter()
+            try:
+                await asyncio.wait_for(client.admin.command("ping"), self._health_timeout)
+                entry["ping_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            except Exception as e:
+                self._logger.error(f"MongoDB ping failed: {e}")
+                entry.update({"ok": False, "error": type(e).__name__})
+            pools: dict[str, dict[str, int]] = self._monitors[uri].stats()
+            entry["pools"] = {address: {**pool, "saturation": round(pool["checked_out"] / self._max_pool_size, 4)}
+                              for address, pool in pools.items()}
+            clients.append(entry)
+        return {"ok": all(entry["ok"] for entry in clients), "clients": clients}
+
+    async def close(self) -> None:
+        for client in self._clients.values():
+            await client.close()
+        self._clients.clear()
+        self._monitors.clear()
+
+
+mongodb_connector = MongoDBConnector()
@@ -0,0 +1,8 @@
+class ChatThreadConflictError(Exception):
+    """
+    Raised when a chat thread was modified by another request between
+    being read and being written. The request can safely be retried.
+    """
+    def __init__(self, chat_id: str):
+        self.chat_id: str = chat_id
+        super().__init__(f"Chat thread {chat_id} was modified by another request, please retry.")
@@ -17,7 +17,7 @@ import os
 from dotenv import load_dotenv
 
 load_dotenv()
-FIREBASE_APP = firebase_connector
+FIREBASE_CONNECTOR = firebase_connector
 
 class FirebaseHandler:
     def __init__(
@@ -39,9 +39,13 @@ class FirebaseHandler:
                 "universe_domain": os.getenv("UNIVERSE_DOMAIN"),
             }
         )
-        self._app = FIREBASE_APP
         self._api_key: str = os.getenv("WEB_API_KEY")
 
+    @property
+    def _app(self):
+        # The Firebase app is only initialized by the first call that needs it.
+        return FIREBASE_CONNECTOR.get_firebase_app()
+
     def _post_request_executor(
             self,
             payload: dict,
@@ -95,9 +99,9 @@ class FirebaseHandler:
     ) -> None:
         self._logger.info(f"Waiting for 5 minutes to delete unverified email: {email}")
         time.sleep(5)
-        user: UserRecord = auth.get_user_by_email(email)
+        user: UserRecord = auth.get_user_by_email(email, app=self._app)
         if not user.email_verified:
-            auth.delete_user(user.uid)
+            auth.delete_user(user.uid, app=self._app)
 
     def send_verification_email(
             self,
@@ -112,7 +116,7 @@ class FirebaseHandler:
             token: str
     ) -> bool:
         try:
-            decoded_token = auth.verify_id_token(token)
+            decoded_token = auth.verify_id_token(token, app=self._app)
             return True
         except (auth.InvalidIdTokenError, auth.ExpiredIdTokenError, auth.RevokedIdTokenError):
             return False
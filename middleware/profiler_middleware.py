@@ -0,0 +1,112 @@
+import asyncio
+import cProfile
+import datetime
+import hmac
+import os
+import random
+import time
+import uuid
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from util.logger import get_logger
+from util.profiler import CProfileSlot, RequestProfile, StackSampler, active_profile, prune_profiles
+
+
+class ProfilerMiddleware:
+    """
+    Profiles single requests in production, when they carry the admin
+    token in the X-Profile header or are picked by the sample rate. The
+    profile covers the whole request including a streamed response and
+    is written to the profile directory, its file name is returned in
+    the X-Profile-Id header.
+
+    "sampling" writes folded stacks (.folded) for flame graph viewers,
+    "cprofile" writes pstats files (.prof), see util/profiler.py for the
+    trade-offs. Only the newest max_files profiles are kept.
+    """
+    def __init__(
+            self,
+            app: ASGIApp,
+            directory: str,
+            token: str | None = None,
+            sample_rate: float = 0.0,
+            mode: str = "sampling",
+            interval: float = 0.005,
+            max_files: int = 100
+    ):
+        self._logger = get_logger(__name__)
+        self._app: ASGIApp = app
+        self._directory: str = directory
+        self._token: str | None = token
+        self._sample_rate: float = sample_rate
+        self._mode: str = mode
+        self._max_files: int = max_files
+        self._sampler: StackSampler = StackSampler(interval)
+        self._cprofile: CProfileSlot = CProfileSlot()
+        os.makedirs(directory, exist_ok=True)
+
+    def _should_profile(self, scope: Scope) -> bool:
+        header: str | None = Headers(scope=scope).get("x-profile")
+        if header is not None and self._token:
+            return hmac.compare_digest(header.encode(), self._token.encode())
+        return random.random() < self._sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self._app(scope, receive, send)
+            return
+
+        started: float = time.perf_counter()
+        name: str = f"{datetime.datetime.now(datetime.timezone.utc):%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        profile: RequestProfile | None = None
+        profiler: cProfile.Profile | None = None
+        if self._mode == "cprofile":
+            profiler = self._cprofile.start()
+            if profiler is None:
+                # NOTE: cProfile can only follow one request at a time.
+                await self._app(scope, receive, send)
+                return
+            name += ".prof"
+        else:
+            profile = RequestProfile()
+            name += ".folded"
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", name)
+            await send(message)
+
+        token = active_profile.set(profile)
+        if profile is not None:
+            self._sampler.register(profile)
+        try:
+            await self._app(scope, receive, send_wrapper)
+        finally:
+            active_profile.reset(token)
+            if profile is not None:
+                self._sampler.unregister(profile)
+            else:
+                self._cprofile.stop()
+            route = scope.get("route")
+            self._logger.info(f"Profiled {scope['method']} {route.path if route is not None else scope['path']} "
+                              f"in {(time.perf_counter() - started) * 1000:.1f}ms as {name}")
+            await asyncio.to_thread(self._write, name, profile, profiler)
+
+    def _write(
+            self,
+            name: str,
+            profile: RequestProfile | None,
+            profiler: cProfile.Profile | None
+    ) -> None:
+        path: str = os.path.join(self._directory, name)
+        try:
+            if profile is not None:
+                with open(path, "w", encoding="utf-8") as file:
+                    file.write(profile.folded())
+            else:
+                profiler.dump_stats(path)
+            prune_profiles(self._directory, self._max_files)
+        except Exception as e:
+            self._logger.error(f"Failed to write profile {name}: {e}")
@@ -0,0 +1,44 @@
+import re
+import uuid
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from util.logger import chat_id_context, request_id_context
+
+# Accepted incoming ids, anything else is replaced by a generated one.
+REQUEST_ID_PATTERN: re.Pattern = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+
+class RequestContextMiddleware:
+    """
+    Gives every request an id, taken from the X-Request-ID header of a
+    proxy or generated, that is attached to all of its log records and
+    returned in the X-Request-ID response header.
+    """
+    def __init__(
+            self,
+            app: ASGIApp
+    ):
+        self._app: ASGIApp = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self._app(scope, receive, send)
+            return
+
+        incoming: str | None = Headers(scope=scope).get("x-request-id")
+        current: str = incoming if incoming and REQUEST_ID_PATTERN.fullmatch(incoming) else uuid.uuid4().hex
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-ID"] = current
+            await send(message)
+
+        request_token = request_id_context.set(current)
+        chat_token = chat_id_context.set(None)
+        try:
+            await self._app(scope, receive, send_wrapper)
+        finally:
+            request_id_context.reset(request_token)
+            chat_id_context.reset(chat_token)
@@ -0,0 +1,53 @@
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from util.metrics import metrics
+from util.timing import RequestTiming, request_timing
+
+HTTP_REQUEST_DURATION = metrics.histogram(
+    "http_request_duration_seconds", "Duration of HTTP requests until the last byte.", ("method", "route", "status"))
+
+
+class TimingMiddleware:
+    """
+    Collects the spans of every request, sends them as a Server-Timing
+    header and records the request duration per route. A streamed
+    response sends its headers first, so its header only holds the
+    stages before the first byte, the rest is in /metrics.
+    """
+    def __init__(
+            self,
+            app: ASGIApp
+    ):
+        self._app: ASGIApp = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self._app(scope, receive, send)
+            return
+
+        timing: RequestTiming = RequestTiming()
+        token = request_timing.set(timing)
+        started: float = time.perf_counter()
+        status: list[int] = [500]
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", timing.server_timing())
+            await send(message)
+
+        try:
+            await self._app(scope, receive, send_wrapper)
+        finally:
+            request_timing.reset(token)
+            route = scope.get("route")
+            # Unmatched paths share one label to keep the number of series bounded.
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=route.path if route is not None else "unmatched",
+                status=str(status[0])
+            )
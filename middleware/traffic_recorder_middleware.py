@@ -0,0 +1,172 @@
+import atexit
+import hashlib
+import hmac
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+from urllib.parse import parse_qs
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from util.logger import get_logger
+from util.metrics import metrics
+
+TRAFFIC_RECORDS_DROPPED = metrics.counter(
+    "traffic_records_dropped_total", "Traffic records dropped because the write queue was full.")
+
+
+class TrafficRecorderMiddleware:
+    """
+    Appends one NDJSON line per request to the chat API, describing its
+    shape but none of its content: route, timing, status, payload sizes,
+    message length and keyed hashes of the chat and user ids, so chat
+    reuse survives anonymization. benchmark/replay.py drives a recording
+    against a local instance.
+
+    Ids are hashed with TRAFFIC_RECORD_SALT, every worker writing to the
+    same recording has to share it. Records are written to the file by
+    a thread of their own, like the log records of util/logger.py, and
+    dropped instead of blocking the event loop when it falls behind.
+    """
+    def __init__(
+            self,
+            app: ASGIApp,
+            path: str,
+            thread_length: Callable[[str], Awaitable[int | None]] | None = None,
+            salt: str | None = None,
+            prefix: str = "/api/chat",
+            max_seen_chats: int = 100000,
+            queue_size: int = 10000
+    ):
+        self._logger = get_logger(__name__)
+        self._app: ASGIApp = app
+        self._prefix: str = prefix
+        self._thread_length: Callable[[str], Awaitable[int | None]] | None = thread_length
+        self._salt: bytes = (salt or os.getenv("TRAFFIC_RECORD_SALT") or os.urandom(16).hex()).encode("utf-8")
+        # Hashed ids of the chats whose length was recorded, least recently seen first.
+        self._seen_chats: OrderedDict[str, None] = OrderedDict()
+        self._max_seen_chats: int = max_seen_chats
+        self._queue: queue.Queue[str | None] = queue.Queue(queue_size)
+        self._file = open(path, "a", encoding="utf-8")
+        self._writer: threading.Thread = threading.Thread(
+            target=self._write_records, name="traffic-recorder", daemon=True)
+        self._writer.start()
+        atexit.register(self._stop)
+
+    def _write_records(self) -> None:
+        # Flushed whenever the queue runs empty, a burst of records is written at once.
+        while True:
+            line: str | None = self._queue.get()
+            if line is None:
+                break
+            self._file.write(line)
+            if self._queue.empty():
+                self._file.flush()
+        self._file.close()
+
+    def _stop(self) -> None:
+        # Writes what is still queued when the process exits.
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+    def _seen(self, chat: str) -> bool:
+        # Bounded, the chats of a long running worker are forgotten least recently seen first.
+        if chat in self._seen_chats:
+            self._seen_chats.move_to_end(chat)
+            return True
+        self._seen_chats[chat] = None
+        if len(self._seen_chats) > self._max_seen_chats:
+            self._seen_chats.popitem(last=False)
+        return False
+
+    def _anonymize(self, value: str | None) -> str | None:
+        return hmac.new(self._salt, value.encode("utf-8"), hashlib.sha256).hexdigest()[:16] if value else None
+
+    @staticmethod
+    def _json(body: bytes) -> dict:
+        try:
+            result = json.loads(body) if body else {}
+        except ValueError:
+            return {}
+        return result if isinstance(result, dict) else {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self._prefix):
+            await self._app(scope, receive, send)
+            return
+
+        started_at: float = time.time()
+        started: float = time.perf_counter()
+        request_body: bytearray = bytearray()
+        response_body: bytearray = bytearray()
+        response: dict = {"status": 0, "bytes": 0}
+        # Only thread creation returns an id the later requests refer to.
+        capture_response: bool = scope["path"].endswith("/create_chat_thread")
+
+        async def receive_wrapper() -> Message:
+            message: Message = await receive()
+            if message["type"] == "http.request":
+                request_body.extend(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+                if capture_response:
+                    response_body.extend(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self._app(scope, receive_wrapper, send_wrapper)
+        finally:
+            await self._record(scope, started_at, time.perf_counter() - started, bytes(request_body),
+                               bytes(response_body), response)
+
+    async def _record(
+            self,
+            scope: Scope,
+            started_at: float,
+            duration: float,
+            request_body: bytes,
+            response_body: bytes,
+            response: dict
+    ) -> None:
+        try:
+            route = scope.get("route")
+            path_params: dict = scope.get("path_params", {})
+            request_json: dict = self._json(request_body)
+            chat_id: str | None = path_params.get("chat_id") or request_json.get("chat_id") \
+                or (self._json(response_body).get("data") or {}).get("chat_id")
+            query: dict = {key: values[-1] for key, values in parse_qs(scope.get("query_string", b"").decode()).items()}
+
+            record: dict = {
+                "ts": round(started_at, 3),
+                "method": scope["method"],
+                # The raw path of an unknown route may carry ids, it is not recorded.
+                "route": route.path if route is not None else "unmatched",
+                "status": response["status"],
+                "duration_ms": round(duration * 1000, 2),
+                "request_bytes": len(request_body),
+                "response_bytes": response["bytes"],
+                "user": self._anonymize(path_params.get("user_uid") or request_json.get("user_uid")),
+                "chat": self._anonymize(chat_id),
+                # Numbers are kept as they are, opaque values only as present or not.
+                "query": {key: int(value) if value.isdigit() else True for key, value in query.items()}
+            }
+            if isinstance(request_json.get("message"), str):
+                record["message_chars"] = len(request_json["message"])
+            # The length of a thread is recorded once, the replay seeds threads it did not see created.
+            if chat_id and self._thread_length is not None and not self._seen(record["chat"]):
+                record["history_length"] = await self._thread_length(chat_id)
+
+            self._queue.put_nowait(json.dumps(record) + "\n")
+        except queue.Full:
+            TRAFFIC_RECORDS_DROPPED.inc()
+        except Exception as e:
+            self._logger.error(f"Failed to record request: {e}")
@@ -0,0 +1,122 @@
+"""
+Moves chat threads from the embedded layout (every message inside the
+`history` array of its chat_history document) to the split layout used
+by SplitContextRepository (one document per message in `messages`).
+
+The migration runs online next to the application: every thread is
+converted on its own with a compare-and-swap, so a thread written to
+meanwhile is simply retried. Threads are walked in chat_id order in
+batches and the last migrated chat_id is checkpointed in the
+`migrations` collection, so an interrupted run continues where it
+stopped. Once a walk reaches the end it starts over until a whole walk
+finds nothing left, which also picks up threads created by workers
+still running the embedded layout.
+
+Switch the workers to CHAT_STORAGE_LAYOUT=split before or during the
+migration, the split repository reads both layouts. Going back to the
+embedded layout afterwards is not supported.
+
+Run with: python -m migration.split_messages [--batch-size 100] [--concurrency 8] [--restart]
+"""
+import argparse
+import asyncio
+import datetime
+import time
+
+from repository.split_context_repository import SplitContextRepository
+from util.logger import get_logger
+
+MIGRATION_ID: str = "split_messages"
+
+logger = get_logger(__name__)
+
+
+async def _load_checkpoint(repository: SplitContextRepository) -> str:
+    checkpoint: dict | None = await repository._db["migrations"].find_one({"_id": MIGRATION_ID})
+    return checkpoint["last_chat_id"] if checkpoint else ""
+
+
+async def _save_checkpoint(
+        repository: SplitContextRepository,
+        last_chat_id: str,
+        migrated: int
+) -> None:
+    await repository._db["migrations"].update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"last_chat_id": last_chat_id, "updated_at": datetime.datetime.now().isoformat()},
+         "$inc": {"migrated": migrated}},
+        upsert=True)
+
+
+async def _migrate_batch(
+        repository: SplitContextRepository,
+        chat_ids: list[str],
+        concurrency: int
+) -> tuple[int, int]:
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(concurrency)
+
+    async def migrate(chat_id: str) -> bool:
+        async with semaphore:
+            return await repository.migrate_thread(chat_id)
+
+    results: list[bool] = await asyncio.gather(*[migrate(chat_id) for chat_id in chat_ids])
+    return results.count(True), results.count(False)
+
+
+async def migrate(
+        repository: SplitContextRepository,
+        batch_size: int = 100,
+        concurrency: int = 8,
+        restart: bool = False
+) -> None:
+    await repository._ensure_db_setup()
+    last_chat_id: str = "" if restart else await _load_checkpoint(repository)
+    if last_chat_id:
+        logger.info(f"Resuming after chat_id: {last_chat_id}")
+
+    started: float = time.monotonic()
+    total_migrated: int = 0
+    total_failed: int = 0
+    walk_migrated: int = 0
+    while True:
+        results = repository._collection.find(
+            {"history": {"$exists": True}, "chat_id": {"$gt": last_chat_id}},
+            projection={"_id": 0, "chat_id": 1},
+            sort=[("chat_id", 1)],
+            limit=batch_size)
+        chat_ids: list[str] = [result["chat_id"] async for result in results]
+
+        if not chat_ids:
+            # Failed threads and threads created behind the checkpoint need another walk.
+            if walk_migrated == 0:
+                break
+            logger.info("Reached the end, walking once more for threads written meanwhile")
+            last_chat_id = ""
+            walk_migrated = 0
+            await _save_checkpoint(repository, last_chat_id, 0)
+            continue
+
+        migrated, failed = await _migrate_batch(repository, chat_ids, concurrency)
+        last_chat_id = chat_ids[-1]
+        await _save_checkpoint(repository, last_chat_id, migrated)
+        total_migrated += migrated
+        total_failed += failed
+        walk_migrated += migrated
+        logger.info(f"Migrated {total_migrated} threads ({total_failed} failed) "
+                    f"in {time.monotonic() - started:.1f}s, last chat_id: {last_chat_id}")
+
+    remaining: int = await repository._collection.count_documents({"history": {"$exists": True}})
+    logger.info(f"Migration finished, migrated: {total_migrated}, threads left in the embedded layout: {remaining}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move chat messages into their own collection.")
+    parser.add_argument("--batch-size", type=int, default=100, help="Threads read per batch.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Threads migrated at the same time.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the beginning.")
+    args = parser.parse_args()
+    asyncio.run(migrate(SplitContextRepository(), args.batch_size, args.concurrency, args.restart))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+from typing import Callable, TypeVar
+
+from provider.model.conversation_message_model import ConversationMessageModel
+
+T = TypeVar("T")
+
+
+class CompiledPrefixCache:
+    """
+    Keeps the provider native form of the history messages last sent for
+    every thread. The next turn of the thread only compiles the messages
+    added since, and a window that slid forward reuses the overlap.
+
+    A message is only reused while its role and content still match, a
+    turn that was sent but never stored is followed by another one at
+    the same position.
+    """
+    def __init__(
+            self,
+            max_threads: int = 1024
+    ):
+        self._max_threads: int = max_threads
+        # chat_id -> (first seq, (role, content) of every message, compiled messages)
+        self._entries: OrderedDict[str, tuple[int, list[tuple[str, str]], list]] = OrderedDict()
+
+    def compile(
+            self,
+            chat_id: str | None,
+            first_seq: int,
+            messages: list[ConversationMessageModel],
+            compile_message: Callable[[ConversationMessageModel], T]
+    ) -> list[T]:
+        if chat_id is None:
+            return [compile_message(message) for message in messages]
+
+        keys: list[tuple[str, str]] = [(message.role, message.content) for message in messages]
+        compiled: list[T] = []
+        cached: tuple[int, list[tuple[str, str]], list] | None = self._entries.get(chat_id)
+        if cached is not None:
+            cached_first_seq, cached_keys, cached_messages = cached
+            offset: int = first_seq - cached_first_seq
+            if 0 <= offset <= len(cached_messages):
+                for key, cached_key, message in zip(keys, cached_keys[offset:], cached_messages[offset:]):
+                    if key != cached_key:
+                        break
+                    compiled.append(message)
+        compiled.extend(compile_message(message) for message in messages[len(compiled):])
+
+        self._entries[chat_id] = (first_seq, keys, compiled)
+        self._entries.move_to_end(chat_id)
+        if len(self._entries) > self._max_threads:
+            self._entries.popitem(last=False)
+        # The caller appends the per turn parts, the cached list must stay untouched.
+        return list(compiled)
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from google import genai
+from google.genai import types
+from pydantic import BaseModel
+
+from util.logger import get_logger
+
+load_dotenv()
+
+
+class _CacheEntry(BaseModel):
+    name: str
+    fingerprint: str
+    # Number of leading contents stored in the cache.
+    covered: int
+    expires_at: float
+
+
+class GeminiContextCache:
+    """
+    Keeps one explicit Gemini context cache per chat thread holding the
+    system prompt and the stable head of the conversation, so follow up
+    turns only send the messages added since and pay the cached rate for
+    the rest. Any failure falls back to an uncached request.
+    """
+    def __init__(
+            self,
+            client: genai.Client,
+            model: str,
+            max_threads: int = 1024
+    ):
+        self._logger = get_logger(__name__)
+        self._client: genai.Client = client
+        self._model: str = model
+        self._enabled: bool = os.getenv("GEMINI_CONTEXT_CACHE", "false").lower() == "true"
+        # Gemini rejects caches below a model specific minimum size.
+        self._min_tokens: int = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "4096"))
+        self._ttl: int = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "600"))
+        # Recreate the cache once this many uncached contents piled up behind it.
+        self._refresh_messages: int = int(os.getenv("GEMINI_CONTEXT_CACHE_REFRESH_MESSAGES", "20"))
+        self._max_threads: int = max_threads
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+
+    @staticmethod
+    def fingerprint(*parts: str) -> str:
+        return hashlib.sha1("\x00".join(parts).encode("utf-8")).hexdigest()
+
+    async def prepare(
+            self,
+            chat_id: str | None,
+            fingerprint: str,
+            system: str,
+            contents: list[types.Content],
+            estimated_tokens: int
+    ) -> tuple[list[types.Content], types.GenerateContentConfig | None]:
+        uncached: types.GenerateContentConfig | None = \
+            types.GenerateContentConfig(system_instruction=system) if system else None
+        if not self._enabled or chat_id is None or len(contents) < 2:
+            return contents, uncached
+
+        entry: _CacheEntry | None = self._entries.get(chat_id)
+        # NOTE: A little headroom keeps a cache from expiring while the request is in flight.
+        if entry is not None and entry.fingerprint == fingerprint \
+                and entry.covered < len(contents) <= entry.covered + self._refresh_messages \
+                and entry.expires_at > time.monotonic() + 30:
+            self._entries.move_to_end(chat_id)
+            return contents[entry.covered:], types.GenerateContentConfig(cached_content=entry.name)
+
+        if estimated_tokens < self._min_tokens:
+            return contents, uncached
+
+        # The latest message changes every turn, everything before it is cached.
+        covered: int = len(contents) - 1
+        try:
+            cached_content: types.CachedContent = await self._client.aio.caches.create(
+                model=self._model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system or None,
+                    contents=contents[:covered],
+                    ttl=f"{self._ttl}s"
+                )
+            )
+        except Exception as e:
+            self._logger.warning(f"Failed to create context cache for chat: {chat_id}: {e}")
+            return contents, uncached
+
+        self._logger.info(f"Created context cache for chat: {chat_id}, contents: {covered}")
+        await self._evict(self._entries.pop(chat_id, None))
+        self._entries[chat_id] = _CacheEntry(
+            name=cached_content.name,
+            fingerprint=fingerprint,
+            covered=covered,
+            expires_at=time.monotonic() + self._ttl
+        )
+        while len(self._entries) > self._max_threads:
+            await self._evict(self._entries.popitem(last=False)[1])
+        return contents[covered:], types.GenerateContentConfig(cached_content=cached_content.name)
+
+    async def _evict(self, entry: _CacheEntry | None) -> None:
+        # Best effort, an entry that can not be deleted still expires with its TTL.
+        if entry is None or entry.expires_at <= time.monotonic():
+            return
+        try:
+            await self._client.aio.caches.delete(name=entry.name)
+        except Exception as e:
+            self._logger.warning(f"Failed to delete context cache {entry.name}: {e}")
@@ -0,0 +1,116 @@
+import os
+from typing import AsyncIterator
+
+from dotenv import load_dotenv
+from google import genai
+from google.genai import types
+
+from base.llm_provider_base import LLMProviderBase
+from provider.compiled_prefix_cache import CompiledPrefixCache
+from provider.gemini_context_cache import GeminiContextCache
+from provider.model.conversation_message_model import ConversationMessageModel
+from provider.model.conversation_model import ConversationModel
+from provider.model.usage_model import UsageModel
+from util.logger import get_logger
+from util.token_counter import MESSAGE_OVERHEAD_TOKENS, count_tokens
+
+load_dotenv()
+
+
+class GeminiProvider(LLMProviderBase):
+    def __init__(self):
+        super().__init__(
+            name="gemini",
+            max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "16")),
+            read_timeout=float(os.getenv("LLM_READ_TIMEOUT", "60"))
+        )
+        self._logger = get_logger(__name__)
+        # NOTE: The SDK only accepts a single timeout in milliseconds which
+        #       httpx applies to connect and read alike, so the read timeout
+        #       is used here and per-chunk reads are also bounded by the base.
+        self._client: genai.Client = genai.Client(
+            api_key=os.getenv("GEMINI_API_KEY"),
+            http_options=types.HttpOptions(timeout=int(self._read_timeout * 1000))
+        )
+        self._model: str = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+        self._prefix_cache: CompiledPrefixCache = CompiledPrefixCache()
+        self._context_cache: GeminiContextCache = GeminiContextCache(self._client, self._model)
+
+    @staticmethod
+    def _compile_message(message: ConversationMessageModel) -> types.Content:
+        # Gemini only knows the user and model roles, system text goes to the system instruction.
+        return types.Content(
+            role="model" if message.role == "assistant" else "user",
+            parts=[types.Part(text=message.content)]
+        )
+
+    async def _compile(self, conversation: ConversationModel) -> tuple[list[types.Content], types.GenerateContentConfig | None]:
+        contents: list[types.Content] = self._prefix_cache.compile(
+            conversation.chat_id,
+            conversation.first_seq,
+            conversation.messages,
+            self._compile_message
+        )
+        # The per thread context leads the contents so the system instruction stays identical across threads.
+        if conversation.context:
+            contents.insert(0, types.Content(role="user", parts=[types.Part(text=conversation.context)]))
+        if conversation.instruction:
+            contents.append(types.Content(role="user", parts=[types.Part(text=conversation.instruction)]))
+
+        estimated_tokens: int = count_tokens(conversation.system) + count_tokens(conversation.context) + sum(
+            count_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS for message in conversation.messages)
+        return await self._context_cache.prepare(
+            conversation.chat_id,
+            self._context_cache.fingerprint(conversation.system, conversation.context, str(conversation.first_seq)),
+            conversation.system,
+            contents,
+            estimated_tokens
+        )
+
+    @staticmethod
+    def _record_usage(
+            usage: UsageModel,
+            usage_metadata: types.GenerateContentResponseUsageMetadata | None
+    ) -> None:
+        if usage_metadata is None:
+            return
+        usage.input_tokens = usage_metadata.prompt_token_count or 0
+        usage.cached_input_tokens = usage_metadata.cached_content_token_count or 0
+        usage.output_tokens = usage_metadata.candidates_token_count or 0
+
+    async def _generate(
+            self,
+            conversation: ConversationModel,
+            usage: UsageModel
+    ) -> str:
+        contents, config = await self._compile(conversation)
+        response = await self._client.aio.models.generate_content(
+            model=self._model,
+            contents=contents,
+            config=config
+        )
+        self._record_usage(usage, response.usage_metadata)
+        return response.text
+
+    async def _stream(
+            self,
+            conversation: ConversationModel,
+            usage: UsageModel
+    ) -> AsyncIterator[str]:
+        contents, config = await self._compile(conversation)
+        stream = await self._client.aio.models.generate_content_stream(
+            model=self._model,
+            contents=contents,
+            config=config
+        )
+        # NOTE: The stream is an async generator of the SDK, closing it
+        #       closes its response, also when the attempt is cancelled or
+        #       loses a hedge.
+        try:
+            async for chunk in stream:
+                # Every chunk carries the running totals, the last one wins.
+                self._record_usage(usage, chunk.usage_metadata)
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            await stream.aclose()
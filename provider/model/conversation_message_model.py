@@ -0,0 +1,6 @@
+from pydantic import BaseModel
+
+class ConversationMessageModel(BaseModel):
+    # One of "user", "assistant" or "system".
+    role: str
+    content: str
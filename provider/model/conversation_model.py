@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+
+from .conversation_message_model import ConversationMessageModel
+
+class ConversationModel(BaseModel):
+    # Provider neutral description of one generation request.
+    chat_id: str | None = None
+    # Position of messages[0] in the chat history, messages are append only
+    # so (chat_id, seq) always identifies the same message.
+    first_seq: int = 0
+    # Kept identical across requests so providers can cache it.
+    system: str = ""
+    # Per thread text placed between the system prompt and the messages, e.g. the summary.
+    context: str = ""
+    messages: list[ConversationMessageModel] = []
+    instruction: str = ""
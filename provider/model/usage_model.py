@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+class UsageModel(BaseModel):
+    # Token usage of one generation as reported by the provider.
+    provider: str | None = None
+    input_tokens: int = 0
+    # Part of input_tokens that was served from the provider's prompt cache.
+    cached_input_tokens: int = 0
+    output_tokens: int = 0
@@ -0,0 +1,101 @@
+import os
+from typing import AsyncIterator
+
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from openai.types import CompletionUsage
+
+from base.llm_provider_base import LLMProviderBase
+from provider.compiled_prefix_cache import CompiledPrefixCache
+from provider.model.conversation_message_model import ConversationMessageModel
+from provider.model.conversation_model import ConversationModel
+from provider.model.usage_model import UsageModel
+from util.logger import get_logger
+
+load_dotenv()
+
+
+class OpenAIProvider(LLMProviderBase):
+    def __init__(self):
+        super().__init__(
+            name="openai",
+            max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "16")),
+            read_timeout=float(os.getenv("LLM_READ_TIMEOUT", "60"))
+        )
+        self._logger = get_logger(__name__)
+        self._client: AsyncOpenAI = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            timeout=httpx.Timeout(
+                self._read_timeout,
+                connect=float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+            )
+        )
+        self._model: str = os.getenv("OPENAI_MODEL", "gpt-4.1")
+        self._prefix_cache: CompiledPrefixCache = CompiledPrefixCache()
+
+    @staticmethod
+    def _compile_message(message: ConversationMessageModel) -> dict:
+        return {"role": message.role, "content": message.content}
+
+    def _compile(self, conversation: ConversationModel) -> list[dict]:
+        # NOTE: OpenAI caches the longest previously seen prompt prefix on its own, so the
+        #       static system prompt goes first, then the per thread context and then the
+        #       history, whose head only moves in window steps.
+        messages: list[dict] = [{"role": "system", "content": conversation.system}] if conversation.system else []
+        if conversation.context:
+            messages.append({"role": "system", "content": conversation.context})
+        messages.extend(self._prefix_cache.compile(
+            conversation.chat_id,
+            conversation.first_seq,
+            conversation.messages,
+            self._compile_message
+        ))
+        # The instruction prompt closes the conversation as a system message.
+        if conversation.instruction:
+            messages.append({"role": "system", "content": conversation.instruction})
+        return messages
+
+    @staticmethod
+    def _record_usage(
+            usage: UsageModel,
+            completion_usage: CompletionUsage | None
+    ) -> None:
+        if completion_usage is None:
+            return
+        usage.input_tokens = completion_usage.prompt_tokens
+        if completion_usage.prompt_tokens_details:
+            usage.cached_input_tokens = completion_usage.prompt_tokens_details.cached_tokens or 0
+        usage.output_tokens = completion_usage.completion_tokens
+
+    async def _generate(
+            self,
+            conversation: ConversationModel,
+            usage: UsageModel
+    ) -> str:
+        response = await self._client.chat.completions.create(
+            model=self._model,
+            messages=self._compile(conversation)
+        )
+        self._record_usage(usage, response.usage)
+        return response.choices[0].message.content
+
+    async def _stream(
+            self,
+            conversation: ConversationModel,
+            usage: UsageModel
+    ) -> AsyncIterator[str]:
+        stream = await self._client.chat.completions.create(
+            model=self._model,
+            messages=self._compile(conversation),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        # NOTE: Leaving the block closes the response and releases its
+        #       connection, also when the attempt is cancelled or loses a hedge.
+        async with stream:
+            async for chunk in stream:
+                # The usage arrives in a final chunk without choices.
+                self._record_usage(usage, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
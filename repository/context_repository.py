@@ -1,16 +1,34 @@
 import asyncio
+import base64
+import json
+from functools import cached_property
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
 
 from base.mongodb_repository_base import MongoDBRepositoryBase
 from util.logger import get_logger
-from db.mongodb_connector import MongoDBConnector
+from util.timing import timed
+from db.mongodb_connector import mongodb_connector
 from db.model.chat_thread_model import ChatThreadModel
+from db.model.chat_thread_meta_model import ChatThreadMetaModel
+from db.model.history_page_model import HistoryPageModel
+from exception.chat_thread_conflict_error import ChatThreadConflictError
 from db.model.message_model import MessageModel
 
 class ContextRepository(MongoDBRepositoryBase):
     def __init__(self):
         self._logger = get_logger(__name__)
-        self._db = MongoDBConnector().client["psychology_chat_context"]
-        self._collection = self._db["chat_history"]
+
+    # NOTE: Resolved on first use, importing the repository creates no
+    #       MongoDB client. A server that imports the app before forking
+    #       its workers therefore shares no client between processes.
+    @cached_property
+    def _db(self):
+        return mongodb_connector.client()["psychology_chat_context"]
+
+    @cached_property
+    def _collection(self):
+        return self._db["chat_history"]
 
     # Ensure database setup
     async def _ensure_db_setup(self):
@@ -36,16 +54,35 @@ class ContextRepository(MongoDBRepositoryBase):
             await self._collection.create_index("chat_id", unique=True)
             self._logger.info("Created index on chat_id")
 
+            # Backs the most recent first thread listing of a user.
+            await self._collection.create_index(
+                [("user_uid", ASCENDING), ("updated_at", DESCENDING), ("chat_id", DESCENDING)],
+                name="user_uid_updated_at")
+            self._logger.info("Created index on user_uid and updated_at")
+
             self._logger.info("Database setup completed successfully")
         except Exception as e:
             self._logger.error(f"Database setup error: {e}")
             raise Exception(f"Failed to setup database: {e}")
 
+    @staticmethod
+    def _thread_from_document(
+            document: dict
+    ) -> ChatThreadModel:
+        # NOTE: Documents read back from the collection were validated when
+        #       they were written, so the thread and its messages are built
+        #       without validating every message again.
+        return ChatThreadModel.model_construct(**{
+            **document,
+            "history": [MessageModel.model_construct(**message) for message in document.get("history") or []]
+        })
+
+    @timed("db.insert_one")
     async def insert_one(
             self,
             document: ChatThreadModel
     ) -> bool:
-        self._logger.info(f"Inserting document: {document}")
+        self._logger.info("Inserting document: %s, messages: %d", document.chat_id, len(document.history))
         try:
             await self._collection.insert_one(document.model_dump())
 
@@ -58,41 +95,42 @@ class ContextRepository(MongoDBRepositoryBase):
             self,
             documents: list[ChatThreadModel]
     ) -> bool:
-        self._logger.info(f"Inserting documents: {documents}")
+        self._logger.info("Inserting %d documents", len(documents))
         try:
             await self._collection.insert_many([doc.model_dump() for doc in documents])
 
         except Exception as e:
-            print(e)
+            self._logger.error(e)
             raise Exception(e)
         return True
 
+    @timed("db.get_one_by_id")
     async def get_one_by_id(
             self,
             id: str
     ) -> ChatThreadModel | None:
         result: any
-        self._logger.info(f"Retrieving document with id: {id}")
+        self._logger.debug("Retrieving document with id: %s", id)
         try:
             result = await self._collection.find_one({"chat_id": id})
         except Exception as e:
             self._logger.error(f"Something went wrong: {e}")
             return None
-        return ChatThreadModel(**result) if result else None
+        return self._thread_from_document(result) if result else None
 
     async def get_one_by_name(
             self,
             name: str
     ) -> ChatThreadModel | None:
         result: any
-        self._logger.info(f"Retrieving document with name: {name}")
+        self._logger.debug("Retrieving document with name: %s", name)
         try:
             result = await self._collection.find_one({"chat_name": name})
 
         except Exception as e:
             self._logger.error(e)
             raise Exception(e)
-        return ChatThreadModel(**result) if result else None
+        return self._thread_from_document(result) if result else None
 
     async def get_all(self) -> list[ChatThreadModel] | None:
         results: any
@@ -103,7 +141,15 @@ class ContextRepository(MongoDBRepositoryBase):
             self._logger.error(e)
             raise Exception(e)
 
-        return [ChatThreadModel(**result) async for result in results]
+        return [self._thread_from_document(result) async for result in results]
+
+    @staticmethod
+    def _version_filter(
+            chat_id: str,
+            version: int
+    ) -> dict:
+        # Documents written before versioning have no version field, they count as version 0.
+        return {"chat_id": chat_id, "version": {"$in": [0, None]} if version == 0 else version}
 
     async def update_one(
             self,
@@ -111,10 +157,17 @@ class ContextRepository(MongoDBRepositoryBase):
     ) -> bool:
         result: bool = False
         try:
-            await self._collection.update_one({"chat_id": chat_history.chat_id}, {"$set": chat_history.model_dump()})
-            result = True
+            update_result = await self._collection.update_one(
+                self._version_filter(chat_history.chat_id, chat_history.version),
+                {"$set": chat_history.model_dump(exclude={"version"}), "$inc": {"version": 1}})
+            result = update_result.matched_count == 1
         except Exception as e:
             self._logger.error(f"Failed to update document with id: {chat_history.chat_id}, error: {e}")
+            return result
+
+        if not result:
+            raise ChatThreadConflictError(chat_history.chat_id)
+        chat_history.version += 1
         return result
 
     async def update_many(
@@ -123,6 +176,82 @@ class ContextRepository(MongoDBRepositoryBase):
     ) -> bool:
         return False
 
+    @timed("db.update_chat_name")
+    async def update_chat_name(
+            self,
+            chat_id: str,
+            chat_name: str,
+            updated_at: str
+    ) -> bool | None:
+        # NOTE: Only the two fields are written, the history is neither read
+        #       nor sent and the version stays, so a rename never conflicts
+        #       with a running turn. Returns None if the update failed and
+        #       False if there is no such thread.
+        try:
+            update_result = await self._collection.update_one(
+                {"chat_id": chat_id},
+                {"$set": {"chat_name": chat_name, "updated_at": updated_at}})
+        except Exception as e:
+            self._logger.error(f"Failed to update chat name of document with id: {chat_id}, error: {e}")
+            return None
+        return update_result.matched_count == 1
+
+    @staticmethod
+    def _build_push_update(
+            messages: list[MessageModel],
+            updated_at: str
+    ) -> dict:
+        # NOTE: Only the new messages and the timestamp travel to
+        #       the server, so the cost of a turn does not grow with
+        #       the length of the history.
+        return {
+            "$push": {"history": {"$each": [message.model_dump() for message in messages]}},
+            "$set": {"updated_at": updated_at},
+            "$inc": {"version": 1}
+        }
+
+    @timed("db.push_messages")
+    async def push_messages(
+            self,
+            chat_id: str,
+            messages: list[MessageModel],
+            updated_at: str,
+            expected_version: int | None = None
+    ) -> bool:
+        # NOTE: With an expected_version the push only applies if nobody
+        #       else wrote to the history since that version was read.
+        result: bool = False
+        try:
+            update_result = await self._collection.update_one(
+                {"chat_id": chat_id} if expected_version is None else self._version_filter(chat_id, expected_version),
+                self._build_push_update(messages, updated_at))
+            result = update_result.matched_count == 1
+        except Exception as e:
+            self._logger.error(f"Failed to push messages to document with id: {chat_id}, error: {e}")
+            return result
+
+        if not result and expected_version is not None:
+            raise ChatThreadConflictError(chat_id)
+        return result
+
+    async def push_messages_many(
+            self,
+            turns: dict[str, list[MessageModel]],
+            updated_at: str
+    ) -> bool:
+        result: bool = False
+        if not turns:
+            return True
+        try:
+            update_result = await self._collection.bulk_write(
+                [UpdateOne({"chat_id": chat_id}, self._build_push_update(messages, updated_at))
+                 for chat_id, messages in turns.items()],
+                ordered=False)
+            result = update_result.matched_count == len(turns)
+        except Exception as e:
+            self._logger.error(f"Failed to push messages to documents with ids: {list(turns)}, error: {e}")
+        return result
+
     async def delete_one(
             self,
             chat_history: ChatThreadModel
@@ -136,6 +265,7 @@ class ContextRepository(MongoDBRepositoryBase):
             raise Exception(e)
         return result
 
+    @timed("db.delete_one_by_id")
     async def delete_one_by_id(
             self,
             id: str
@@ -175,7 +305,81 @@ class ContextRepository(MongoDBRepositoryBase):
         except Exception as e:
             self._logger.error(f"Something went wrong: {e}")
             return None
-        return [ChatThreadModel(**result) async for result in results]
+        return [self._thread_from_document(result) async for result in results]
+
+    @timed("db.update_summary")
+    async def update_summary(
+            self,
+            chat_id: str,
+            summary: str,
+            summary_upto: int,
+            previous_summary_upto: int
+    ) -> bool:
+        # NOTE: The filter on the previous summary_upto makes concurrent
+        #       summarizations of the same thread a no-op instead of
+        #       letting an older summary overwrite a newer one.
+        result: bool = False
+        try:
+            update_result = await self._collection.update_one(
+                {"chat_id": chat_id,
+                 "summary_upto": {"$in": [previous_summary_upto, None]} if previous_summary_upto == 0 else previous_summary_upto},
+                {"$set": {"summary": summary, "summary_upto": summary_upto}})
+            result = update_result.matched_count == 1
+        except Exception as e:
+            self._logger.error(f"Failed to update summary of document with id: {chat_id}, error: {e}")
+        return result
+
+    @staticmethod
+    def _encode_cursor(
+            thread: ChatThreadMetaModel
+    ) -> str:
+        return base64.urlsafe_b64encode(json.dumps([thread.updated_at, thread.chat_id]).encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def _decode_cursor(
+            cursor: str
+    ) -> tuple[str, str]:
+        try:
+            updated_at, chat_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        except Exception:
+            raise ValueError(f"Invalid cursor: {cursor}")
+        return updated_at, chat_id
+
+    @timed("db.get_thread_list_by_uid")
+    async def get_thread_list_by_uid(
+            self,
+            uid: str,
+            limit: int | None = None,
+            cursor: str | None = None
+    ) -> tuple[list[ChatThreadMetaModel], str | None] | None:
+        # NOTE: The history is excluded on the server and the page is
+        #       walked with a (updated_at, chat_id) keyset, so the cost
+        #       of a page does not depend on history sizes or on how
+        #       deep the client has scrolled.
+        query: dict = {"user_uid": uid}
+        if cursor:
+            updated_at, chat_id = self._decode_cursor(cursor)
+            query["$or"] = [
+                {"updated_at": {"$lt": updated_at}},
+                {"updated_at": updated_at, "chat_id": {"$lt": chat_id}}
+            ]
+        try:
+            results = self._collection.find(
+                query,
+                projection={"_id": 0, "history": 0},
+                sort=[("updated_at", DESCENDING), ("chat_id", DESCENDING)],
+                # Fetch one extra document to know if there is a next page.
+                limit=limit + 1 if limit else 0)
+            threads: list[ChatThreadMetaModel] = [ChatThreadMetaModel.model_construct(**result) async for result in results]
+        except Exception as e:
+            self._logger.error(f"Something went wrong: {e}")
+            return None
+
+        next_cursor: str | None = None
+        if limit and len(threads) > limit:
+            threads = threads[:limit]
+            next_cursor = self._encode_cursor(threads[-1])
+        return threads, next_cursor
 
     async def get_one_by_uid(
             self,
@@ -187,7 +391,7 @@ class ContextRepository(MongoDBRepositoryBase):
         except Exception as e:
             self._logger.error(f"Something went wrong: {e}")
             return None
-        return ChatThreadModel(**result) if result else None
+        return self._thread_from_document(result) if result else None
 
     async def get_history_by_id(
             self,
@@ -199,6 +403,90 @@ class ContextRepository(MongoDBRepositoryBase):
         except Exception as e:
             self._logger.error(f"Something went wrong: {e}")
             return None
-        return [MessageModel(**message) for message in result.get("history")] if result else []
+        return [MessageModel.model_construct(**message) for message in result.get("history")] if result else []
+
+    @timed("db.get_meta_by_id")
+    async def get_meta_by_id(
+            self,
+            id: str
+    ) -> ChatThreadMetaModel | None:
+        result: any
+        try:
+            result = await self._collection.find_one({"chat_id": id}, projection={"_id": 0, "history": 0})
+        except Exception as e:
+            self._logger.error(f"Something went wrong: {e}")
+            return None
+        return ChatThreadMetaModel.model_construct(**result) if result else None
+
+    @timed("db.get_version_by_id")
+    async def get_version_by_id(
+            self,
+            id: str
+    ) -> int | None:
+        # Only the version field leaves the server, documents without one count as version 0.
+        result: any
+        try:
+            result = await self._collection.find_one({"chat_id": id}, projection={"_id": 0, "version": 1})
+        except Exception as e:
+            self._logger.error(f"Something went wrong: {e}")
+            return None
+        return (result.get("version") or 0) if result is not None else None
+
+    @timed("db.get_history_page_by_id")
+    async def get_history_page_by_id(
+            self,
+            id: str,
+            limit: int | None = None,
+            before: int | None = None,
+            after: int | None = None,
+            since: str | None = None
+    ) -> HistoryPageModel | None:
+        # NOTE: Messages are addressed by their position in the history
+        #       array (seq). Only the positions of the requested page are
+        #       computed and returned by the server, the rest of the
+        #       history never leaves MongoDB.
+        size: dict = {"$size": {"$ifNull": ["$history", []]}}
+        indexes: dict
+        if since is not None:
+            # The created_at array is built once and indexed, building it per
+            # element would make this quadratic in the length of the history.
+            indexes = {"$let": {
+                "vars": {"created": {"$map": {
+                    "input": {"$ifNull": ["$history", []]}, "as": "m", "in": "$$m.created_at"}}},
+                "in": {"$filter": {
+                    "input": {"$range": [0, {"$size": "$$created"}]},
+                    "as": "i",
+                    "cond": {"$gt": [{"$arrayElemAt": ["$$created", "$$i"]}, since]}}}}}
+            if limit:
+                indexes = {"$slice": [indexes, limit]}
+        elif after is not None:
+            start: dict = {"$min": [after + 1, size]}
+            indexes = {"$range": [start, {"$min": [after + 1 + limit, size]} if limit else size]}
+        else:
+            end: dict = {"$min": [before, size]} if before is not None else size
+            indexes = {"$range": [{"$max": [{"$subtract": [end, limit]}, 0]} if limit else 0, end]}
+
+        pipeline: list[dict] = [
+            {"$match": {"chat_id": id}},
+            {"$project": {"_id": 0, "chat_id": 1, "updated_at": 1, "history": 1, "total": size, "indexes": indexes}},
+            {"$project": {
+                "chat_id": 1,
+                "updated_at": 1,
+                "total": 1,
+                "first_seq": {"$ifNull": [{"$arrayElemAt": ["$indexes", 0]}, "$total"]},
+                "history": {"$map": {"input": "$indexes", "as": "i", "in": {"$arrayElemAt": ["$history", "$$i"]}}}}}
+        ]
+        try:
+            results = await self._collection.aggregate(pipeline)
+            result: dict | None = next(iter(await results.to_list(length=1)), None)
+        except Exception as e:
+            self._logger.error(f"Something went wrong: {e}")
+            return None
+        if result is None:
+            return None
+        return HistoryPageModel.model_construct(**{
+            **result,
+            "history": [MessageModel.model_construct(**message) for message in result["history"]]
+        })
 
 context_repository = ContextRepository()
\ No newline at end of file
@@ -0,0 +1,466 @@
+import asyncio
+import time
+import uuid
+from functools import cached_property
+
+from pymongo import ASCENDING, DeleteMany, ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from repository.context_repository import ContextRepository
+from db.model.chat_thread_model import ChatThreadModel
+from db.model.history_page_model import HistoryPageModel
+from db.model.message_model import MessageModel
+from exception.chat_thread_conflict_error import ChatThreadConflictError
+from util.timing import timed
+
+# Length of the last_message_preview kept on every thread document.
+PREVIEW_LENGTH: int = 120
+# Uncommitted messages younger than this may still belong to a write in progress.
+ORPHAN_GRACE_SECONDS: float = 60.0
+DUPLICATE_KEY_ERROR: int = 11000
+
+
+class SplitContextRepository(ContextRepository):
+    """
+    Stores every message as its own document in the messages collection,
+    keyed by (chat_id, seq), while the chat_history document only keeps
+    the thread metadata together with message_count and
+    last_message_preview. Threads are no longer bound by the 16 MB
+    document limit and metadata reads never touch the messages.
+
+    message_count is the commit point of a thread: messages at or past
+    it belong to a write that never completed and are never read. They
+    are removed once they are in the way of a later write.
+    Threads still in the embedded layout are read as they are and moved
+    to the split layout on their first write, or by the migration tool.
+    """
+    @cached_property
+    def _messages(self):
+        return self._db["messages"]
+
+    async def _ensure_db_setup(self):
+        await super()._ensure_db_setup()
+        try:
+            await self._messages.create_index([("chat_id", ASCENDING), ("seq", ASCENDING)], unique=True)
+            self._logger.info("Created index on chat_id and seq")
+        except Exception as e:
+            self._logger.error(f"Database setup error: {e}")
+            raise Exception(f"Failed to setup database: {e}")
+
+    @staticmethod
+    def _preview(messages: list[MessageModel]) -> str:
+        return messages[-1].content[:PREVIEW_LENGTH] if messages else ""
+
+    @staticmethod
+    def _message_documents(
+            chat_id: str,
+            first_seq: int,
+            messages: list[MessageModel]
+    ) -> list[dict]:
+        return [{"chat_id": chat_id, "seq": first_seq + i, **message.model_dump()}
+                for i, message in enumerate(messages)]
+
+    def _thread_document(
+            self,
+            document: ChatThreadModel
+    ) -> dict:
+        return {
+            **document.model_dump(exclude={"history"}),
+            "message_count": len(document.history),
+            "last_message_preview": self._preview(document.history)
+        }
+
+    async def _load_messages(
+            self,
+            chat_id: str,
+            start: int,
+            end: int,
+            limit: int = 0
+    ) -> list[MessageModel]:
+        results = self._messages.find(
+            {"chat_id": chat_id, "seq": {"$gte": start, "$lt": end}},
+            projection={"_id": 0, "chat_id": 0, "seq": 0, "write_id": 0, "written_at": 0},
+            sort=[("seq", ASCENDING)],
+            limit=limit)
+        return [MessageModel.model_construct(**result) async for result in results]
+
+    async def _to_thread(
+            self,
+            result: dict
+    ) -> ChatThreadModel:
+        # Threads that were not migrated yet still carry their embedded history.
+        if "history" in result:
+            return self._thread_from_document(result)
+        chat_thread: ChatThreadModel = self._thread_from_document(result)
+        chat_thread.history = await self._load_messages(result["chat_id"], 0, result.get("message_count", 0))
+        return chat_thread
+
+    @timed("db.insert_one")
+    async def insert_one(
+            self,
+            document: ChatThreadModel
+    ) -> bool:
+        self._logger.info("Inserting document: %s, messages: %d", document.chat_id, len(document.history))
+        try:
+            if document.history:
+                await self._messages.insert_many(self._message_documents(document.chat_id, 0, document.history))
+            await self._collection.insert_one(self._thread_document(document))
+
+        except Exception as e:
+            self._logger.error(e)
+            raise Exception(e)
+        return True
+
+    async def insert_many(
+            self,
+            documents: list[ChatThreadModel]
+    ) -> bool:
+        self._logger.info("Inserting %d documents", len(documents))
+        try:
+            messages: list[dict] = [message for doc in documents
+                                    for message in self._message_documents(doc.chat_id, 0, doc.history)]
+            if messages:
+                await self._messages.insert_many(messages, ordered=False)
+            await self._collection.insert_many([self._thread_document(doc) for doc in documents])
+
+        except Exception as e:
+            self._logger.error(e)
+            raise Exception(e)
+        return True
+
+    @timed("db.get_one_by_id")
+    async def get_one_by_id(
+            self,
+            id: str
+    ) -> ChatThreadModel | None:
+        self._logger.debug("Retrieving document with id: %s", id)
+        try:
+            result: dict | None = await self._collection.find_one({"chat_id": id})
+            return await self._to_thread(result) if result else None
+        except Exception as e:
+            self._logger.error(f"Something went wrong: {e}")
+            return None
+
+    async def get_one_by_name(
+            self,
+            name: str
+    ) -> ChatThreadModel | None:
+        self._logger.debug("Retrieving document with name: %s", name)
+        try:
+            result: dict | None = await self._collection.find_one({"chat_name": name})
+            return await self._to_thread(result) if result else None
+
+        except Exception as e:
+            self._logger.error(e)
+            raise Exception(e)
+
+    async def get_one_by_uid(
+            self,
+            uid: str
+    ) -> ChatThreadModel | None:
+        try:
+            result: dict | None = await self._collection.find_one({"user_uid": uid})
+            return await self._to_thread(result) if result else None
+        except Exception as e:
+            self._logger.error(f"Something went wrong: {e}")
+            return None
+
+    async def get_all(self) -> list[ChatThreadModel] | None:
+        try:
+            return [await self._to_thread(result) async for result in self._collection.find()]
+
+        except Exception as e:
+            self._logger.error(e)
+            raise Exception(e)
+
+    async def get_all_by_uid(
+            self,
+            uid: str
+    ) -> list[ChatThreadModel] | None:
+        try:
+            return [await self._to_thread(result) async for result in self._collection.find({"user_uid": uid})]
+        except Exception as e:
+            self._logger.error(f"Something went wrong: {e}")
+            return None
+
+    async def get_history_by_id(
+            self,
+            id: str
+    ) -> list[MessageModel] | None:
+        chat_thread: ChatThreadModel | None = await self.get_one_by_id(id)
+        return chat_thread.history if chat_thread else []
+
+    async def update_one(
+            self,
+            chat_history: ChatThreadModel
+    ) -> bool:
+        # NOTE: Only the thread metadata is written here. The messages are
+        #       append only and change through push_messages exclusively.
+        result: bool = False
+        try:
+            update_result = await self._collection.update_one(
+                self._version_filter(chat_history.chat_id, chat_history.version),
+                {"$set": chat_history.model_dump(exclude={"history", "version"}), "$inc": {"version": 1}})
+            result = update_result.matched_count == 1
+        except Exception as e:
+            self._logger.error(f"Failed to update document with id: {chat_history.chat_id}, error: {e}")
+            return result
+
+        if not result:
+            raise ChatThreadConflictError(chat_history.chat_id)
+        chat_history.version += 1
+        return result
+
+    @timed("db.migrate_thread")
+    async def migrate_thread(
+            self,
+            chat_id: str,
+            max_attempts: int = 5
+    ) -> bool:
+        # NOTE: Copies the embedded history into the messages collection and
+        #       drops it from the thread document. The copy is an idempotent
+        #       upsert and the switch only applies if the thread did not change
+        #       meanwhile, so it is safe next to live traffic and can be rerun.
+        #       The version is left alone, cached copies of the thread stay valid.
+        for _ in range(max_attempts):
+            try:
+                result: dict | None = await self._collection.find_one(
+                    {"chat_id": chat_id}, projection={"_id": 0, "history": 1, "message_count": 1, "version": 1})
+                if result is None or "history" not in result:
+                    return True
+
+                # A writer still on the embedded layout may push to an already split thread.
+                first_seq: int = result.get("message_count") or 0
+                messages: list[MessageModel] = [MessageModel(**message) for message in result["history"] or []]
+                if messages:
+                    await self._messages.bulk_write(
+                        [ReplaceOne({"chat_id": chat_id, "seq": message["seq"]}, message, upsert=True)
+                         for message in self._message_documents(chat_id, first_seq, messages)],
+                        ordered=False)
+
+                update_filter: dict = self._version_filter(chat_id, result.get("version") or 0)
+                update_filter["history"] = {"$exists": True}
+                update_result = await self._collection.update_one(
+                    update_filter,
+                    {"$unset": {"history": ""},
+                     "$set": {"message_count": first_seq + len(messages),
+                              **({"last_message_preview": self._preview(messages)} if messages else {})}})
+            except Exception as e:
+                self._logger.error(f"Failed to migrate document with id: {chat_id}, error: {e}")
+                return False
+            if update_result.matched_count == 1:
+                return True
+        self._logger.warning(f"Gave up migrating document with id: {chat_id}, it kept changing")
+        return False
+
+    async def _write_messages(
+            self,
+            chat_id: str,
+            first_seq: int,
+            messages: list[MessageModel],
+            write_id: str
+    ) -> bool:
+        # Inserts the messages past the committed ones. False if one of their
+        # seqs is taken, by another writer or by what a failed write left.
+        try:
+            await self._messages.insert_many(
+                [{**message, "write_id": write_id, "written_at": time.time()}
+                 for message in self._message_documents(chat_id, first_seq, messages)],
+                ordered=False)
+        except BulkWriteError as e:
+            if any(error.get("code") != DUPLICATE_KEY_ERROR for error in e.details.get("writeErrors", [])):
+                raise
+            await self._discard_messages(chat_id, write_id)
+            await self._repair_orphans(chat_id)
+            return False
+        return True
+
+    async def _commit_messages(
+            self,
+            chat_id: str,
+            first_seq: int,
+            messages: list[MessageModel],
+            updated_at: str,
+            expected_version: int | None
+    ) -> bool:
+        # Moves message_count past the written messages, only if nobody committed since they were written.
+        update_filter: dict = {"chat_id": chat_id} if expected_version is None else \
+            self._version_filter(chat_id, expected_version)
+        update_filter["message_count"] = first_seq
+        update_result = await self._collection.update_one(
+            update_filter,
+            {"$inc": {"message_count": len(messages), "version": 1},
+             "$set": {"updated_at": updated_at, "last_message_preview": self._preview(messages)}})
+        return update_result.matched_count == 1
+
+    async def _discard_messages(
+            self,
+            chat_id: str,
+            write_id: str
+    ) -> None:
+        # Best effort, whatever is left is removed by _repair_orphans later.
+        try:
+            await self._messages.delete_many({"chat_id": chat_id, "write_id": write_id})
+        except Exception as e:
+            self._logger.error(f"Failed to discard uncommitted messages of document with id: {chat_id}, error: {e}")
+
+    async def _repair_orphans(self, chat_id: str) -> None:
+        # NOTE: Messages past message_count that are older than
+        #       ORPHAN_GRACE_SECONDS belong to a write that failed or whose
+        #       process died before its commit. Younger ones may belong to a
+        #       write still in progress and are left alone.
+        result: dict | None = await self._collection.find_one(
+            {"chat_id": chat_id}, projection={"_id": 0, "message_count": 1})
+        if result is None:
+            return
+        delete_result = await self._messages.delete_many(
+            {"chat_id": chat_id,
+             "seq": {"$gte": result.get("message_count") or 0},
+             "written_at": {"$not": {"$gte": time.time() - ORPHAN_GRACE_SECONDS}}})
+        if delete_result.deleted_count:
+            self._logger.warning(f"Removed {delete_result.deleted_count} uncommitted messages of chat: {chat_id}")
+
+    @timed("db.push_messages")
+    async def push_messages(
+            self,
+            chat_id: str,
+            messages: list[MessageModel],
+            updated_at: str,
+            expected_version: int | None = None,
+            max_attempts: int = 5
+    ) -> bool:
+        # NOTE: The messages are inserted first, at the seqs right after
+        #       message_count, and message_count only moves past them with a
+        #       compare-and-swap on the count they were written at. Readers
+        #       never find a seq below message_count without its document,
+        #       and a write that fails halfway leaves nothing they would read.
+        for _ in range(max_attempts):
+            try:
+                result: dict | None = await self._collection.find_one(
+                    {"chat_id": chat_id},
+                    projection={"_id": 0, "message_count": 1, "version": 1, "history": {"$slice": 0}})
+            except Exception as e:
+                self._logger.error(f"Failed to push messages to document with id: {chat_id}, error: {e}")
+                return False
+            if result is None or (expected_version is not None and (result.get("version") or 0) != expected_version):
+                if expected_version is not None:
+                    raise ChatThreadConflictError(chat_id)
+                return False
+            # Threads still in the embedded layout are moved on their first write.
+            if "history" in result:
+                if not await self.migrate_thread(chat_id):
+                    return False
+                continue
+
+            first_seq: int = result.get("message_count") or 0
+            write_id: str = uuid.uuid4().hex
+            committed: bool = False
+            try:
+                if await self._write_messages(chat_id, first_seq, messages, write_id):
+                    committed = await self._commit_messages(chat_id, first_seq, messages, updated_at, expected_version)
+                    if not committed:
+                        await self._discard_messages(chat_id, write_id)
+            except Exception as e:
+                self._logger.error(f"Failed to push messages to document with id: {chat_id}, error: {e}")
+                await self._discard_messages(chat_id, write_id)
+                return False
+            if committed:
+                return True
+            # Another write came first, with an expected version this turn is outdated.
+            if expected_version is not None:
+                raise ChatThreadConflictError(chat_id)
+        self._logger.warning(f"Gave up pushing messages to document with id: {chat_id}, it kept changing")
+        return False
+
+    async def push_messages_many(
+            self,
+            turns: dict[str, list[MessageModel]],
+            updated_at: str
+    ) -> bool:
+        results: list[bool] = await asyncio.gather(
+            *[self.push_messages(chat_id, messages, updated_at) for chat_id, messages in turns.items()])
+        return all(results)
+
+    async def delete_one(
+            self,
+            chat_history: ChatThreadModel
+    ) -> bool:
+        return await self.delete_many_by_id([chat_history.chat_id])
+
+    @timed("db.delete_one_by_id")
+    async def delete_one_by_id(
+            self,
+            id: str
+    ) -> bool:
+        try:
+            result = await self._collection.delete_one({"chat_id": id})
+            await self._messages.delete_many({"chat_id": id})
+        except Exception as e:
+            self._logger.error(e)
+            return False
+        return result.deleted_count == 1
+
+    async def delete_many_by_id(
+            self,
+            ids
+    ) -> bool:
+        try:
+            result = await self._collection.delete_many({"chat_id": {"$in": ids}})
+            await self._messages.bulk_write([DeleteMany({"chat_id": id}) for id in ids], ordered=False)
+        except Exception as e:
+            self._logger.error(e)
+            raise Exception(e)
+        return result.deleted_count > 0
+
+    @timed("db.get_history_page_by_id")
+    async def get_history_page_by_id(
+            self,
+            id: str,
+            limit: int | None = None,
+            before: int | None = None,
+            after: int | None = None,
+            since: str | None = None
+    ) -> HistoryPageModel | None:
+        try:
+            result: dict | None = await self._collection.find_one(
+                {"chat_id": id},
+                projection={"_id": 0, "chat_id": 1, "updated_at": 1, "message_count": 1, "history": {"$slice": 0}})
+            if result is None:
+                return None
+            if "history" in result:
+                return await super().get_history_page_by_id(id, limit, before, after, since)
+
+            total: int = result.get("message_count") or 0
+            first_seq: int
+            history: list[MessageModel]
+            if since is not None:
+                # Seqs are needed to report where the page starts.
+                results = self._messages.find(
+                    {"chat_id": id, "seq": {"$lt": total}, "created_at": {"$gt": since}},
+                    projection={"_id": 0, "chat_id": 0, "write_id": 0, "written_at": 0},
+                    sort=[("seq", ASCENDING)],
+                    limit=limit or 0)
+                documents: list[dict] = [document async for document in results]
+                first_seq = documents[0]["seq"] if documents else total
+                history = [MessageModel.model_construct(**document) for document in documents]
+            else:
+                if after is not None:
+                    start: int = min(after + 1, total)
+                    end: int = min(start + limit, total) if limit else total
+                else:
+                    end = min(before, total) if before is not None else total
+                    start = max(end - limit, 0) if limit else 0
+                first_seq = start if start < end else total
+                history = await self._load_messages(id, start, end)
+        except Exception as e:
+            self._logger.error(f"Something went wrong: {e}")
+            return None
+        return HistoryPageModel.model_construct(
+            chat_id=result["chat_id"],
+            updated_at=result["updated_at"],
+            total=total,
+            first_seq=first_seq,
+            history=history
+        )
+
+split_context_repository = SplitContextRepository()
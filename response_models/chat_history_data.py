@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+
+from db.model.message_model import MessageModel
+
+class ChatHistoryData(BaseModel):
+    history: list[MessageModel]
+    first_seq: int
+    total: int
@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+from db.model.chat_thread_meta_model import ChatThreadMetaModel
+
+class ChatListData(BaseModel):
+    threads: list[ChatThreadMetaModel]
+    next_cursor: str | None
@@ -1,6 +1,11 @@
+from typing import Generic, TypeVar
+
 from pydantic import BaseModel
 
-class ResponseModel(BaseModel):
+DataT = TypeVar("DataT")
+
+class ResponseModel(BaseModel, Generic[DataT]):
     success: bool
     message: str
-    data: dict
\ No newline at end of file
+    # The typed data of a successful response, failed ones send an empty dict.
+    data: DataT | dict
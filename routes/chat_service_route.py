@@ -1,17 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends, Security
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Security
 from fastapi.security.api_key import APIKeyHeader
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import os
-import asyncio
 
 from starlette.responses import JSONResponse
 
 from db.model.chat_thread_model import ChatThreadModel
-from util.logger import get_logger
+from util.logger import chat_id_context, get_logger
+from util.sse import format_sse_event
 from request_models.create_chat_thread_model import CreateChatThreadModel
 from request_models.send_message_data import SendMessageData
+from response_models.chat_history_data import ChatHistoryData
+from response_models.chat_list_data import ChatListData
 from response_models.response_model import ResponseModel
 from service.chat_service import chat_service
+from util.model_response import ModelResponse
 
 router = APIRouter(prefix="/api/chat", tags=["Khatwa Chat Service"])
 logger = get_logger(__name__)
@@ -27,103 +30,137 @@ async def get_api_key(api_key: str = Security(api_key_header)) -> bool:
         return False
     return True
 
-@router.post("/create_chat_thread")
+@router.post("/create_chat_thread", response_model=ResponseModel[ChatThreadModel])
 async def create_chat_thread(
         request_data: CreateChatThreadModel,
         api_key: str = Depends(get_api_key)
-) -> JSONResponse:
+) -> Response:
     if not api_key:
         return JSONResponse(
             status_code=401,
             content={"success": False, "message": "Invalid API key", "data": {}})
     create_thread: dict = await chat_service.create_chat_thread(**request_data.model_dump())
-    return JSONResponse(
+    return ModelResponse(
         status_code=create_thread.get("code"),
-        content=ResponseModel(
+        content=ResponseModel.model_construct(
             success=create_thread.get("success"),
             message=create_thread.get("message"),
             data=create_thread.get("data"),
-        ).model_dump())
+        ))
 
-@router.get("/get_all_chats/{user_uid}")
+@router.get("/get_all_chats/{user_uid}", response_model=ResponseModel[ChatListData])
 async def get_all_chats(
         user_uid: str,
+        limit: int | None = Query(default=None, ge=1, le=100),
+        cursor: str | None = None,
         api_key: str = Depends(get_api_key)
-) -> JSONResponse:
+) -> Response:
     if not api_key:
         return JSONResponse(
             status_code=401,
             content={"success": False, "message": "Invalid API key", "data": {}})
-    get_chats: dict = await chat_service.get_all_chats(user_uid)
-    return JSONResponse(
+    get_chats: dict = await chat_service.get_all_chats(user_uid, limit, cursor)
+    return ModelResponse(
         status_code=get_chats.get("code"),
-        content=ResponseModel(
+        content=ResponseModel.model_construct(
             success=get_chats.get("success"),
             message=get_chats.get("message"),
             data=get_chats.get("data"),
-        ).model_dump())
+        ))
 
-@router.get("/get_chat_history/{chat_id}")
+@router.get("/get_chat_history/{chat_id}", response_model=ResponseModel[ChatHistoryData])
 async def get_chat_history(
         chat_id: str,
+        limit: int | None = Query(default=None, ge=1, le=1000),
+        before: int | None = Query(default=None, ge=0),
+        after: int | None = Query(default=None, ge=0),
+        since: str | None = None,
+        if_none_match: str | None = Header(default=None),
+        if_modified_since: str | None = Header(default=None),
         api_key: str = Depends(get_api_key)
-) -> JSONResponse:
+) -> Response:
     if not api_key:
         return JSONResponse(
             status_code=401,
             content={"success": False, "message": "Invalid API key", "data": {}})
-    chat_history: dict = await chat_service.get_chat_history(chat_id)
-    return JSONResponse(
+    chat_id_context.set(chat_id)
+    chat_history: dict = await chat_service.get_chat_history(
+        chat_id, limit, before, after, since, if_none_match, if_modified_since)
+    if chat_history.get("code") == 304:
+        return Response(status_code=304, headers=chat_history.get("headers"))
+    return ModelResponse(
         status_code=chat_history.get("code"),
-        content=ResponseModel(
+        headers=chat_history.get("headers"),
+        content=ResponseModel.model_construct(
             success=chat_history.get("success"),
             message=chat_history.get("message"),
             data=chat_history.get("data"),
-        ).model_dump())
+        ))
 
-@router.delete("/delete_chat_thread/{chat_id}")
+@router.delete("/delete_chat_thread/{chat_id}", response_model=ResponseModel[dict])
 async def delete_chat_thread(
         chat_id: str,
         api_key: str = Depends(get_api_key)
-) -> JSONResponse:
+) -> Response:
     if not api_key:
         return JSONResponse(
             status_code=401,
             content={"success": False, "message": "Invalid API key", "data": {}})
+    chat_id_context.set(chat_id)
     delete_thread: dict = await chat_service.delete_chat_thread(chat_id)
-    return JSONResponse(
+    return ModelResponse(
         status_code=delete_thread.get("code"),
-        content=ResponseModel(
+        content=ResponseModel.model_construct(
             success=delete_thread.get("success"),
             message=delete_thread.get("message"),
             data=delete_thread.get("data"),
-        ).model_dump()
-)
+        ))
 
-@router.patch("/update_chat_name/{chat_id}/{new_chat_name}")
+@router.patch("/update_chat_name/{chat_id}/{new_chat_name}", response_model=ResponseModel[dict])
 async def update_chat_name(
         chat_id: str,
         new_chat_name: str,
         api_key: str = Depends(get_api_key)
-) -> JSONResponse:
+) -> Response:
     if not api_key:
         return JSONResponse(
             status_code=401,
             content={"success": False, "message": "Invalid API key", "data": {}})
+    chat_id_context.set(chat_id)
     update_thread: dict = await chat_service.update_chat_name(chat_id, new_chat_name)
-    return JSONResponse(
+    return ModelResponse(
         status_code=update_thread.get("code"),
-        content=ResponseModel(
+        content=ResponseModel.model_construct(
             success=update_thread.get("success"),
             message=update_thread.get("message"),
             data=update_thread.get("data"),
-        ).model_dump()
-)
+        ))
+
+
+def _event_stream(generation: dict) -> StreamingResponse:
+    generation_id: str = generation.get("data").get("generation_id")
+
+    async def generate():
+        # Every stored event carries "<stream id>:<index>" as its id, the client sends the last one back on reconnect.
+        async for index, event in chat_service.follow_generation(generation_id, generation.get("data").get("start")):
+            yield format_sse_event(event, f"{generation_id}:{index}" if index is not None else None)
+
+    # NOTE: Disable proxy buffering so every chunk reaches the client immediately.
+    headers: dict = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Stream-ID": generation_id}
+    if generation.get("data").get("replayed"):
+        headers["Idempotent-Replayed"] = "true"
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers=headers
+    )
 
 
 @router.post("/send_message")
 async def send_message(
         message_data: SendMessageData,
+        idempotency_key: str | None = Header(default=None, min_length=1, max_length=255),
+        last_event_id: str | None = Header(default=None, max_length=100),
         api_key: str = Depends(get_api_key)
 ):
     if not api_key:
@@ -131,30 +168,41 @@ async def send_message(
             status_code=401,
             content={
                 "success": False, "message": "Invalid API key", "data": {}})
-
-    chat_thread: dict = await chat_service.get_one_chat(message_data.chat_id)
-    if not chat_thread.get("success"):
+    chat_id_context.set(message_data.chat_id)
+
+    if last_event_id is not None:
+        # A reconnect, the answer continues after the last event the client got without generating again.
+        generation: dict = await chat_service.resume_generation(last_event_id, chat_id=message_data.chat_id)
+    else:
+        chat_thread: dict = await chat_service.get_one_chat(message_data.chat_id)
+        if not chat_thread.get("success"):
+            return JSONResponse(
+                status_code=404,
+                content={"success": False, "message": chat_thread.get("message"), "data": {}})
+        # A retry with the same Idempotency-Key replays the answer, or follows it while it is still generated.
+        generation = await chat_service.start_generation(
+            chat_thread.get("data").get("thread"), message_data.message, idempotency_key)
+    if not generation.get("success"):
         return JSONResponse(
-            status_code=404,
-            content={"success": False, "message": chat_thread.get("message"), "data": {}})
-
-    response: str = await chat_service.send_message(message_data.message, chat_thread.get("data").get("thread"))
-
-    async def generate():
-        # Send chat_id first
-        yield f"data: {{'chat_id': '{message_data.chat_id}'}}\n\n"
+            status_code=generation.get("code"),
+            content={"success": False, "message": generation.get("message"), "data": {}})
+    return _event_stream(generation)
 
-        # Split response into words and send in chunks of 3
-        words = response.split()
-        for i in range(0, len(words), 3):
-            chunk = " ".join(words[i:i + 3])
-            yield f"data: {{'chunk': '{chunk}'}}\n\n"
-            await asyncio.sleep(0.1)  # Small delay between chunks
 
-        # Send done message
-        yield f"data: {{'done': true}}\n\n"
-
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream"
-    )
\ No newline at end of file
+@router.get("/resume_stream/{stream_id}")
+async def resume_stream(
+        stream_id: str,
+        last_event_id: str | None = Header(default=None, max_length=100),
+        api_key: str = Depends(get_api_key)
+):
+    if not api_key:
+        return JSONResponse(
+            status_code=401,
+            content={"success": False, "message": "Invalid API key", "data": {}})
+    # EventSource reconnects to the same URL with Last-Event-ID, without it the stream starts over.
+    generation: dict = await chat_service.resume_generation(last_event_id, generation_id=stream_id)
+    if not generation.get("success"):
+        return JSONResponse(
+            status_code=generation.get("code"),
+            content={"success": False, "message": generation.get("message"), "data": {}})
+    return _event_stream(generation)
@@ -0,0 +1,84 @@
+"""
+Production entry point. Serves the app with WEB_CONCURRENCY uvicorn
+worker processes, or one per CPU available to the process when unset.
+Several workers need THREAD_CACHE_URL, so they share the thread cache
+and the generation store, without it a single worker is started.
+
+Workers are started as fresh interpreters that import the app
+themselves. The app opens its MongoDB, Firebase and LLM clients on
+first use and restarts its log thread after a fork, so it can also be
+imported before forking (e.g. gunicorn --preload).
+
+On SIGTERM a worker stops accepting connections and waits up to
+GRACEFUL_SHUTDOWN_TIMEOUT seconds for the requests in flight, streamed
+answers included, before it shuts down. With several workers SIGHUP
+restarts them one at a time, each draining the same way, SIGTTIN and
+SIGTTOU add and remove a worker. Those signals are handled by the
+uvicorn supervisor, a single worker runs without one and does not
+handle them, SIGHUP then stops it without draining.
+
+Run with: python server.py
+"""
+import math
+import os
+
+import uvicorn
+from dotenv import load_dotenv
+
+from util.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+
+def _cgroup_cpu_limit() -> float | None:
+    # cgroup v2 quota of a container, e.g. "200000 100000" for two CPUs or "max 100000" for none.
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as file:
+            quota, period = file.read().split()
+    except (OSError, ValueError):
+        return None
+    return None if quota == "max" else int(quota) / int(period)
+
+
+def shared_backends() -> bool:
+    # The thread cache and the generation store, the generation store falls back to THREAD_CACHE_URL.
+    return bool(os.getenv("THREAD_CACHE_URL"))
+
+
+def worker_count() -> int:
+    # NOTE: Without Redis every worker keeps its own thread cache and
+    #       generation store. A retry or a resumed stream that reaches
+    #       another worker would not find its answer, so the app then runs
+    #       a single worker. WEB_CONCURRENCY is set by platforms like
+    #       Heroku on their own, it is capped with a warning instead of
+    #       failing the deploy.
+    if not shared_backends():
+        if int(os.getenv("WEB_CONCURRENCY") or "1") > 1:
+            logger.warning("WEB_CONCURRENCY is %s but THREAD_CACHE_URL is not set, starting a single worker",
+                           os.getenv("WEB_CONCURRENCY"))
+        return 1
+    if os.getenv("WEB_CONCURRENCY"):
+        return max(1, int(os.getenv("WEB_CONCURRENCY")))
+    # NOTE: os.cpu_count() is the CPUs of the host, a container may only be allowed some of them.
+    cpus: int = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    limit: float | None = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+def main():
+    uvicorn.run(
+        "app:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=worker_count(),
+        # Below the 30 seconds a platform like Heroku waits before it kills the process.
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "25"))
+    )
+
+
+if __name__ == "__main__":
+    main()
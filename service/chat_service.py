@@ -1,43 +1,168 @@
+import asyncio
 import datetime
+import hashlib
 import os
+import re
 import traceback
 import sys
+import time
 import uuid
+from typing import AsyncIterator
 
+from base.llm_provider_base import LLMProviderBase
+from cache.generation_store import GenerationStore
+from cache.thread_cache import ThreadCache
 from db.model.chat_thread_model import ChatThreadModel
+from db.model.chat_thread_meta_model import ChatThreadMetaModel
+from db.model.history_page_model import HistoryPageModel
 from db.model.message_model import MessageModel
 from repository.context_repository import ContextRepository
+from repository.split_context_repository import SplitContextRepository
+from service.provider_router import ProviderRouter
+from service.summary_worker import SummaryWorker
+from exception.chat_thread_conflict_error import ChatThreadConflictError
+from util.context_builder import ContextBuilder, ContextWindow
+from util.http_cache import is_not_modified, make_etag, make_last_modified
+from util.keyed_lock import KeyedLock
 from util.logger import get_logger
+from util.metrics import metrics
+from util.timing import record_span, span
+from provider.model.conversation_message_model import ConversationMessageModel
+from provider.model.conversation_model import ConversationModel
+from provider.model.usage_model import UsageModel
 from util.prompt_generator import PromptGenerator
+from response_models.chat_history_data import ChatHistoryData
+from response_models.chat_list_data import ChatListData
 
-from starlette.concurrency import run_in_threadpool
-from google import genai
-from openai import AsyncOpenAI
+TURN_ERRORS = metrics.counter(
+    "chat_turn_errors_total", "Chat turns that failed, by reason.", ("reason",))
+IDEMPOTENT_REQUESTS = metrics.counter(
+    "idempotent_requests_total", "send_message requests with an Idempotency-Key, by result.", ("result",))
+STREAM_RESUMES = metrics.counter(
+    "stream_resumes_total", "Reconnects to an answer stream by Last-Event-ID, by result.", ("result",))
+GENERATIONS_ABANDONED = metrics.counter(
+    "generations_abandoned_total", "Answers cancelled because no client followed them any more.")
+
+# "<generation id>:<index of the event>", see format_sse_event.
+LAST_EVENT_ID_PATTERN: re.Pattern = re.compile(r"([0-9a-f]{32,64}):(\d{1,9})")
+GENERATION_ID_PATTERN: re.Pattern = re.compile(r"[0-9a-f]{32,64}")
+
+
+def _create_providers() -> list[LLMProviderBase]:
+    # Imported here, google.genai and openai are most of the import time of the app.
+    from provider.gemini_provider import GeminiProvider
+    from provider.openai_provider import OpenAIProvider
+    return [GeminiProvider(), OpenAIProvider()]
 
 
 class ChatService:
     def __init__(self):
         self._logger = get_logger(__name__)
         self._prompt_generator = PromptGenerator()
+        self._context_builder = ContextBuilder()
 
         try:
-            self._gemini_client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-            self._openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            self._context_repository = ContextRepository()
+            # The providers and their SDKs are built by start(), or by the first generation.
+            self._provider_router = ProviderRouter(_create_providers)
+            # "split" keeps every message in its own document, see SplitContextRepository.
+            self._context_repository = SplitContextRepository() \
+                if os.getenv("CHAT_STORAGE_LAYOUT", "embedded").lower() == "split" else ContextRepository()
+            self._thread_cache = ThreadCache()
+            self._generation_store = GenerationStore()
+            self._generations: set[asyncio.Task] = set()
+            # A follower gives up on a generation that sent nothing for this long.
+            self._stall_timeout: float = float(os.getenv("GENERATION_STALL_TIMEOUT", "90"))
+            # An answer without an Idempotency-Key is cancelled when no client followed it for this long.
+            self._abandon_timeout: float = float(os.getenv("GENERATION_ABANDON_TIMEOUT", "15"))
+            # stop() runs after the server drained its connections for up to GRACEFUL_SHUTDOWN_TIMEOUT,
+            # the generations left get this much longer before they are cancelled.
+            self._shutdown_timeout: float = float(os.getenv("GENERATION_SHUTDOWN_TIMEOUT", "5"))
+            self._chat_locks = KeyedLock()
+            self._provider_loading: asyncio.Task | None = None
+            self._summary_worker = SummaryWorker(self._context_repository, self._provider_router, self._thread_cache)
         except Exception as e:
             self._logger.error(f"Error initializing RagService: {e}")
 
-    async def _update_chat_thread(
+    async def start(self) -> None:
+        # NOTE: Called by the lifespan of the app before the first request.
+        #       The LLM SDKs are imported in a thread in the background, the
+        #       worker already serves everything else meanwhile and the first
+        #       generations wait for them. The database setup opens the
+        #       first connection of the shared client, which then fills its
+        #       pool up to MONGO_MIN_POOL_SIZE.
+        self._provider_loading = asyncio.create_task(self._load_providers())
+        try:
+            await self._context_repository._ensure_db_setup()
+        except Exception as e:
+            # Serving without it beats a crash loop, /health reports the database.
+            self._logger.error(f"Database setup failed: {e}")
+
+    async def _load_providers(self) -> None:
+        try:
+            await self._provider_router.ensure_loaded()
+        except Exception as e:
+            self._logger.error(f"Failed to create the LLM providers: {e}")
+
+    async def stop(self) -> None:
+        if self._provider_loading is not None:
+            await self._provider_loading
+        # Generations with an Idempotency-Key still finish and are stored when their
+        # client went away, the others are cancelled after GENERATION_ABANDON_TIMEOUT.
+        # Whatever still runs after GENERATION_SHUTDOWN_TIMEOUT is cancelled, so the
+        # worker stops before the platform kills it halfway through a write.
+        if self._generations:
+            _, pending = await asyncio.wait(set(self._generations), timeout=self._shutdown_timeout)
+            if pending:
+                self._logger.warning("Cancelling %d generations still running at shutdown", len(pending))
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        await self._summary_worker.stop()
+
+    async def _get_chat_thread(
             self,
-            chat_thread: ChatThreadModel
-    ) -> bool:
-        is_updated: bool
+            chat_id: str
+    ) -> ChatThreadModel | None:
+        chat_thread: ChatThreadModel | None = await self._thread_cache.get(chat_id)
+        if chat_thread is None:
+            chat_thread = await self._context_repository.get_one_by_id(chat_id)
+            if chat_thread is not None:
+                await self._thread_cache.set(chat_thread)
+        return chat_thread
 
-        chat_thread.updated_at = datetime.datetime.now().isoformat()
-        self._logger.info(f"Updating chat thread: {chat_thread.chat_id}")
-        is_updated = await self._context_repository.update_one(chat_thread)
+    async def _get_current_chat_thread(
+            self,
+            chat_id: str
+    ) -> ChatThreadModel | None:
+        # NOTE: A cached copy misses the turns other workers wrote since it
+        #       was cached. Its version is checked against the database with
+        #       one small read before the turn calls the LLM, so a stale copy
+        #       is reloaded instead of failing the version check after a full
+        #       generation.
+        chat_thread: ChatThreadModel | None = await self._get_chat_thread(chat_id)
+        version: int | None = await self._context_repository.get_version_by_id(chat_id)
+        if chat_thread is None or version is None or chat_thread.version == version:
+            return chat_thread
+        self._logger.info("Cached chat thread %s is at version %d, database at %d, reloading",
+                          chat_id, chat_thread.version, version)
+        await self._thread_cache.delete(chat_id)
+        return await self._get_chat_thread(chat_id)
+
+    async def get_message_count(
+            self,
+            chat_id: str
+    ) -> int | None:
+        history_page: HistoryPageModel | None = await self._context_repository.get_history_page_by_id(chat_id, limit=1)
+        return history_page.total if history_page else None
+
+    def get_cache_stats(self) -> dict:
+        return self._thread_cache.stats()
+
+    def get_provider_stats(self) -> dict:
+        return self._provider_router.stats()
 
-        return is_updated
+    def get_generation_stats(self) -> dict:
+        return self._generation_store.stats()
 
     async def get_one_chat(
             self,
@@ -45,7 +170,7 @@ class ChatService:
     ) -> dict:
         result: dict = {"code": 0, "success": False, "message": "", "data": {}}
         # Retrieve the chat thread by ID
-        chat_thread: ChatThreadModel = await self._context_repository.get_one_by_id(chat_id)
+        chat_thread: ChatThreadModel = await self._get_chat_thread(chat_id)
         if chat_thread is None:
             self._logger.error(f"Failed to retrieve chat thread: {chat_id}")
             result.update({"code": 404, "success": False, "message": "Chat not found."})
@@ -71,54 +196,90 @@ class ChatService:
             history=[]
         )
         # Save the new chat thread to the database
-        is_inserted: bool = await self._context_repository.insert_one(new_chat_thread)
+        try:
+            is_inserted: bool = await self._context_repository.insert_one(new_chat_thread)
+        except Exception as e:
+            self._logger.error(f"Error inserting chat thread for user: {user_uid}, error: {e}")
+            is_inserted = False
         if not is_inserted:
             self._logger.error(f"Failed to create chat thread for user: {user_uid}")
             result.update({"code": 500, "success": False, "message": "Something went wrong creating chat."})
+            return result
+        # NOTE: Cached only once stored, a thread the database does not have must not be served.
+        await self._thread_cache.set(new_chat_thread)
         result.update({"code": 200, "success": True, "message": "Chat thread created successfully.",
-                       "data": new_chat_thread.model_dump()})
+                       "data": new_chat_thread})
         return result
 
     async def get_all_chats(
             self,
-            user_uid: str
+            user_uid: str,
+            limit: int | None = None,
+            cursor: str | None = None
     ) -> dict:
         result: dict = {"code": 0, "success": False, "message": "", "data": {}}
-        # Retrieve all chat threads for the user
-        chat_threads: list[ChatThreadModel] = await self._context_repository.get_all_by_uid(user_uid)
+        # Retrieve a page of chat threads for the user, without their history
+        try:
+            chat_threads: tuple[list[ChatThreadMetaModel], str | None] | None = \
+                await self._context_repository.get_thread_list_by_uid(user_uid, limit, cursor)
+        except ValueError as e:
+            self._logger.error(f"Invalid cursor for user: {user_uid}, error: {e}")
+            result.update({"code": 400, "success": False, "message": "Invalid cursor."})
+            return result
+
         if chat_threads is None:
             self._logger.error(f"Failed to retrieve chat threads for user: {user_uid}")
             result.update({"code": 500, "success": False, "message": "Something went wrong retrieving chats."})
         else:
-            refined_results: list = []
-            if len(chat_threads) != 0:
-                for i in chat_threads:
-                    _: dict = i.model_dump()
-                    _.pop("history")
-                    refined_results.append(_)
-
+            threads, next_cursor = chat_threads
             result.update({"code": 200, "success": True, "message": "Chat threads retrieved successfully.",
-                           "data": {"threads": [chat_thread for chat_thread in refined_results]}})
+                           "data": ChatListData.model_construct(threads=threads, next_cursor=next_cursor)})
         return result
 
     async def get_chat_history(
             self,
-            chat_id: str
+            chat_id: str,
+            limit: int | None = None,
+            before: int | None = None,
+            after: int | None = None,
+            since: str | None = None,
+            if_none_match: str | None = None,
+            if_modified_since: str | None = None
     ) -> dict:
-        result: dict = {"code": 0, "success": False, "message": "", "data": {}}
-        chat_results: list[MessageModel] = await self._context_repository.get_history_by_id(chat_id)
-        if chat_results is None:
+        result: dict = {"code": 0, "success": False, "message": "", "data": {}, "headers": {}}
+        if sum(cursor is not None for cursor in (before, after, since)) > 1:
+            result.update({"code": 400, "success": False, "message": "Only one of before, after or since can be used."})
+            return result
+
+        # Validate the cache headers against the thread metadata before touching the history
+        chat_meta: ChatThreadMetaModel | None = await self._context_repository.get_meta_by_id(chat_id)
+        if chat_meta is None:
+            self._logger.error(f"Failed to retrieve chat thread: {chat_id}")
+            result.update({"code": 404, "success": False, "message": "Chat not found."})
+            return result
+        etag: str = make_etag(chat_id, chat_meta.updated_at)
+        result.update({"headers": {"ETag": etag, "Last-Modified": make_last_modified(chat_meta.updated_at)}})
+        if is_not_modified(etag, chat_meta.updated_at, if_none_match, if_modified_since):
+            result.update({"code": 304, "success": True, "message": "Chat history not modified."})
+            return result
+
+        history_page: HistoryPageModel | None = await self._context_repository.get_history_page_by_id(
+            chat_id, limit, before, after, since)
+        if history_page is None:
             self._logger.error(f"Failed to retrieve chat history for chat: {chat_id}")
-            result.update({"code": 500, "success": False, "message": "Something went wrong retrieving chat history."})
+            result.update({"code": 500, "success": False, "message": "Something went wrong retrieving chat history.",
+                           "headers": {}})
             return result
-        else:
-            refined_results: list = []
-            if len(chat_results) != 0:
-                for i in chat_results:
-                    _: dict = i.model_dump()
-                    refined_results.append(_)
-            result.update({"code": 200, "success": True, "message": "Chat history retrieved successfully.",
-                           "data": {"history": [message for message in refined_results]}})
+
+        # The thread may have changed between the two reads, the headers must describe the returned page.
+        result.update({"headers": {"ETag": make_etag(chat_id, history_page.updated_at),
+                                   "Last-Modified": make_last_modified(history_page.updated_at)}})
+        # NOTE: The messages were validated when they were read, they are
+        #       neither validated nor copied again until they are serialized.
+        result.update({"code": 200, "success": True, "message": "Chat history retrieved successfully.",
+                       "data": ChatHistoryData.model_construct(history=history_page.history,
+                                                               first_seq=history_page.first_seq,
+                                                               total=history_page.total)})
         return result
 
     async def delete_chat_thread(
@@ -128,6 +289,7 @@ class ChatService:
         result: dict = {"code": 0, "success": False, "message": "", "data": {}}
         # Delete the chat thread from the database
         is_deleted: bool = await self._context_repository.delete_one_by_id(chat_id)
+        await self._thread_cache.delete(chat_id)
         if not is_deleted:
             self._logger.error(f"Failed to delete chat thread: {chat_id}")
             result.update({"code": 500, "success": False, "message": "Something went wrong deleting chat."})
@@ -141,96 +303,314 @@ class ChatService:
             chat_name: str
     ) -> dict:
         result: dict = {"code": 0, "success": False, "message": "", "data": {}}
-        # Retrieve the chat thread
-        chat_thread: ChatThreadModel = await self._context_repository.get_one_by_id(chat_id)
-        if chat_thread is None:
+        updated_at: str = datetime.datetime.now().isoformat()
+        # Only the name and timestamp are written, the history is never loaded.
+        is_updated: bool | None = await self._context_repository.update_chat_name(chat_id, chat_name, updated_at)
+        if is_updated is False:
             self._logger.error(f"Failed to retrieve chat thread: {chat_id}")
             result.update({"code": 500, "success": False, "message": "Something went wrong retrieving chat."})
             return result
-        # Update the chat name
-        chat_thread.chat_name = chat_name
-        is_updated: bool = await self._update_chat_thread(chat_thread)
-        if not is_updated:
+        if is_updated is None:
             self._logger.error(f"Failed to update chat name for chat: {chat_id}")
+            await self._thread_cache.delete(chat_id)
             result.update({"code": 500, "success": False, "message": "Something went wrong updating chat name."})
-        else:
-            result.update({"code": 200, "success": True, "message": "Chat name updated successfully."})
+            return result
+
+        # Patch a cached copy in place instead of dropping it with its history.
+        chat_thread: ChatThreadModel | None = await self._thread_cache.get(chat_id)
+        if chat_thread is not None:
+            chat_thread.chat_name = chat_name
+            chat_thread.updated_at = updated_at
+            await self._thread_cache.set(chat_thread)
+        result.update({"code": 200, "success": True, "message": "Chat name updated successfully."})
         return result
 
-    async def _try_openai_fallback(self, contents: list) -> str:
-        """Fallback method to use OpenAI when Gemini fails"""
+    async def stream_message(
+            self,
+            query: str,
+            chat_thread: ChatThreadModel
+    ) -> AsyncIterator[str]:
+        # NOTE: Turns of the same thread are serialized within this
+        #       process. A turn of another worker that runs at the same
+        #       time is caught by the version check and raises
+        #       ChatThreadConflictError.
+        lock_started: float = time.perf_counter()
+        async with self._chat_locks.acquire(chat_thread.chat_id):
+            record_span("turn.lock_wait", time.perf_counter() - lock_started)
+            # The thread may have changed while waiting for the previous turn, here or in another worker.
+            chat_thread = await self._get_current_chat_thread(chat_thread.chat_id) or chat_thread
+            async for delta in self._stream_turn(query, chat_thread):
+                yield delta
+
+    async def _push_turn_messages(
+            self,
+            chat_thread: ChatThreadModel,
+            messages: list[MessageModel]
+    ) -> bool:
+        # NOTE: The push only applies if the history is still at the
+        #       version this turn was built from, otherwise the turn is
+        #       rejected as a whole instead of interleaving with another.
+        chat_thread.updated_at = datetime.datetime.now().isoformat()
         try:
-            # Convert the contents to OpenAI message format
-            messages = []
-            for content in contents[:-1]:  # Exclude the last prompt
-                parts = content.split('\n', 1)
-                if len(parts) == 2:
-                    role = parts[0].replace('role: ', '')
-                    content = parts[1].replace('content: ', '')
-                    # Map 'ai' role to 'assistant' for OpenAI
-                    role = 'assistant' if role == 'ai' else role
-                    messages.append({"role": role, "content": content})
-
-            # Add the system prompt
-            messages.append({"role": "system", "content": contents[-1]})
-
-            response = await self._openai_client.chat.completions.create(
-                model="gpt-4.1",  # You can adjust the model as needed
-                messages=messages
+            is_updated: bool = await self._context_repository.push_messages(
+                chat_thread.chat_id,
+                messages,
+                chat_thread.updated_at,
+                expected_version=chat_thread.version
             )
-            return response.choices[0].message.content
+        except ChatThreadConflictError:
+            TURN_ERRORS.inc(reason="conflict")
+            await self._thread_cache.delete(chat_thread.chat_id)
+            raise
+        if not is_updated:
+            TURN_ERRORS.inc(reason="persist")
+            self._logger.error(f"Failed to persist messages for chat: {chat_thread.chat_id}")
+            await self._thread_cache.delete(chat_thread.chat_id)
+            return False
 
-        except Exception as e:
-            self._logger.error(f"Error in OpenAI fallback: {e}")
-            return "I am unable to generate a response at this time."
+        chat_thread.version += 1
+        return True
 
-    async def send_message(
+    async def _stream_turn(
             self,
             query: str,
             chat_thread: ChatThreadModel
-    ) -> str:
-        # Create a new message model and append it to the chat thread
+    ) -> AsyncIterator[str]:
+        # Create a new message model for the user query
         message_model: MessageModel = MessageModel(
             created_at=datetime.datetime.now().isoformat(),
             role="user",
             content=query.encode("utf-8", errors="replace").decode("utf-8")
         )
         chat_thread.history.append(message_model)
-        chat_thread.updated_at = datetime.datetime.now().isoformat()
 
-        prompt: str = self._prompt_generator.generate_main_prompt(user_query=query)
-        response_text: str = ""
+        system_prompt: str = self._prompt_generator.generate_system_prompt()
+        usage: UsageModel = UsageModel()
+        chunks: list[str] = []
 
         try:
-            contents: list = [f"role: {msg.role}\ncontent: {msg.content}" for msg in chat_thread.history[-400:]]
-            contents.append(prompt)
-
-            try:
-                # Try Gemini first
-                response = self._gemini_client.models.generate_content(
-                    model="gemini-2.0-flash",
-                    contents=contents
+            with span("turn.context"):
+                # Messages before summary_upto are represented by the rolling summary.
+                context: ContextWindow = self._context_builder.build(
+                    chat_thread.history[chat_thread.summary_upto:], system_prompt, chat_thread.summary)
+                conversation: ConversationModel = ConversationModel(
+                    chat_id=chat_thread.chat_id,
+                    first_seq=len(chat_thread.history) - context.message_count,
+                    system=system_prompt,
+                    context=self._prompt_generator.generate_summary_context(context.summary) if context.summary else "",
+                    messages=[ConversationMessageModel(role="assistant" if msg.role == "ai" else "user", content=msg.content)
+                              for msg in context.messages]
                 )
-                response_text = response.text
+            # NOTE: Logged with arguments, the message is only formatted by the log listener thread.
+            self._logger.info("Built context, messages: %d, tokens: %d, truncated: %s",
+                              context.message_count, context.total_tokens, context.truncated)
 
-            except Exception as gemini_error:
-                # Log Gemini error and try OpenAI
-                self._logger.warning(f"Gemini API error, falling back to OpenAI: {gemini_error}")
-                response_text = await self._try_openai_fallback(contents)
+            # The router picks the provider and falls back or hedges as needed.
+            # NOTE: llm.stream also includes the time the client takes to read the answer.
+            llm_started: float = time.perf_counter()
+            async for delta in self._provider_router.stream(conversation, usage):
+                if not chunks:
+                    record_span("llm.first_token", time.perf_counter() - llm_started)
+                chunks.append(delta)
+                yield delta
+            record_span("llm.stream", time.perf_counter() - llm_started)
+            self._logger.info("Usage, provider: %s, input tokens: %d (%d cached, %d uncached), output tokens: %d",
+                              usage.provider, usage.input_tokens, usage.cached_input_tokens,
+                              usage.input_tokens - usage.cached_input_tokens, usage.output_tokens)
 
         except Exception as e:
+            TURN_ERRORS.inc(reason="generation")
             self._logger.error(f"Error generating response: {e}")
-            return "I am unable to generate a response at this time."
+            if not chunks:
+                # NOTE: The placeholder is only shown, not stored. It would end up in
+                #       every later prompt and summary of the thread.
+                chat_thread.history.pop()
+                yield "I am unable to generate a response at this time."
+                return
 
-        # Add the AI response to chat history
-        chat_thread.history.append(MessageModel(
+        # Add the AI response to chat history once the stream is complete
+        response_text: str = "".join(chunks)
+        ai_message_model: MessageModel = MessageModel(
             created_at=datetime.datetime.now().isoformat(),
             role="ai",
             content=response_text.encode("utf-8", errors="replace").decode("utf-8")
-        ))
+        )
+        chat_thread.history.append(ai_message_model)
+
+        # Only append the new turn instead of rewriting the whole thread.
+        if not await self._push_turn_messages(chat_thread, [message_model, ai_message_model]):
+            return
+
+        await self._thread_cache.set(chat_thread)
+        if self._summary_worker.should_summarize(chat_thread):
+            self._summary_worker.schedule(chat_thread.chat_id)
+
+    async def send_message(
+            self,
+            query: str,
+            chat_thread: ChatThreadModel
+    ) -> str:
+        chunks: list[str] = [delta async for delta in self.stream_message(query, chat_thread)]
+        return "".join(chunks)
+
+    async def stream_events(
+            self,
+            query: str,
+            chat_thread: ChatThreadModel
+    ) -> AsyncIterator[dict]:
+        # The events of the send_message stream: chat_id, the answer chunks, an error if any and done.
+        yield {"chat_id": chat_thread.chat_id}
+        try:
+            async for chunk in self.stream_message(query, chat_thread):
+                yield {"chunk": chunk}
+        except ChatThreadConflictError as e:
+            self._logger.warning(f"Conflicting send_message on chat: {chat_thread.chat_id}")
+            yield {"error": str(e), "retryable": True}
+        yield {"done": True}
+
+    async def start_generation(
+            self,
+            chat_thread: ChatThreadModel,
+            query: str,
+            idempotency_key: str | None = None
+    ) -> dict:
+        result: dict = {"code": 0, "success": False, "message": "", "data": {}}
+        # NOTE: Every answer is stored for a while so a dropped stream can be
+        #       resumed. Keys are scoped to the chat, the same key on another
+        #       chat is another request.
+        generation_id: str = uuid.uuid4().hex if idempotency_key is None else \
+            hashlib.sha256(f"{chat_thread.chat_id}:{idempotency_key}".encode("utf-8")).hexdigest()
+        fingerprint: str = hashlib.sha256(query.encode("utf-8")).hexdigest()
+        for _ in range(2):
+            if await self._generation_store.create(generation_id, fingerprint):
+                if idempotency_key is not None:
+                    IDEMPOTENT_REQUESTS.inc(result="started")
+                task: asyncio.Task = asyncio.create_task(self._run_generation(generation_id, query, chat_thread))
+                self._track(task)
+                if idempotency_key is None:
+                    # NOTE: Only a client sending an Idempotency-Key asked for its answer
+                    #       to be completed without it, the others are cancelled like a
+                    #       plain request once they disconnected and did not reconnect.
+                    self._track(asyncio.create_task(self._cancel_when_abandoned(generation_id, task)))
+                result.update({"code": 200, "success": True, "message": "Generation started.",
+                               "data": {"generation_id": generation_id, "start": 0, "replayed": False}})
+                return result
+
+            stored_fingerprint: str | None = await self._generation_store.get_fingerprint(generation_id)
+            if stored_fingerprint is None:
+                # Expired right after the create, try once more.
+                continue
+            if stored_fingerprint != fingerprint:
+                IDEMPOTENT_REQUESTS.inc(result="mismatch")
+                result.update({"code": 422, "success": False,
+                               "message": "Idempotency-Key was already used with a different message."})
+                return result
+            # A failed generation is not replayed, the retry generates again.
+            stored: tuple[list[dict], bool] | None = await self._generation_store.read(generation_id)
+            if stored is not None and stored[1] and any("error" in event for event in stored[0]):
+                await self._generation_store.delete(generation_id)
+                continue
+            IDEMPOTENT_REQUESTS.inc(result="replayed")
+            self._logger.info("Replaying generation %s for chat: %s", generation_id, chat_thread.chat_id)
+            result.update({"code": 200, "success": True, "message": "Generation replayed.",
+                           "data": {"generation_id": generation_id, "start": 0, "replayed": True}})
+            return result
+
+        result.update({"code": 503, "success": False, "message": "Generation store unavailable, try again."})
+        return result
 
-        is_updated: bool = await self._context_repository.update_one(chat_thread)
-        return response_text
+    def _track(self, task: asyncio.Task) -> None:
+        self._generations.add(task)
+        task.add_done_callback(self._generations.discard)
+
+    async def _run_generation(
+            self,
+            generation_id: str,
+            query: str,
+            chat_thread: ChatThreadModel
+    ) -> None:
+        # NOTE: Runs apart from the request, a client that disconnects does
+        #       not cancel the turn at once and its retry or reconnect follows it.
+        try:
+            async for event in self.stream_events(query, chat_thread):
+                await self._generation_store.append(generation_id, event)
+        except asyncio.CancelledError:
+            # Abandoned, the turn is not stored. A late reconnect gets this error.
+            await self._generation_store.append(
+                generation_id, {"error": "The answer was cancelled.", "retryable": True})
+            await self._generation_store.append(generation_id, {"done": True})
+            raise
+        except Exception as e:
+            self._logger.error(f"Generation {generation_id} failed: {e}")
+            await self._generation_store.append(
+                generation_id, {"error": "Something went wrong generating the answer.", "retryable": True})
+            await self._generation_store.append(generation_id, {"done": True})
+        finally:
+            await self._generation_store.finish(generation_id)
+
+    async def _cancel_when_abandoned(
+            self,
+            generation_id: str,
+            task: asyncio.Task
+    ) -> None:
+        # Cancels the generation, and with it its LLM stream, once no client
+        # followed it for GENERATION_ABANDON_TIMEOUT seconds.
+        while not task.done():
+            idle: float = await self._generation_store.idle_time(generation_id)
+            if idle >= self._abandon_timeout:
+                GENERATIONS_ABANDONED.inc()
+                self._logger.info("Cancelling generation %s, no client followed it", generation_id)
+                task.cancel()
+                return
+            await asyncio.wait({task}, timeout=self._abandon_timeout - idle)
+
+    async def resume_generation(
+            self,
+            last_event_id: str | None,
+            generation_id: str | None = None,
+            chat_id: str | None = None
+    ) -> dict:
+        result: dict = {"code": 0, "success": False, "message": "", "data": {}}
+        # Continues after the last event the client got, or from the start without one.
+        start: int = 0
+        if last_event_id is not None:
+            match: re.Match | None = LAST_EVENT_ID_PATTERN.fullmatch(last_event_id)
+            if match is None or generation_id not in (None, match.group(1)):
+                result.update({"code": 400, "success": False, "message": "Invalid Last-Event-ID."})
+                return result
+            generation_id, start = match.group(1), int(match.group(2)) + 1
+        elif generation_id is None or GENERATION_ID_PATTERN.fullmatch(generation_id) is None:
+            result.update({"code": 404, "success": False, "message": "Stream not found or expired."})
+            return result
+
+        # The first event of every generation names its chat.
+        stored: tuple[list[dict], bool] | None = await self._generation_store.read(generation_id)
+        if stored is None or not stored[0] or (chat_id is not None and stored[0][0].get("chat_id") != chat_id):
+            STREAM_RESUMES.inc(result="expired")
+            result.update({"code": 404, "success": False, "message": "Stream not found or expired."})
+            return result
+        STREAM_RESUMES.inc(result="resumed")
+        self._logger.info("Resuming generation %s at event %d", generation_id, start)
+        result.update({"code": 200, "success": True, "message": "Generation resumed.",
+                       "data": {"generation_id": generation_id, "start": start, "replayed": True}})
+        return result
+
+    async def follow_generation(
+            self,
+            generation_id: str,
+            start: int = 0
+    ) -> AsyncIterator[tuple[int | None, dict]]:
+        # Yields the stored events with their index, which makes up their event id.
+        finished: bool = False
+        index: int = start
+        async for event in self._generation_store.follow(generation_id, start, self._stall_timeout):
+            finished = finished or "done" in event
+            yield index, event
+            index += 1
+        if not finished:
+            # Expired, or its worker stopped before finishing it. Not stored, so these have no id.
+            yield None, {"error": "The answer is no longer being generated.", "retryable": True}
+            yield None, {"done": True}
 
 
 chat_service = ChatService()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import math
+import time
+from collections import deque
+
+
+class ProviderHealth:
+    """
+    Rolling latency and error statistics of one provider, with a
+    circuit breaker that stops routing to it while it is failing.
+    """
+    CLOSED: str = "closed"
+    OPEN: str = "open"
+    HALF_OPEN: str = "half_open"
+
+    def __init__(
+            self,
+            window: int,
+            error_rate_threshold: float,
+            min_requests: int,
+            cooldown: float
+    ):
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._error_rate_threshold: float = error_rate_threshold
+        self._min_requests: int = min_requests
+        self._cooldown: float = cooldown
+        self._open_until: float = 0.0
+        self._probing: bool = False
+        self.state: str = self.CLOSED
+
+    @property
+    def error_rate(self) -> float:
+        return self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0
+
+    def latency_percentile(
+            self,
+            percentile: float,
+            min_samples: int = 1
+    ) -> float | None:
+        if len(self._latencies) < max(1, min_samples):
+            return None
+        ordered: list[float] = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(percentile / 100 * len(ordered)) - 1)]
+
+    def is_available(self) -> bool:
+        # Like allow_request, without taking the probe of a half open breaker.
+        if self.state == self.OPEN:
+            return time.monotonic() >= self._open_until
+        return self.state == self.CLOSED or not self._probing
+
+    def allow_request(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() >= self._open_until:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        # A half open breaker lets a single probe request through.
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self, latency: float | None = None) -> None:
+        if latency is not None:
+            self._latencies.append(latency)
+        self._outcomes.append(True)
+        if self.state == self.HALF_OPEN:
+            self.state = self.CLOSED
+            self._outcomes.clear()
+
+    def record_failure(self) -> None:
+        self._outcomes.append(False)
+        if self.state == self.HALF_OPEN or (
+                len(self._outcomes) >= self._min_requests and self.error_rate >= self._error_rate_threshold):
+            self.state = self.OPEN
+            self._open_until = time.monotonic() + self._cooldown
+            self._probing = False
+
+    def record_cancelled(self) -> None:
+        # A cancelled probe proved nothing, the next request may probe again.
+        if self.state == self.HALF_OPEN:
+            self._probing = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "requests": len(self._outcomes),
+            "error_rate": round(self.error_rate, 4),
+            "p50_latency": self.latency_percentile(50),
+            "p95_latency": self.latency_percentile(95)
+        }
@@ -0,0 +1,302 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import AsyncIterator, Callable
+
+from dotenv import load_dotenv
+
+from base.llm_provider_base import LLMProviderBase
+from provider.model.conversation_model import ConversationModel
+from provider.model.usage_model import UsageModel
+from service.provider_health import ProviderHealth
+from util.logger import get_logger
+from util.metrics import metrics
+
+load_dotenv()
+
+_END = object()
+
+LLM_REQUESTS = metrics.counter(
+    "llm_requests_total", "Provider attempts by outcome: success, failure or cancelled.", ("provider", "outcome"))
+LLM_FALLBACKS = metrics.counter(
+    "llm_fallbacks_total", "Failed provider attempts that moved the request to the next provider.", ("provider",))
+LLM_HEDGES = metrics.counter(
+    "llm_hedges_total", "Hedged attempts started because the primary was slow, by hedge provider.", ("provider",))
+LLM_FIRST_TOKEN = metrics.histogram(
+    "llm_first_token_seconds", "Time to the first streamed token of the winning attempt.", ("provider",))
+LLM_TOKENS = metrics.counter(
+    "llm_tokens_total", "Tokens reported by the providers, input excludes cached input.", ("provider", "kind"))
+
+
+class _StreamAttempt:
+    """
+    Runs one provider stream in its own task and buffers its deltas,
+    so several attempts can race for the first token.
+    """
+    def __init__(
+            self,
+            provider: LLMProviderBase,
+            conversation: ConversationModel
+    ):
+        self.provider: LLMProviderBase = provider
+        self.started: float = time.monotonic()
+        self.first_token: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.usage: UsageModel = UsageModel()
+        self.task: asyncio.Task = asyncio.create_task(self._pump(conversation))
+
+    async def _pump(self, conversation: ConversationModel) -> None:
+        try:
+            async for delta in self.provider.stream(conversation, self.usage):
+                if not self.first_token.done():
+                    self.first_token.set_result(time.monotonic() - self.started)
+                self.queue.put_nowait(delta)
+            if not self.first_token.done():
+                self.first_token.set_result(time.monotonic() - self.started)
+            self.queue.put_nowait(_END)
+        except Exception as e:
+            if not self.first_token.done():
+                self.first_token.set_exception(e)
+            else:
+                self.queue.put_nowait(e)
+
+
+class ProviderRouter:
+    """
+    Picks the provider of every generation from configured weights,
+    skips providers whose circuit breaker is open, falls back to the
+    next one on failure and can hedge a slow stream with a second one.
+
+    The providers can be given as a factory, they are then only built,
+    together with their SDKs, in a worker thread by load() or the first
+    generation.
+    """
+    def __init__(
+            self,
+            providers: list[LLMProviderBase] | Callable[[], list[LLMProviderBase]],
+            weights: dict[str, float] | None = None,
+            hedging: bool | None = None
+    ):
+        self._logger = get_logger(__name__)
+        self._provider_factory: Callable[[], list[LLMProviderBase]] | None = \
+            providers if callable(providers) else None
+        self._load_lock: threading.Lock = threading.Lock()
+        self._providers: list[LLMProviderBase] = [] if callable(providers) else providers
+        self._health: dict[str, ProviderHealth] = {}
+        self._weights: dict[str, float] = weights if weights is not None else self._parse_weights(
+            os.getenv("LLM_PROVIDER_WEIGHTS", ""))
+        self._hedging: bool = hedging if hedging is not None else os.getenv("LLM_HEDGING", "false").lower() == "true"
+        # Hedge once the primary is slower than this percentile of its own first token latency.
+        self._hedge_percentile: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        self._hedge_min_samples: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+        if self._provider_factory is None:
+            self._health = self._create_health(self._providers)
+
+    @staticmethod
+    def _create_health(providers: list[LLMProviderBase]) -> dict[str, ProviderHealth]:
+        return {
+            provider.name: ProviderHealth(
+                window=int(os.getenv("LLM_STATS_WINDOW", "100")),
+                error_rate_threshold=float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5")),
+                min_requests=int(os.getenv("LLM_BREAKER_MIN_REQUESTS", "10")),
+                cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+            ) for provider in providers
+        }
+
+    async def ensure_loaded(self) -> None:
+        # Generations wait for the providers without blocking the event loop.
+        if self._provider_factory is not None:
+            await asyncio.to_thread(self.load)
+
+    def load(self) -> None:
+        with self._load_lock:
+            if self._provider_factory is None:
+                return
+            providers: list[LLMProviderBase] = self._provider_factory()
+            self._health = self._create_health(providers)
+            self._providers = providers
+            self._provider_factory = None
+
+    @staticmethod
+    def _parse_weights(value: str) -> dict[str, float]:
+        # Format: "gemini:1,openai:0.2"
+        weights: dict[str, float] = {}
+        for item in value.split(","):
+            if ":" in item:
+                name, weight = item.split(":", 1)
+                weights[name.strip()] = float(weight)
+        return weights
+
+    def _candidates(self) -> tuple[list[LLMProviderBase], bool]:
+        # Without configured weights the first provider is the primary and the others are fallbacks.
+        weights: list[float] = [self._weights.get(provider.name, 1.0 if i == 0 else 0.0)
+                                for i, provider in enumerate(self._providers)]
+        ordered: list[LLMProviderBase] = [provider for _, provider in sorted(
+            zip(weights, self._providers), key=lambda item: item[0], reverse=True)]
+        if sum(weights) > 0:
+            primary: LLMProviderBase = random.choices(self._providers, weights=weights)[0]
+            ordered.remove(primary)
+            ordered.insert(0, primary)
+
+        # With every breaker open it is still better to try them all than to fail outright.
+        forced: bool = not any(self._health[provider.name].is_available() for provider in ordered)
+        return ordered, forced
+
+    def _next_candidate(
+            self,
+            candidates: list[LLMProviderBase],
+            forced: bool
+    ) -> LLMProviderBase | None:
+        # NOTE: Only the provider about to be attempted asks its breaker.
+        #       A half open breaker hands its single probe to every
+        #       allow_request, asking for fallbacks that are never tried
+        #       would keep the probe taken for good.
+        while candidates:
+            provider: LLMProviderBase = candidates.pop(0)
+            if forced or self._health[provider.name].allow_request():
+                return provider
+        return None
+
+    def _hedge_delay(self, provider: LLMProviderBase) -> float | None:
+        if not self._hedging:
+            return None
+        return self._health[provider.name].latency_percentile(self._hedge_percentile, self._hedge_min_samples)
+
+    @staticmethod
+    def _copy_usage(
+            source: UsageModel,
+            target: UsageModel | None
+    ) -> None:
+        if source.provider is not None:
+            LLM_TOKENS.inc(source.input_tokens - source.cached_input_tokens, provider=source.provider, kind="input")
+            LLM_TOKENS.inc(source.cached_input_tokens, provider=source.provider, kind="cached_input")
+            LLM_TOKENS.inc(source.output_tokens, provider=source.provider, kind="output")
+        if target is not None:
+            for field, value in source:
+                setattr(target, field, value)
+
+    async def generate(
+            self,
+            conversation: ConversationModel,
+            usage: UsageModel | None = None
+    ) -> str:
+        await self.ensure_loaded()
+        last_error: Exception | None = None
+        candidates, forced = self._candidates()
+        while True:
+            provider: LLMProviderBase | None = self._next_candidate(candidates, forced)
+            if provider is None:
+                break
+            started: float = time.monotonic()
+            # Every attempt counts its own usage, only the successful one is reported.
+            attempt_usage: UsageModel = UsageModel()
+            try:
+                response: str = await provider.generate(conversation, attempt_usage)
+            except asyncio.CancelledError:
+                self._health[provider.name].record_cancelled()
+                LLM_REQUESTS.inc(provider=provider.name, outcome="cancelled")
+                raise
+            except Exception as e:
+                self._health[provider.name].record_failure()
+                LLM_REQUESTS.inc(provider=provider.name, outcome="failure")
+                LLM_FALLBACKS.inc(provider=provider.name)
+                self._logger.warning(f"{provider.name} generation failed, trying the next provider: {e}")
+                last_error = e
+                continue
+            self._health[provider.name].record_success(time.monotonic() - started)
+            LLM_REQUESTS.inc(provider=provider.name, outcome="success")
+            self._copy_usage(attempt_usage, usage)
+            return response
+        raise last_error or RuntimeError("No LLM provider is configured.")
+
+    async def stream(
+            self,
+            conversation: ConversationModel,
+            usage: UsageModel | None = None
+    ) -> AsyncIterator[str]:
+        await self.ensure_loaded()
+        candidates, forced = self._candidates()
+        attempts: list[_StreamAttempt] = []
+        winner: _StreamAttempt | None = None
+        last_error: Exception | None = None
+        try:
+            while winner is None:
+                if not attempts:
+                    provider: LLMProviderBase | None = self._next_candidate(candidates, forced)
+                    if provider is None:
+                        raise last_error or RuntimeError("No LLM provider is configured.")
+                    attempts.append(_StreamAttempt(provider, conversation))
+
+                hedge_delay: float | None = self._hedge_delay(attempts[0].provider) \
+                    if len(attempts) == 1 and candidates else None
+                done, _ = await asyncio.wait([attempt.first_token for attempt in attempts],
+                                             timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Without a hedge that its breaker lets through, the primary is simply awaited.
+                    hedge: LLMProviderBase | None = self._next_candidate(candidates, forced)
+                    if hedge is not None:
+                        self._logger.info(f"{attempts[0].provider.name} is slower than its "
+                                          f"p{self._hedge_percentile:g} ({hedge_delay:.2f}s), hedging with {hedge.name}")
+                        LLM_HEDGES.inc(provider=hedge.name)
+                        attempts.append(_StreamAttempt(hedge, conversation))
+                    continue
+
+                for attempt in [attempt for attempt in attempts if attempt.first_token in done]:
+                    if attempt.first_token.exception() is None:
+                        winner = attempt
+                        break
+                    self._health[attempt.provider.name].record_failure()
+                    LLM_REQUESTS.inc(provider=attempt.provider.name, outcome="failure")
+                    LLM_FALLBACKS.inc(provider=attempt.provider.name)
+                    last_error = attempt.first_token.exception()
+                    self._logger.warning(f"{attempt.provider.name} API error, falling back: {last_error}")
+                    attempts.remove(attempt)
+
+            self._health[winner.provider.name].record_success(winner.first_token.result())
+            LLM_FIRST_TOKEN.observe(winner.first_token.result(), provider=winner.provider.name)
+            for attempt in attempts:
+                if attempt is not winner:
+                    self._cancel_attempt(attempt)
+            attempts = [winner]
+
+            while True:
+                delta = await winner.queue.get()
+                if delta is _END:
+                    LLM_REQUESTS.inc(provider=winner.provider.name, outcome="success")
+                    self._copy_usage(winner.usage, usage)
+                    break
+                if isinstance(delta, Exception):
+                    # The answer was already partly sent, it can not be restarted elsewhere.
+                    self._health[winner.provider.name].record_failure()
+                    LLM_REQUESTS.inc(provider=winner.provider.name, outcome="failure")
+                    raise delta
+                yield delta
+        finally:
+            for attempt in attempts:
+                if attempt is winner:
+                    attempt.task.cancel()
+                else:
+                    self._cancel_attempt(attempt)
+
+    def _cancel_attempt(self, attempt: _StreamAttempt) -> None:
+        attempt.task.cancel()
+        if attempt.first_token.done():
+            # Marks a late failure as retrieved, it is irrelevant once another attempt won.
+            attempt.first_token.exception()
+        else:
+            attempt.first_token.cancel()
+        self._health[attempt.provider.name].record_cancelled()
+        LLM_REQUESTS.inc(provider=attempt.provider.name, outcome="cancelled")
+
+    def stats(self) -> dict:
+        if self._provider_factory is not None:
+            return {}
+        return {
+            provider.name: {
+                "weight": self._weights.get(provider.name),
+                "in_flight": provider.in_flight,
+                **self._health[provider.name].stats()
+            } for provider in self._providers
+        }
@@ -0,0 +1,118 @@
+import asyncio
+import contextvars
+import os
+
+from dotenv import load_dotenv
+
+from cache.thread_cache import ThreadCache
+from db.model.chat_thread_model import ChatThreadModel
+from provider.model.conversation_model import ConversationModel
+from repository.context_repository import ContextRepository
+from service.provider_router import ProviderRouter
+from util.logger import chat_id_context, get_logger
+from util.prompt_generator import PromptGenerator
+
+load_dotenv()
+
+
+class SummaryWorker:
+    """
+    Keeps ChatThreadModel.summary up to date off the request path.
+    Threads are queued after a turn, picked up in batches and
+    summarized with a bounded number of concurrent LLM calls.
+    """
+    def __init__(
+            self,
+            context_repository: ContextRepository,
+            provider_router: ProviderRouter,
+            thread_cache: ThreadCache
+    ):
+        self._logger = get_logger(__name__)
+        self._context_repository: ContextRepository = context_repository
+        self._provider_router: ProviderRouter = provider_router
+        self._thread_cache: ThreadCache = thread_cache
+        # Summarize once this many messages are outside the live window.
+        self._every_messages: int = int(os.getenv("SUMMARY_EVERY_MESSAGES", "20"))
+        # Most recent messages that are always sent verbatim, never summarized.
+        self._keep_recent: int = int(os.getenv("SUMMARY_KEEP_RECENT", "40"))
+        # Bounds the prompt of one run, longer backlogs are caught up over several runs.
+        self._max_messages_per_run: int = int(os.getenv("SUMMARY_MAX_MESSAGES_PER_RUN", "200"))
+        self._batch_size: int = int(os.getenv("SUMMARY_BATCH_SIZE", "8"))
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(int(os.getenv("SUMMARY_MAX_CONCURRENCY", "2")))
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._pending: set[str] = set()
+        self._task: asyncio.Task | None = None
+
+    def should_summarize(
+            self,
+            chat_thread: ChatThreadModel
+    ) -> bool:
+        return len(chat_thread.history) - self._keep_recent - chat_thread.summary_upto >= self._every_messages
+
+    def schedule(
+            self,
+            chat_id: str
+    ) -> None:
+        if chat_id in self._pending:
+            return
+        self._pending.add(chat_id)
+        self._queue.put_nowait(chat_id)
+        if self._task is None or self._task.done():
+            # A fresh context, the worker outlives the request that happened to start it.
+            self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            batch: list[str] = [await self._queue.get()]
+            while len(batch) < self._batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await asyncio.gather(*[self._summarize_guarded(chat_id) for chat_id in batch])
+
+    async def _summarize_guarded(
+            self,
+            chat_id: str
+    ) -> None:
+        async with self._semaphore:
+            # Removed before the work starts, turns that arrive meanwhile schedule a new run.
+            self._pending.discard(chat_id)
+            chat_id_context.set(chat_id)
+            try:
+                await self._summarize(chat_id)
+            except Exception as e:
+                self._logger.error(f"Failed to summarize chat: {chat_id}, error: {e}")
+
+    async def _summarize(
+            self,
+            chat_id: str
+    ) -> None:
+        chat_thread: ChatThreadModel | None = await self._context_repository.get_one_by_id(chat_id)
+        if chat_thread is None or not self.should_summarize(chat_thread):
+            return
+
+        summary_upto: int = min(len(chat_thread.history) - self._keep_recent,
+                                chat_thread.summary_upto + self._max_messages_per_run)
+        prompt: str = PromptGenerator.generate_summary_prompt(
+            chat_thread.summary,
+            [f"{msg.role}: {msg.content}" for msg in chat_thread.history[chat_thread.summary_upto:summary_upto]]
+        )
+        summary: str = await self._provider_router.generate(ConversationModel(instruction=prompt))
+
+        is_updated: bool = await self._context_repository.update_summary(
+            chat_id, summary.strip(), summary_upto, chat_thread.summary_upto)
+        self._logger.info(f"Summarized chat: {chat_id} up to message {summary_upto}, updated: {is_updated}")
+
+        # Catch up on threads that had a longer backlog than one run covers.
+        if is_updated:
+            await self._thread_cache.delete(chat_id)
+            chat_thread.summary_upto = summary_upto
+            if self.should_summarize(chat_thread):
+                self.schedule(chat_id)
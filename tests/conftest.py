@@ -0,0 +1,37 @@
+import asyncio
+import datetime
+import os
+from typing import Callable
+
+import pytest
+
+# The provider clients are only built on first use, they just need a value.
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("API_KEY", "default-dev-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from benchmark.memory_context_repository import MemoryContextRepository
+from db.model.chat_thread_model import ChatThreadModel
+from db.model.message_model import MessageModel
+
+
+@pytest.fixture
+def seeded_repository() -> Callable[..., MemoryContextRepository]:
+    # Creates an in-memory repository holding one thread with the given number
+    # of alternating user and ai messages.
+    def create(
+            chat_id: str,
+            messages: int = 0,
+            latency: float = 0.0
+    ) -> MemoryContextRepository:
+        repository: MemoryContextRepository = MemoryContextRepository(latency=latency)
+        now: str = datetime.datetime.now().isoformat()
+        asyncio.run(repository.insert_one(ChatThreadModel(
+            user_uid="test-user", chat_name="test", chat_id=chat_id, created_at=now, updated_at=now,
+            history=[MessageModel(created_at=now, role="user" if i % 2 == 0 else "ai", content=f"message {i}")
+                     for i in range(messages)]
+        )))
+        return repository
+
+    return create
@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+import pytest
+
+from benchmark.fake_providers import FakeProvider
+from benchmark.harness import wire_chat_service
+from benchmark.memory_context_repository import MemoryContextRepository
+from db.model.chat_thread_model import ChatThreadModel
+from service.chat_service import ChatService
+
+CHAT_ID: str = "service-test"
+
+
+def test_failed_generation_is_not_stored(seeded_repository):
+    repository: MemoryContextRepository = seeded_repository(CHAT_ID, messages=2)
+    provider: FakeProvider = FakeProvider(name="gemini", latency=0.0, failure_rate=1.0)
+    service: ChatService = wire_chat_service(repository, [provider], ChatService())
+
+    async def run() -> tuple[list[dict], ChatThreadModel]:
+        chat_thread: ChatThreadModel = (await service.get_one_chat(CHAT_ID))["data"]["thread"]
+        events: list[dict] = [event async for event in service.stream_events("hello", chat_thread)]
+        await service.stop()
+        # Read through the service, so its cached copy is checked as well.
+        return events, (await service.get_one_chat(CHAT_ID))["data"]["thread"]
+
+    events, cached = asyncio.run(run())
+    assert events[1:] == [{"chunk": "I am unable to generate a response at this time."}, {"done": True}]
+    assert [message.content for message in cached.history] == ["message 0", "message 1"]
+    assert [message.content for message in asyncio.run(repository.get_one_by_id(CHAT_ID)).history] == \
+        ["message 0", "message 1"]
+
+
+def test_stop_cancels_generations_after_the_shutdown_timeout(seeded_repository, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("GENERATION_SHUTDOWN_TIMEOUT", "0.1")
+    repository: MemoryContextRepository = seeded_repository(CHAT_ID)
+    # 10 seconds of answer, kept running by its Idempotency-Key without a client.
+    provider: FakeProvider = FakeProvider(name="gemini", latency=0.0, tokens=1000, tokens_per_second=100)
+    service: ChatService = wire_chat_service(repository, [provider], ChatService())
+
+    async def run() -> tuple[float, list[dict]]:
+        chat_thread: ChatThreadModel = (await service.get_one_chat(CHAT_ID))["data"]["thread"]
+        generation_id: str = (await service.start_generation(chat_thread, "hello", "key"))["data"]["generation_id"]
+        started: float = time.perf_counter()
+        await service.stop()
+        stopped: float = time.perf_counter() - started
+        return stopped, [event async for _, event in service.follow_generation(generation_id)]
+
+    stopped, events = asyncio.run(run())
+    assert stopped < 1.0
+    assert events[-2:] == [{"error": "The answer was cancelled.", "retryable": True}, {"done": True}]
+    assert asyncio.run(repository.get_one_by_id(CHAT_ID)).history == []
@@ -0,0 +1,76 @@
+import asyncio
+
+from benchmark.harness import fake_providers, wire_chat_service
+from benchmark.memory_context_repository import MemoryContextRepository
+from db.model.chat_thread_model import ChatThreadModel
+from db.model.message_model import MessageModel
+from service.chat_service import ChatService
+
+CHAT_ID: str = "concurrency-test"
+
+
+def _service(repository: MemoryContextRepository) -> ChatService:
+    # One service per simulated worker, each with its own thread cache and chat locks.
+    return wire_chat_service(repository, fake_providers(latency=0.005, tokens=5), ChatService())
+
+
+async def _send(
+        service: ChatService,
+        query: str
+) -> bool:
+    # True if the turn was stored, False if it ended with the retryable conflict error.
+    chat_thread: ChatThreadModel = (await service.get_one_chat(CHAT_ID))["data"]["thread"]
+    events: list[dict] = [event async for event in service.stream_events(query, chat_thread)]
+    return not any("error" in event for event in events)
+
+
+def _stored_thread(repository: MemoryContextRepository) -> ChatThreadModel:
+    return asyncio.run(repository.get_one_by_id(CHAT_ID))
+
+
+def test_parallel_sends_keep_every_message(seeded_repository):
+    repository: MemoryContextRepository = seeded_repository(CHAT_ID, latency=0.001)
+    service: ChatService = _service(repository)
+
+    async def run() -> list[bool]:
+        return await asyncio.gather(*[_send(service, f"message {i}") for i in range(20)])
+
+    assert all(asyncio.run(run()))
+    stored: ChatThreadModel = _stored_thread(repository)
+    history: list[MessageModel] = stored.history
+    assert len(history) == 40
+    assert [message.role for message in history] == ["user", "ai"] * 20
+    assert sorted(message.content for message in history[::2]) == sorted(f"message {i}" for i in range(20))
+    assert stored.version == 20
+
+
+def test_sequential_sends_across_workers_never_conflict(seeded_repository):
+    repository: MemoryContextRepository = seeded_repository(CHAT_ID, latency=0.001)
+    services: list[ChatService] = [_service(repository), _service(repository)]
+
+    async def run() -> list[bool]:
+        # Both workers cache the thread first, then take turns writing to it.
+        for service in services:
+            await service.get_one_chat(CHAT_ID)
+        return [await _send(services[i % 2], f"message {i}") for i in range(6)]
+
+    assert all(asyncio.run(run()))
+    assert [message.content for message in _stored_thread(repository).history[::2]] == \
+        [f"message {i}" for i in range(6)]
+
+
+def test_parallel_sends_across_workers_lose_no_message(seeded_repository):
+    repository: MemoryContextRepository = seeded_repository(CHAT_ID, latency=0.001)
+    services: list[ChatService] = [_service(repository), _service(repository)]
+
+    async def run() -> list[bool]:
+        return await asyncio.gather(*[_send(services[i % 2], f"message {i}") for i in range(20)])
+
+    stored: list[bool] = asyncio.run(run())
+    history: list[MessageModel] = _stored_thread(repository).history
+    # Turns of different workers may conflict, but a turn is either stored whole or reported, never lost.
+    assert any(stored)
+    assert len(history) == 2 * sum(stored)
+    assert [message.role for message in history] == ["user", "ai"] * sum(stored)
+    assert sorted(message.content for message in history[::2]) == \
+        sorted(f"message {i}" for i, ok in enumerate(stored) if ok)
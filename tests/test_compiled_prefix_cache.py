@@ -0,0 +1,45 @@
+from provider.compiled_prefix_cache import CompiledPrefixCache
+from provider.model.conversation_message_model import ConversationMessageModel
+
+
+class CountingCompiler:
+    # Compiles a message to a dict and counts how often it was called.
+    def __init__(self):
+        self.calls: int = 0
+
+    def __call__(self, message: ConversationMessageModel) -> dict:
+        self.calls += 1
+        return {"role": message.role, "content": message.content}
+
+
+def _messages(*contents: str) -> list[ConversationMessageModel]:
+    return [ConversationMessageModel(role="user" if i % 2 == 0 else "assistant", content=content)
+            for i, content in enumerate(contents)]
+
+
+def test_next_turn_compiles_only_the_new_messages():
+    cache: CompiledPrefixCache = CompiledPrefixCache()
+    compiler: CountingCompiler = CountingCompiler()
+    cache.compile("chat", 0, _messages("q1"), compiler)
+    compiled: list[dict] = cache.compile("chat", 0, _messages("q1", "a1", "q2"), compiler)
+    assert [message["content"] for message in compiled] == ["q1", "a1", "q2"]
+    assert compiler.calls == 3
+
+
+def test_turn_that_was_not_stored_is_not_reused():
+    # The first question was sent but its turn never stored, the next one takes its position.
+    cache: CompiledPrefixCache = CompiledPrefixCache()
+    compiler: CountingCompiler = CountingCompiler()
+    cache.compile("chat", 0, _messages("q1", "a1", "FIRST QUESTION"), compiler)
+    compiled: list[dict] = cache.compile("chat", 0, _messages("q1", "a1", "SECOND QUESTION"), compiler)
+    assert [message["content"] for message in compiled] == ["q1", "a1", "SECOND QUESTION"]
+    assert compiler.calls == 4
+
+
+def test_slid_window_reuses_the_overlap():
+    cache: CompiledPrefixCache = CompiledPrefixCache()
+    compiler: CountingCompiler = CountingCompiler()
+    cache.compile("chat", 0, _messages("q1", "a1", "q2", "a2", "q3"), compiler)
+    compiled: list[dict] = cache.compile("chat", 2, _messages("q2", "a2", "q3", "a3", "q4"), compiler)
+    assert [message["content"] for message in compiled] == ["q2", "a2", "q3", "a3", "q4"]
+    assert compiler.calls == 7
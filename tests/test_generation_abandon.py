@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from benchmark.fake_providers import FakeProvider
+from benchmark.harness import wire_chat_service
+from benchmark.memory_context_repository import MemoryContextRepository
+from db.model.chat_thread_model import ChatThreadModel
+from service.chat_service import ChatService
+
+CHAT_ID: str = "abandon-test"
+
+
+@pytest.fixture(autouse=True)
+def abandon_timeout(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("GENERATION_ABANDON_TIMEOUT", "0.1")
+
+
+def _service(
+        repository: MemoryContextRepository,
+        tokens: int
+) -> ChatService:
+    # 100 tokens a second, so tokens / 100 seconds per answer.
+    provider: FakeProvider = FakeProvider(name="gemini", latency=0.0, tokens=tokens, tokens_per_second=100)
+    return wire_chat_service(repository, [provider], ChatService())
+
+
+async def _start(
+        service: ChatService,
+        idempotency_key: str | None = None
+) -> str:
+    chat_thread: ChatThreadModel = (await service.get_one_chat(CHAT_ID))["data"]["thread"]
+    result: dict = await service.start_generation(chat_thread, "hello", idempotency_key)
+    return result["data"]["generation_id"]
+
+
+async def _events(
+        service: ChatService,
+        generation_id: str
+) -> list[dict]:
+    return [event async for _, event in service.follow_generation(generation_id)]
+
+
+def _history_length(repository: MemoryContextRepository) -> int:
+    return len(asyncio.run(repository.get_one_by_id(CHAT_ID)).history)
+
+
+def test_unfollowed_generation_is_cancelled(seeded_repository):
+    repository: MemoryContextRepository = seeded_repository(CHAT_ID)
+    service: ChatService = _service(repository, tokens=500)
+
+    async def run() -> list[dict]:
+        generation_id: str = await _start(service)
+        await service.stop()
+        return await _events(service, generation_id)
+
+    events: list[dict] = asyncio.run(run())
+    assert events[-2:] == [{"error": "The answer was cancelled.", "retryable": True}, {"done": True}]
+    assert _history_length(repository) == 0
+
+
+def test_generation_with_idempotency_key_completes_unfollowed(seeded_repository):
+    repository: MemoryContextRepository = seeded_repository(CHAT_ID)
+    service: ChatService = _service(repository, tokens=30)
+
+    async def run() -> list[dict]:
+        generation_id: str = await _start(service, idempotency_key="key")
+        await service.stop()
+        return await _events(service, generation_id)
+
+    events: list[dict] = asyncio.run(run())
+    assert events[-1] == {"done": True} and not any("error" in event for event in events)
+    assert _history_length(repository) == 2
+
+
+def test_reconnect_within_the_timeout_keeps_the_generation(seeded_repository):
+    repository: MemoryContextRepository = seeded_repository(CHAT_ID)
+    service: ChatService = _service(repository, tokens=50)
+
+    async def run() -> list[dict]:
+        generation_id: str = await _start(service)
+        # Dropped right away, then resumed before the timeout ran out.
+        await asyncio.sleep(0.05)
+        events: list[dict] = await _events(service, generation_id)
+        await service.stop()
+        return events
+
+    events: list[dict] = asyncio.run(run())
+    assert events[-1] == {"done": True} and not any("error" in event for event in events)
+    assert _history_length(repository) == 2
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+import pytest
+
+from benchmark.fake_providers import FakeProvider
+from provider.model.conversation_model import ConversationModel
+from service.provider_router import ProviderRouter
+
+
+async def _stream(router: ProviderRouter) -> bool:
+    try:
+        return bool([delta async for delta in router.stream(ConversationModel(instruction="test"))])
+    except Exception:
+        return False
+
+
+def test_unused_fallback_keeps_its_probe(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("LLM_BREAKER_MIN_REQUESTS", "2")
+    monkeypatch.setenv("LLM_BREAKER_COOLDOWN", "0.05")
+    gemini: FakeProvider = FakeProvider(name="gemini", latency=0.0, tokens=2, tokens_per_second=1000)
+    openai: FakeProvider = FakeProvider(name="openai", latency=0.0, tokens=2, tokens_per_second=1000)
+    router: ProviderRouter = ProviderRouter([gemini, openai], weights={"gemini": 1.0, "openai": 0.0}, hedging=False)
+
+    async def run() -> list[bool]:
+        # Both providers fail until both breakers open, then recover.
+        gemini.failure_rate = openai.failure_rate = 1.0
+        assert not any([await _stream(router) for _ in range(2)])
+        assert router.stats()["gemini"]["state"] == router.stats()["openai"]["state"] == "open"
+        time.sleep(0.06)
+        gemini.failure_rate = openai.failure_rate = 0.0
+        # Gemini probes and closes, OpenAI is never attempted and must not hold on to its probe.
+        assert await _stream(router)
+        assert router.stats()["gemini"]["state"] == "closed"
+        openai_calls: int = openai.calls
+        gemini.failure_rate = 1.0
+        results: list[bool] = [await _stream(router) for _ in range(5)]
+        assert openai.calls > openai_calls
+        return results
+
+    assert all(asyncio.run(run()))
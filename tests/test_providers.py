@@ -0,0 +1,148 @@
+import asyncio
+import contextlib
+import time
+from types import SimpleNamespace
+from typing import AsyncIterator, Callable
+
+from provider.gemini_provider import GeminiProvider
+from provider.model.conversation_model import ConversationModel
+from provider.openai_provider import OpenAIProvider
+
+CONVERSATION: ConversationModel = ConversationModel(instruction="test")
+
+
+class FakeOpenAIStream:
+    # Stands in for openai.AsyncStream: chat completion chunks, closed by close() or the async with block.
+    def __init__(
+            self,
+            chunks: int,
+            delay: float
+    ):
+        self._chunks: int = chunks
+        self._delay: float = delay
+        self.closed: bool = False
+
+    async def __aenter__(self) -> "FakeOpenAIStream":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        self.closed = True
+
+    async def __aiter__(self) -> AsyncIterator[SimpleNamespace]:
+        for i in range(self._chunks):
+            await asyncio.sleep(self._delay)
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=f"token{i} "))])
+
+
+def _openai_provider(
+        streams: list[FakeOpenAIStream],
+        chunks: int = 5,
+        delay: float = 0.01
+) -> OpenAIProvider:
+    provider: OpenAIProvider = OpenAIProvider()
+
+    async def create(**kwargs) -> FakeOpenAIStream:
+        streams.append(FakeOpenAIStream(chunks, delay))
+        return streams[-1]
+
+    provider._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return provider
+
+
+def _gemini_provider(
+        closed: list[bool],
+        chunks: int = 5,
+        delay: float = 0.01
+) -> GeminiProvider:
+    provider: GeminiProvider = GeminiProvider()
+    generators: list[AsyncIterator[SimpleNamespace]] = []
+
+    async def generate_content_stream(**kwargs) -> AsyncIterator[SimpleNamespace]:
+        # The SDK returns an async generator, closing it runs its cleanup.
+        async def stream() -> AsyncIterator[SimpleNamespace]:
+            closed.append(False)
+            try:
+                for i in range(chunks):
+                    await asyncio.sleep(delay)
+                    yield SimpleNamespace(usage_metadata=None, text=f"token{i} ")
+            finally:
+                closed[-1] = True
+        # Referenced like the SDK's own response objects would be, so only an explicit close finalizes it.
+        generators.append(stream())
+        return generators[-1]
+
+    async def compile(conversation: ConversationModel) -> tuple[list, None]:
+        return [], None
+
+    provider._client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(
+        generate_content_stream=generate_content_stream)))
+    provider._compile = compile
+    return provider
+
+
+async def _cancel_after_first_delta(
+        provider: OpenAIProvider | GeminiProvider,
+        is_closed: Callable[[], bool]
+) -> bool:
+    # Checked right after the cancellation, the event loop finalizes forgotten generators on its own at shutdown.
+    first_delta: asyncio.Event = asyncio.Event()
+
+    async def consume() -> None:
+        async with contextlib.aclosing(provider.stream(CONVERSATION)) as stream:
+            async for _ in stream:
+                first_delta.set()
+                # A slow client, the cancellation lands between two chunks.
+                await asyncio.sleep(10)
+
+    task: asyncio.Task = asyncio.create_task(consume())
+    await first_delta.wait()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    return is_closed()
+
+
+def test_openai_stream_is_closed_on_cancel():
+    streams: list[FakeOpenAIStream] = []
+    provider: OpenAIProvider = _openai_provider(streams, chunks=100, delay=0.01)
+    assert asyncio.run(_cancel_after_first_delta(provider, lambda: streams[0].closed))
+    assert len(streams) == 1
+    assert provider.in_flight == 0
+
+
+def test_gemini_stream_is_closed_on_cancel():
+    closed: list[bool] = []
+    provider: GeminiProvider = _gemini_provider(closed, chunks=100, delay=0.01)
+    assert asyncio.run(_cancel_after_first_delta(provider, lambda: closed == [True]))
+    assert provider.in_flight == 0
+
+
+def test_streams_are_closed_when_read_to_the_end():
+    streams: list[FakeOpenAIStream] = []
+    closed: list[bool] = []
+
+    async def run() -> list[str]:
+        return ["".join([delta async for delta in provider.stream(CONVERSATION)])
+                for provider in (_openai_provider(streams), _gemini_provider(closed))]
+
+    assert asyncio.run(run()) == ["token0 token1 token2 token3 token4 "] * 2
+    assert streams[0].closed and closed == [True]
+
+
+def test_generations_in_flight_do_not_serialize():
+    streams: list[FakeOpenAIStream] = []
+    # Every generation takes 0.2 seconds, 20 of them serialized would take 4.
+    provider: OpenAIProvider = _openai_provider(streams, chunks=4, delay=0.05)
+
+    async def read() -> str:
+        return "".join([delta async for delta in provider.stream(CONVERSATION)])
+
+    async def run() -> float:
+        started: float = time.perf_counter()
+        await asyncio.gather(*[read() for _ in range(20)])
+        return time.perf_counter() - started
+
+    assert asyncio.run(run()) < 1.0
+    assert len(streams) == 20 and all(stream.closed for stream in streams)
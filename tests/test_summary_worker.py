@@ -0,0 +1,83 @@
+import asyncio
+
+from benchmark.fake_providers import FakeProvider
+from benchmark.harness import wire_chat_service
+from benchmark.memory_context_repository import MemoryContextRepository
+from cache.memory_thread_cache_backend import MemoryThreadCacheBackend
+from cache.thread_cache import ThreadCache
+from db.model.chat_thread_model import ChatThreadModel
+from provider.model.conversation_model import ConversationModel
+from provider.model.usage_model import UsageModel
+from service.chat_service import ChatService
+from service.provider_router import ProviderRouter
+from service.summary_worker import SummaryWorker
+
+CHAT_ID: str = "summary-test"
+# Past the default threshold: 70 messages, 40 kept verbatim, summarized once 20 are outside the window.
+MESSAGES: int = 70
+
+
+class FailingSummaryProvider(FakeProvider):
+    # Streams answers like FakeProvider, but every summary request fails.
+    summary_calls: int = 0
+
+    async def _generate(
+            self,
+            conversation: ConversationModel,
+            usage: UsageModel
+    ) -> str:
+        self.summary_calls += 1
+        raise RuntimeError("summary failed")
+
+
+async def _wait_for(condition, timeout: float = 5.0) -> None:
+    async with asyncio.timeout(timeout):
+        while not await condition():
+            await asyncio.sleep(0.01)
+
+
+def test_summary_is_persisted(seeded_repository):
+    repository: MemoryContextRepository = seeded_repository(CHAT_ID, messages=MESSAGES)
+    provider: FakeProvider = FakeProvider(name="fake", latency=0.0, tokens=3, tokens_per_second=1000)
+    worker: SummaryWorker = SummaryWorker(
+        repository, ProviderRouter([provider], hedging=False), ThreadCache(MemoryThreadCacheBackend(1024 * 1024, 60)))
+
+    async def summarized() -> bool:
+        return (await repository.get_one_by_id(CHAT_ID)).summary_upto > 0
+
+    async def run() -> None:
+        worker.schedule(CHAT_ID)
+        await _wait_for(summarized)
+        await worker.stop()
+
+    asyncio.run(run())
+    stored: ChatThreadModel = asyncio.run(repository.get_one_by_id(CHAT_ID))
+    assert stored.summary == "token0 token1 token2"
+    assert stored.summary_upto == MESSAGES - 40
+    assert provider.calls == 1
+
+
+def test_failed_summary_does_not_affect_the_turn(seeded_repository):
+    repository: MemoryContextRepository = seeded_repository(CHAT_ID, messages=MESSAGES)
+    provider: FailingSummaryProvider = FailingSummaryProvider(name="gemini", latency=0.0, tokens=3,
+                                                              tokens_per_second=1000)
+    service: ChatService = wire_chat_service(repository, [provider], ChatService())
+
+    async def summary_failed() -> bool:
+        return provider.summary_calls > 0
+
+    async def run() -> list[dict]:
+        chat_thread: ChatThreadModel = (await service.get_one_chat(CHAT_ID))["data"]["thread"]
+        events: list[dict] = [event async for event in service.stream_events("hello", chat_thread)]
+        # The turn scheduled a summary, which fails in the background.
+        await _wait_for(summary_failed)
+        await service.stop()
+        return events
+
+    events: list[dict] = asyncio.run(run())
+    assert "".join(event.get("chunk", "") for event in events) == "token0 token1 token2 "
+    assert events[-1] == {"done": True} and not any("error" in event for event in events)
+    stored: ChatThreadModel = asyncio.run(repository.get_one_by_id(CHAT_ID))
+    assert len(stored.history) == MESSAGES + 2
+    assert stored.history[-2].content == "hello"
+    assert stored.summary == "" and stored.summary_upto == 0
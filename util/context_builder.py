@@ -0,0 +1,73 @@
+import os
+
+from dotenv import load_dotenv
+from pydantic import BaseModel
+
+from db.model.message_model import MessageModel
+from util.token_counter import MESSAGE_OVERHEAD_TOKENS, count_tokens
+
+load_dotenv()
+
+
+class ContextWindow(BaseModel):
+    messages: list[MessageModel]
+    summary: str
+    message_count: int
+    history_tokens: int
+    summary_tokens: int
+    system_prompt_tokens: int
+    total_tokens: int
+    truncated: bool
+
+
+class ContextBuilder:
+    def __init__(
+            self,
+            token_budget: int | None = None,
+            max_messages: int | None = None,
+            window_step: int | None = None
+    ):
+        self._token_budget: int = token_budget or int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000"))
+        self._max_messages: int = max_messages or int(os.getenv("CONTEXT_MAX_MESSAGES", "400"))
+        # The first message of a truncated window only moves in steps of this many messages,
+        # so consecutive turns share the same prompt prefix for provider side caching.
+        self._window_step: int = window_step or int(os.getenv("CONTEXT_WINDOW_STEP", "10"))
+
+    def build(
+            self,
+            history: list[MessageModel],
+            system_prompt: str,
+            summary: str = ""
+    ) -> ContextWindow:
+        # The summary of older messages is reserved like the system prompt.
+        system_prompt_tokens: int = count_tokens(system_prompt)
+        summary_tokens: int = count_tokens(summary) + MESSAGE_OVERHEAD_TOKENS if summary else 0
+        remaining: int = self._token_budget - system_prompt_tokens - summary_tokens
+        history_tokens: int = 0
+        start: int = len(history)
+
+        # Walk from the most recent message backwards until the budget is spent.
+        # The latest message is always kept, it is the one being answered.
+        while start > 0 and len(history) - start < self._max_messages:
+            message_tokens: int = history[start - 1].token_count + MESSAGE_OVERHEAD_TOKENS
+            if message_tokens > remaining and start != len(history):
+                break
+            remaining -= message_tokens
+            history_tokens += message_tokens
+            start -= 1
+
+        if 0 < start and self._window_step > 1:
+            aligned: int = min(-(-start // self._window_step) * self._window_step, len(history) - 1)
+            history_tokens -= sum(message.token_count + MESSAGE_OVERHEAD_TOKENS for message in history[start:aligned])
+            start = aligned
+
+        return ContextWindow(
+            messages=history[start:],
+            summary=summary,
+            message_count=len(history) - start,
+            history_tokens=history_tokens,
+            summary_tokens=summary_tokens,
+            system_prompt_tokens=system_prompt_tokens,
+            total_tokens=history_tokens + summary_tokens + system_prompt_tokens,
+            truncated=start > 0
+        )
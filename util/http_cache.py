@@ -0,0 +1,47 @@
+import datetime
+import hashlib
+from email.utils import format_datetime, parsedate_to_datetime
+
+
+def make_etag(
+        chat_id: str,
+        updated_at: str
+) -> str:
+    return f'W/"{hashlib.sha1(f"{chat_id}:{updated_at}".encode("utf-8")).hexdigest()[:20]}"'
+
+
+def _to_utc(updated_at: str) -> datetime.datetime:
+    # NOTE: Timestamps are stored as naive isoformat strings written on
+    #       the server, which runs in UTC.
+    value: datetime.datetime = datetime.datetime.fromisoformat(updated_at)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+
+def make_last_modified(updated_at: str) -> str:
+    return format_datetime(_to_utc(updated_at), usegmt=True)
+
+
+def is_not_modified(
+        etag: str,
+        updated_at: str,
+        if_none_match: str | None,
+        if_modified_since: str | None
+) -> bool:
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110).
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        # If-None-Match uses the weak comparison, so W/ prefixes are ignored.
+        return etag.removeprefix("W/") in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if if_modified_since:
+        try:
+            since: datetime.datetime = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=datetime.timezone.utc)
+        # Last-Modified only has second precision.
+        return _to_utc(updated_at).replace(microsecond=0) <= since
+    return False
@@ -1,34 +1,182 @@
+import atexit
+import datetime
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from contextvars import ContextVar
+from typing import TextIO
+
+from dotenv import load_dotenv
+
+from util.metrics import metrics
+
+load_dotenv()
+
+LOG_RECORDS_DROPPED = metrics.counter(
+    "log_records_dropped_total", "Log records dropped because the log queue was full.")
+
+# Attached to every record logged while they are set, see RequestContextMiddleware.
+request_id_context: ContextVar[str | None] = ContextVar("request_id", default=None)
+chat_id_context: ContextVar[str | None] = ContextVar("chat_id", default=None)
+
+COLORS: dict[str, str] = {
+    'DEBUG': '\033[94m',  # Blue
+    'INFO': '\033[92m',  # Green
+    'WARNING': '\033[93m',  # Yellow
+    'ERROR': '\033[91m',  # Red
+    'CRITICAL': '\033[1;91m',  # Bold Red
+}
+RESET: str = '\033[0m'
+
+
+def _capped(message: str, max_chars: int) -> str:
+    if max_chars and len(message) > max_chars:
+        return f"{message[:max_chars]}... ({len(message) - max_chars} more chars)"
+    return message
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line. The message is capped to max_chars, so a
+    logged document can not flood the log pipeline.
+    """
+    def __init__(
+            self,
+            max_chars: int
+    ):
+        super().__init__()
+        self._max_chars: int = max_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "location": f"{record.filename}:{record.lineno}",
+            "message": _capped(record.getMessage(), self._max_chars)
+        }
+        if record.request_id is not None:
+            entry["request_id"] = record.request_id
+        if record.chat_id is not None:
+            entry["chat_id"] = record.chat_id
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ColoredFormatter(logging.Formatter):
+    # The colored format of local development, without changing the record.
+    def __init__(
+            self,
+            max_chars: int
+    ):
+        super().__init__()
+        self._max_chars: int = max_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        color: str = COLORS.get(record.levelname, "")
+        context: str = "".join(f" [{value}]" for value in (record.request_id, record.chat_id) if value is not None)
+        line: str = (f"{color}{record.levelname}{RESET} - {self.formatTime(record)} - "
+                     f"\033[96m{record.filename}{RESET}:{record.lineno} - \033[95m{record.name}{RESET}{context} - "
+                     f"{_capped(record.getMessage(), self._max_chars)}")
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread without formatting them, the
+    message is only built there. Only the context ids are read here,
+    they belong to the logging task. When the queue is full records are
+    dropped instead of blocking the event loop.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = request_id_context.get()
+        record.chat_id = chat_id_context.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Waits for room on a full queue, the records before it are still written.
+        self.queue.put(self._sentinel)
+
+
+_configure_lock: threading.Lock = threading.Lock()
+_queue_handler: _ContextQueueHandler | None = None
+_listener: _QueueListener | None = None
+
+
+def _parse_levels(value: str) -> dict[str, str]:
+    # Format: "repository=DEBUG,service.provider_router=WARNING"
+    levels: dict[str, str] = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _stop_listener() -> None:
+    # Flushes what is still queued when the process exits.
+    if _listener is not None:
+        _listener.stop()
+
+
+def _restart_listener_after_fork() -> None:
+    # NOTE: Only the forking thread survives a fork, the listener thread
+    #       is gone in the child and may have held the queue's lock. A
+    #       forked worker (e.g. gunicorn --preload) gets its own queue and
+    #       listener, records still queued in the parent are its own.
+    global _listener
+    if _listener is None:
+        return
+    _queue_handler.queue = queue.Queue(_queue_handler.queue.maxsize)
+    _listener = _QueueListener(_queue_handler.queue, *_listener.handlers)
+    _listener.start()
+
+
+def configure_logging(stream: TextIO | None = None) -> None:
+    # Configured once per process, the first get_logger call does it.
+    global _queue_handler, _listener
+    with _configure_lock:
+        if _queue_handler is not None:
+            return
+        max_chars: int = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "4096"))
+        output: logging.StreamHandler = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(ColoredFormatter(max_chars) if os.getenv("LOG_FORMAT", "json").lower() == "text"
+                            else JsonFormatter(max_chars))
+
+        _queue_handler = _ContextQueueHandler(queue.Queue(int(os.getenv("LOG_QUEUE_SIZE", "10000"))))
+        _listener = _QueueListener(_queue_handler.queue, output)
+        _listener.start()
+        atexit.register(_stop_listener)
+        os.register_at_fork(after_in_child=_restart_listener_after_fork)
+
+        # Libraries log through the root logger, their INFO logs (e.g. every httpx request) stay quiet.
+        root: logging.Logger = logging.getLogger()
+        root.addHandler(_queue_handler)
+        root.setLevel(logging.WARNING)
+        for name, level in _parse_levels(os.getenv("LOG_LEVELS", "")).items():
+            logging.getLogger(name).setLevel(level)
 
 
 def get_logger(name):
-    # ANSI color codes
-    COLORS = {
-        'DEBUG': '\033[94m',  # Blue
-        'INFO': '\033[92m',  # Green
-        'WARNING': '\033[93m',  # Yellow
-        'ERROR': '\033[91m',  # Red
-        'CRITICAL': '\033[1;91m',  # Bold Red
-        'RESET': '\033[0m'  # Reset to default
-    }
-
-    class ColoredFormatter(logging.Formatter):
-        def format(self, record):
-            levelname = record.levelname
-            if levelname in COLORS:
-                record.levelname = f"{COLORS[levelname]}{levelname}{COLORS['RESET']}"
-                record.name = f"\033[95m{record.name}{COLORS['RESET']}"  # Magenta for logger name
-                record.filename = f"\033[96m{record.filename}{COLORS['RESET']}"  # Cyan for filename
-                record.msg = f"{record.msg}{COLORS['RESET']}"  # Ensure message ends with reset
-            return super().format(record)
-
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
-
-    formatter = ColoredFormatter('%(levelname)s - %(asctime)s - %(filename)s:%(lineno)d - %(name)s - %(message)s')
-
-    ch = logging.StreamHandler()
-    ch.setFormatter(formatter)
-    logger.addHandler(ch)
-
-    return logger
\ No newline at end of file
+    configure_logging()
+    # The level is set on the top level package, so LOG_LEVELS can still
+    # override single modules below it.
+    package: logging.Logger = logging.getLogger(name.split(".")[0])
+    if package.level == logging.NOTSET:
+        package.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    return logging.getLogger(name)
@@ -0,0 +1,127 @@
+import math
+import threading
+
+# Seconds, from a cache hit to a long LLM answer.
+DEFAULT_BUCKETS: tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs: list[str] = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Counter:
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            label_names: tuple[str, ...]
+    ):
+        self.name: str = name
+        self._documentation: str = documentation
+        self._label_names: tuple[str, ...] = label_names
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key: tuple[str, ...] = tuple(str(labels.get(name, "")) for name in self._label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines: list[str] = [f"# HELP {self.name} {self._documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self._label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            label_names: tuple[str, ...],
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name: str = name
+        self._documentation: str = documentation
+        self._label_names: tuple[str, ...] = label_names
+        self._buckets: tuple[float, ...] = tuple(sorted(buckets)) + (math.inf,)
+        # Per label set: count per bucket (not cumulative), sum and count.
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key: tuple[str, ...] = tuple(str(labels.get(name, "")) for name in self._label_names)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * len(self._buckets), [0.0, 0]))
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            total[0] += value
+            total[1] += 1
+
+    def render(self) -> list[str]:
+        lines: list[str] = [f"# HELP {self.name} {self._documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative: int = 0
+                for bound, count in zip(self._buckets, counts):
+                    cumulative += count
+                    le: str = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self._label_names, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self._label_names, key)} {_format_value(total[0])}")
+                lines.append(f"{self.name}_count{_format_labels(self._label_names, key)} {_format_value(total[1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process wide counters and histograms rendered in the Prometheus text
+    format by the /metrics endpoint. Every worker process keeps its own
+    values, Prometheus has to scrape each of them.
+    """
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def counter(
+            self,
+            name: str,
+            documentation: str,
+            label_names: tuple[str, ...] = ()
+    ) -> Counter:
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, documentation, label_names))
+
+    def histogram(
+            self,
+            name: str,
+            documentation: str,
+            label_names: tuple[str, ...] = (),
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics: list[Counter | Histogram] = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,21 @@
+from typing import Any
+
+from pydantic import BaseModel
+from pydantic_core import to_json
+from starlette.responses import Response
+
+
+class ModelResponse(Response):
+    """
+    JSON response serialized straight from a pydantic model by
+    pydantic-core, without dumping it to a dict first and encoding that
+    with the json module like JSONResponse. The output is the same
+    compact UTF-8 JSON, Arabic text is not escaped.
+
+    The models are expected to be valid already, so responses are best
+    built with model_construct, which skips validating them again.
+    """
+    media_type = "application/json"
+
+    def render(self, content: BaseModel | Any) -> bytes:
+        return to_json(content)
@@ -0,0 +1,137 @@
+import asyncio
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from types import FrameType
+
+from util.logger import get_logger
+
+
+class RequestProfile:
+    """
+    Samples of one profiled request, as folded stacks ("a;b;c" -> count)
+    that flamegraph.pl, speedscope and most flame graph viewers read.
+    """
+    def __init__(self):
+        self.samples: Counter[str] = Counter()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+# Set by ProfilerMiddleware, inherited by every task the request starts.
+active_profile: ContextVar[RequestProfile | None] = ContextVar("active_profile", default=None)
+
+
+def _frame_name(frame: FrameType) -> str:
+    path: str = frame.f_code.co_filename
+    if path.startswith(os.getcwd()):
+        path = os.path.relpath(path)
+    else:
+        path = os.path.join(*path.split(os.sep)[-2:])
+    # ";" separates frames in the folded format.
+    return f"{frame.f_code.co_qualname} ({path}:{frame.f_code.co_firstlineno})".replace(";", ":")
+
+
+class StackSampler:
+    """
+    Samples the event loop thread at a fixed interval while at least one
+    request is profiled. A sample belongs to the request whose task is
+    running at that moment, so concurrent requests of the same worker do
+    not end up in each other's profiles and time spent waiting on I/O is
+    not sampled at all. The overhead is one stack walk per interval,
+    independent of how many functions the request calls.
+    """
+    def __init__(
+            self,
+            interval: float
+    ):
+        self._logger = get_logger(__name__)
+        self._interval: float = interval
+        self._profiles: set[RequestProfile] = set()
+        self._lock: threading.Lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread: int | None = None
+
+    def register(self, profile: RequestProfile) -> None:
+        # Called from the event loop thread.
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread = threading.get_ident()
+            self._profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+
+    def unregister(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles.discard(profile)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self._interval)
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                loop, loop_thread = self._loop, self._loop_thread
+            try:
+                task: asyncio.Task | None = asyncio.current_task(loop)
+                frame: FrameType | None = sys._current_frames().get(loop_thread)
+                if task is None or frame is None:
+                    continue
+                profile: RequestProfile | None = task.get_context().get(active_profile)
+                stack: list[str] = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+            except Exception as e:
+                self._logger.warning(f"Failed to sample the event loop: {e}")
+                continue
+            with self._lock:
+                if profile in self._profiles:
+                    profile.samples[";".join(reversed(stack))] += 1
+
+
+class CProfileSlot:
+    """
+    cProfile traces every call of the thread and only one profiler can
+    be active per thread. It therefore profiles one request at a time and
+    also sees whatever other requests run on the loop meanwhile.
+    """
+    def __init__(self):
+        self._profiler: cProfile.Profile | None = None
+
+    def start(self) -> cProfile.Profile | None:
+        if self._profiler is not None:
+            return None
+        try:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        except ValueError:
+            # Another profiling tool is already attached to the process.
+            self._profiler = None
+        return self._profiler
+
+    def stop(self) -> None:
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler = None
+
+
+def prune_profiles(
+        directory: str,
+        max_files: int
+) -> None:
+    # Oldest profiles go first, the name starts with a sortable timestamp.
+    files: list[str] = sorted(name for name in os.listdir(directory) if name.endswith((".folded", ".prof")))
+    for name in files[:max(0, len(files) - max_files)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
@@ -1,10 +1,8 @@
 class PromptGenerator:
-    @staticmethod
-    def generate_main_prompt(user_query: str) -> str:
-        # First sanitize the user_query to prevent encoding issues
-        safe_query = user_query.encode("utf-8", errors="replace").decode("utf-8")
-
-        prompt = f"""<?xml version="1.0" encoding="UTF-8"?>
+    # NOTE: The system prompt is byte for byte identical for every request so providers
+    #       can cache it together with the stable head of the conversation. Anything that
+    #       changes per turn has to go after it, never inside it.
+    SYSTEM_PROMPT: str = """<?xml version="1.0" encoding="UTF-8"?>
                 <prompt>
                     <instruction>
                         أنت صديق طيب ومتفهم، مو بس مساعد آلي.
@@ -21,19 +19,40 @@ class PromptGenerator:
                         - ردك لازم يكون نص عادي، بدون تنسيقات أو شيفرات برمجية
                     </instruction>
                     <strictrules>
-                        رح يتم تزويدك بسياق المحادثة بهالشكل:
-                        role: user
-                        content: (محتوى الرسالة)
-                        أو
-                        role: ai
-                        content: (محتوى الرد)
-
                         انتبه، لما ترد لازم ترجع نص عادي وواضح فقط.
-                        ممنوع تكتب "role" أو "content" أو أي تنسيقات ثانية.
                         جوابك لازم يكون نص نظيف ومباشر بدون أي إضافات.
+                        رد على آخر رسالة من المستخدم بالمحادثة.
                     </strictrules>
-                    <userquery>
-                        {safe_query}
-                    </userquery>
                 </prompt>"""
-        return prompt
\ No newline at end of file
+
+    @staticmethod
+    def generate_system_prompt() -> str:
+        return PromptGenerator.SYSTEM_PROMPT
+
+    @staticmethod
+    def generate_summary_prompt(previous_summary: str, conversation: list[str]) -> str:
+        safe_summary = previous_summary.encode("utf-8", errors="replace").decode("utf-8")
+        safe_conversation = "\n".join(conversation).encode("utf-8", errors="replace").decode("utf-8")
+
+        prompt = f"""<?xml version="1.0" encoding="UTF-8"?>
+                <prompt>
+                    <instruction>
+                        أنت تكتب ملخص لمحادثة بين مستخدم ومساعد دعم نفسي.
+                        - حدّث الملخص السابق بالرسائل الجديدة، وخلي كل المعلومات المهمة منه
+                        - ركّز على مشاعر المستخدم، ظروفه، الأشخاص المهمين بحياته، والنصايح اللي انطت له
+                        - اكتب الملخص بالعربية وبجمل قصيرة وواضحة
+                        - لا تزيد الملخص عن 300 كلمة
+                        - رجّع الملخص بس، نص عادي بدون تنسيقات
+                    </instruction>
+                    <previoussummary>
+                        {safe_summary}
+                    </previoussummary>
+                    <newmessages>
+                        {safe_conversation}
+                    </newmessages>
+                </prompt>"""
+        return prompt
+
+    @staticmethod
+    def generate_summary_context(summary: str) -> str:
+        return f"ملخص الجزء الأقدم من المحادثة: {summary}"
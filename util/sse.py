@@ -0,0 +1,12 @@
+import json
+
+
+def format_sse_event(
+        data: dict,
+        event_id: str | None = None
+) -> str:
+    # NOTE: ensure_ascii is disabled so Arabic text is sent as-is
+    #       instead of being inflated into \u escapes.
+    # A reconnecting client sends the id of the last event it got in Last-Event-ID.
+    event: str = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"id: {event_id}\n{event}" if event_id is not None else event
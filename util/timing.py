@@ -0,0 +1,68 @@
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator
+
+from util.metrics import metrics
+
+STAGE_DURATION = metrics.histogram(
+    "chat_stage_duration_seconds", "Duration of the stages of a request.", ("stage",))
+
+
+class RequestTiming:
+    """
+    Spans of one request, summed per stage for the Server-Timing header.
+    """
+    def __init__(self):
+        self.started: float = time.perf_counter()
+        self.stages: dict[str, float] = {}
+
+    def add(self, stage: str, duration: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + duration
+
+    def server_timing(self) -> str:
+        entries: list[str] = [f"{stage.replace('.', '-')};dur={duration * 1000:.1f}"
+                              for stage, duration in self.stages.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+request_timing: ContextVar[RequestTiming | None] = ContextVar("request_timing", default=None)
+
+
+def record_span(stage: str, duration: float) -> None:
+    STAGE_DURATION.observe(duration, stage=stage)
+    timing: RequestTiming | None = request_timing.get()
+    if timing is not None:
+        timing.add(stage, duration)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    started: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - started)
+
+
+_timed_stage: ContextVar[str | None] = ContextVar("timed_stage", default=None)
+
+
+def timed(stage: str) -> Callable:
+    # Span around every call of an async function. An override calling
+    # super() with the same stage is only counted once.
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            if _timed_stage.get() == stage:
+                return await function(*args, **kwargs)
+            token = _timed_stage.set(stage)
+            try:
+                with span(stage):
+                    return await function(*args, **kwargs)
+            finally:
+                _timed_stage.reset(token)
+        return wrapper
+    return decorator
@@ -0,0 +1,14 @@
+import math
+
+# NOTE: No tokenizer ships with the provider SDKs we use, so tokens are
+#       estimated from the UTF-8 size. Four bytes per token matches English
+#       closely and over-estimates Arabic (two bytes per letter), which keeps
+#       the estimate on the safe side of a budget.
+BYTES_PER_TOKEN: int = 4
+
+# Tokens spent on the role marker and separators around every message.
+MESSAGE_OVERHEAD_TOKENS: int = 4
+
+
+def count_tokens(text: str) -> int:
+    return math.ceil(len(text.encode("utf-8", errors="replace")) / BYTES_PER_TOKEN)